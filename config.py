@@ -25,6 +25,69 @@ if not DB_CONFIG['password']:
 UPLOAD_PATH = os.getenv('UPLOAD_PATH', '/opt/taskbot/uploads')
 MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 104857600))  # 100 MB
 
+# FSM Storage
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', 259200))  # 3 дня
+FSM_CACHE_SIZE = int(os.getenv('FSM_CACHE_SIZE', 10000))  # 0 - без локального кэша
+
+# Chat Cleaner
+CHAT_CLEANER_MAX_CHATS = int(os.getenv('CHAT_CLEANER_MAX_CHATS', 10000))
+CHAT_CLEANER_MAX_MESSAGES = int(os.getenv('CHAT_CLEANER_MAX_MESSAGES', 50))
+CHAT_CLEANER_PERSIST = os.getenv('CHAT_CLEANER_PERSIST', 'true').lower() == 'true'
+
+# Metrics (веб-сервер метрик планировщика)
+SCHEDULER_METRICS_HOST = os.getenv('SCHEDULER_METRICS_HOST', '127.0.0.1')
+SCHEDULER_METRICS_PORT = int(os.getenv('SCHEDULER_METRICS_PORT', 8081))
+
+# Loop Watchdog (секунды)
+LOOP_WATCHDOG_INTERVAL = float(os.getenv('LOOP_WATCHDOG_INTERVAL', 0.1))
+LOOP_BLOCK_THRESHOLD = float(os.getenv('LOOP_BLOCK_THRESHOLD', 0.2))
+
+# Charts (рендеринг графиков в отдельных процессах)
+CHART_WORKERS = int(os.getenv('CHART_WORKERS', 1))
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', 64))  # PNG в памяти
+
+# Export (выгрузка задач)
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 5000))  # строк за одну выборку курсора
+EXPORT_TIMEOUT = float(os.getenv('EXPORT_TIMEOUT', 3600))  # секунды на запрос выгрузки
+EXPORT_PROGRESS_INTERVAL = float(os.getenv('EXPORT_PROGRESS_INTERVAL', 3))
+
+# Import (импорт задач из файла)
+IMPORT_MAX_ROWS = int(os.getenv('IMPORT_MAX_ROWS', 50000))
+
+# Inline Mode (поиск задач через @бота)
+INLINE_CACHE_TTL = float(os.getenv('INLINE_CACHE_TTL', 30))  # секунды в локальном кэше
+INLINE_CACHE_SIZE = int(os.getenv('INLINE_CACHE_SIZE', 5000))
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', 10))  # cache_time для Telegram
+
+# Rendering (кэш карточек задач и кнопок списков)
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', 2000))
+
+# Media Groups (прием альбомов и загрузка файлов из Telegram)
+MEDIA_GROUP_DELAY = float(os.getenv('MEDIA_GROUP_DELAY', 0.8))  # секунды ожидания следующего файла альбома
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', 4))  # одновременных загрузок на процесс
+UPLOAD_QUEUE_SIZE = int(os.getenv('UPLOAD_QUEUE_SIZE', 20))  # сообщений с файлами в очереди пользователя
+UPLOAD_PROGRESS_INTERVAL = float(os.getenv('UPLOAD_PROGRESS_INTERVAL', 2))  # секунды между правками прогресса
+
+# Images (нормализация фото в отдельных процессах, по умолчанию выключена)
+IMAGE_PIPELINE = os.getenv('IMAGE_PIPELINE', 'false').lower() == 'true'
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 1))
+IMAGE_FORMAT = os.getenv('IMAGE_FORMAT', 'JPEG').upper()  # JPEG (прогрессивный) или WEBP
+IMAGE_MAX_SIDE = int(os.getenv('IMAGE_MAX_SIDE', 2560))  # пикселей по длинной стороне
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 1536 * 1024))  # бюджет размера файла
+IMAGE_PHASH_DISTANCE = int(os.getenv('IMAGE_PHASH_DISTANCE', 4))  # бит различия для "похожих", 0 - выключено
+
+# Thumbnails (превью по запросу в каталоге производных файлов)
+THUMBNAIL_SIZES = tuple(int(size) for size in os.getenv('THUMBNAIL_SIZES', '320,160,800').split(','))  # первый - для документов Telegram (до 320)
+THUMBNAIL_CACHE_BYTES = int(os.getenv('THUMBNAIL_CACHE_BYTES', 256 * 1024 * 1024))  # предел размера каталога
+
+# Storage GC (сборка мусора в хранилище файлов, выполняется планировщиком)
+STORAGE_GC_INTERVAL = float(os.getenv('STORAGE_GC_INTERVAL', 6))  # часы между проходами
+# Часы: более новые файлы не трогаем. Не меньше FSM_STATE_TTL: блоб, загруженный
+# в мастере создания задачи, получает ссылку только при создании задачи
+STORAGE_GC_GRACE = max(float(os.getenv('STORAGE_GC_GRACE', 24)), FSM_STATE_TTL / 3600)
+STORAGE_GC_BATCH = int(os.getenv('STORAGE_GC_BATCH', 1000))  # ключей в одном запросе к базе
+STORAGE_QUARANTINE_DAYS = int(os.getenv('STORAGE_QUARANTINE_DAYS', 7))  # 0 - удалять сразу
+
 # Timezone
 TIMEZONE_OFFSET = int(os.getenv('TIMEZONE_OFFSET', 5))  # UTC+5
 
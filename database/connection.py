@@ -1,5 +1,6 @@
 import asyncpg
 import asyncio
+from contextlib import asynccontextmanager
 from typing import Optional, Any, List, Dict
 import logging
 from config import DB_CONFIG
@@ -11,6 +12,8 @@ logger = logging.getLogger(__name__)
 class DatabaseConnection:
     def __init__(self):
         self.pool: Optional[asyncpg.Pool] = None
+        # Количество корутин, ожидающих свободное соединение
+        self.waiters = 0
         
     async def connect(self) -> bool:
         """Создание пула соединений с PostgreSQL"""
@@ -40,13 +43,30 @@ class DatabaseConnection:
             logger.error(f"Ошибка подключения к PostgreSQL: {e}")
             return False
     
+    @asynccontextmanager
+    async def acquire(self):
+        """Получение соединения из пула с учетом ожидающих"""
+        if not self.pool:
+            raise Exception("Нет подключения к базе данных")
+        
+        self.waiters += 1
+        try:
+            conn = await self.pool.acquire()
+        finally:
+            self.waiters -= 1
+        
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+    
     async def execute_query(self, query: str, *args) -> List[asyncpg.Record]:
         """Выполнение SELECT запроса"""
         if not self.pool:
             raise Exception("Нет подключения к базе данных")
         
         try:
-            async with self.pool.acquire() as conn:
+            async with self.acquire() as conn:
                 result = await conn.fetch(query, *args)
                 return result
         except Exception as e:
@@ -60,7 +80,7 @@ class DatabaseConnection:
             raise Exception("Нет подключения к базе данных")
         
         try:
-            async with self.pool.acquire() as conn:
+            async with self.acquire() as conn:
                 result = await conn.fetchrow(query, *args)
                 return result
         except Exception as e:
@@ -74,7 +94,7 @@ class DatabaseConnection:
             raise Exception("Нет подключения к базе данных")
         
         try:
-            async with self.pool.acquire() as conn:
+            async with self.acquire() as conn:
                 result = await conn.execute(query, *args)
                 return result
         except Exception as e:
@@ -88,7 +108,7 @@ class DatabaseConnection:
             raise Exception("Нет подключения к базе данных")
         
         try:
-            async with self.pool.acquire() as conn:
+            async with self.acquire() as conn:
                 async with conn.transaction():
                     for query, args in queries:
                         await conn.execute(query, *args)
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from .models import CompanyManager, UserManager, OPEN_STATUSES
+
+logger = logging.getLogger(__name__)
+
+class CompanyDirectory:
+    """Справочник компаний в памяти процесса.
+
+    Загружается одним запросом при первом обращении и хранит индексы
+    по company_id и по названию (без учета регистра). create_company
+    вызывает invalidate(): версия увеличивается, и следующий запрос
+    перечитывает справочник. Версия входит в ключи кэшей, построенных
+    по справочнику (например, страниц выбора компании).
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._companies: Optional[List[Dict[str, Any]]] = None
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        """Сброс справочника после изменения компаний"""
+        self.version += 1
+        self._companies = None
+
+    async def all(self) -> List[Dict[str, Any]]:
+        """Все компании (новые первыми)"""
+        return await self._load()
+
+    async def get_by_id(self, company_id: str) -> Optional[Dict[str, Any]]:
+        await self._load()
+        return self._by_id.get(company_id)
+
+    async def get_by_name(self, name: str) -> Optional[Dict[str, Any]]:
+        """Компания по точному названию без учета регистра"""
+        await self._load()
+        return self._by_name.get(name.strip().casefold())
+
+    async def page(self, page: int, size: int) -> Tuple[List[Dict[str, Any]], int]:
+        """Страница справочника и общее количество страниц"""
+        companies = await self._load()
+        pages = max(1, -(-len(companies) // size))
+        page = min(max(page, 0), pages - 1)
+        return companies[page * size:(page + 1) * size], pages
+
+    async def _load(self) -> List[Dict[str, Any]]:
+        if self._companies is not None:
+            return self._companies
+
+        async with self._lock:
+            while self._companies is None:
+                version = self.version
+                companies = await CompanyManager.get_all_companies()
+                if version != self.version:
+                    # Справочник изменился во время загрузки
+                    continue
+                if not companies:
+                    # Пустой результат (или ошибка базы) не кэшируем
+                    return companies
+
+                self._by_id = {company['company_id']: company for company in companies}
+                self._by_name = {}
+                for company in companies:
+                    self._by_name.setdefault(company['name'].strip().casefold(), company)
+                self._companies = companies
+                logger.info(f"Справочник компаний загружен: {len(companies)} (версия {version})")
+
+        return self._companies
+
+# Подпись кнопки исполнителя: "Имя (число открытых задач)"
+LABEL_COUNT_RE = re.compile(r"^(.*) \((\d+)\)$")
+
+def assignee_display_name(user: Dict[str, Any]) -> str:
+    name = f"{user['first_name'] or ''} {user['last_name'] or ''}".strip()
+    return name or user['username'] or f"ID: {user['telegram_id']}"
+
+class AssigneeDirectory:
+    """Справочник исполнителей в памяти процесса.
+
+    Хранит индексы по user_id и по отображаемому имени (совпадающие имена
+    дополняются telegram_id) и число открытых задач каждого исполнителя.
+    Счетчики загружаются одним агрегирующим запросом, а затем обновляются
+    на месте при создании задачи и смене статуса - выбор исполнителя
+    сортируется по загрузке без дополнительных запросов.
+    """
+
+    def __init__(self):
+        self._assignees: Optional[List[Dict[str, Any]]] = None
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._open_tasks: Optional[Dict[str, int]] = None
+        self._users_version = 0
+        self._counts_version = 0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        """Сброс списка исполнителей (новый пользователь, смена роли)"""
+        self._users_version += 1
+        self._assignees = None
+
+    def invalidate_counts(self) -> None:
+        """Сброс счетчиков после массовых изменений (импорт)"""
+        self._counts_version += 1
+        self._open_tasks = None
+
+    def task_created(self, assignee_id: str) -> None:
+        self._adjust(assignee_id, 1)
+
+    def task_status_changed(self, assignee_id: str, old_status: str, new_status: str) -> None:
+        """Учет смены статуса: задача вышла из открытых или вернулась в них"""
+        was_open = old_status in OPEN_STATUSES
+        is_open = new_status in OPEN_STATUSES
+        if was_open != is_open:
+            self._adjust(assignee_id, 1 if is_open else -1)
+
+    def _adjust(self, assignee_id: str, delta: int) -> None:
+        # Изменение во время загрузки счетчиков заставит перечитать их
+        self._counts_version += 1
+        if self._open_tasks is not None:
+            self._open_tasks[assignee_id] = max(0, self._open_tasks.get(assignee_id, 0) + delta)
+
+    async def all(self) -> List[Dict[str, Any]]:
+        """Все исполнители (по имени)"""
+        return await self._load_assignees()
+
+    async def get_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
+        await self._load_assignees()
+        return self._by_id.get(user_id)
+
+    async def get_by_label(self, text: str) -> Optional[Dict[str, Any]]:
+        """Исполнитель по подписи кнопки (имя с числом задач или без него)"""
+        await self._load_assignees()
+        text = text.strip()
+        assignee = self._by_name.get(text)
+        if assignee is None:
+            match = LABEL_COUNT_RE.match(text)
+            if match:
+                assignee = self._by_name.get(match.group(1))
+        return assignee
+
+    async def by_workload(self) -> List[Tuple[Dict[str, Any], int]]:
+        """(исполнитель, открытых задач), наименее загруженные первыми"""
+        assignees = await self._load_assignees()
+        counts = await self._load_counts()
+        ranked = [(assignee, counts.get(assignee['user_id'], 0)) for assignee in assignees]
+        ranked.sort(key=lambda item: item[1])
+        return ranked
+
+    async def _load_assignees(self) -> List[Dict[str, Any]]:
+        if self._assignees is not None:
+            return self._assignees
+
+        async with self._lock:
+            while self._assignees is None:
+                version = self._users_version
+                users = await UserManager.get_assignees()
+                if version != self._users_version:
+                    continue
+                if not users:
+                    return users
+
+                by_name = {}
+                assignees = []
+                for user in users:
+                    name = assignee_display_name(user)
+                    if name in by_name:
+                        name = f"{name} [{user['telegram_id']}]"
+                    assignee = {**user, 'name': name}
+                    by_name[name] = assignee
+                    assignees.append(assignee)
+
+                self._by_id = {assignee['user_id']: assignee for assignee in assignees}
+                self._by_name = by_name
+                self._assignees = assignees
+                logger.info(f"Справочник исполнителей загружен: {len(assignees)}")
+
+        return self._assignees
+
+    async def _load_counts(self) -> Dict[str, int]:
+        if self._open_tasks is not None:
+            return self._open_tasks
+
+        async with self._lock:
+            while self._open_tasks is None:
+                version = self._counts_version
+                counts = await UserManager.get_open_task_counts()
+                if counts is None:
+                    # Ошибка базы: сортировка только по имени, без кэширования
+                    return {}
+                if version == self._counts_version:
+                    self._open_tasks = counts
+
+        return self._open_tasks
+
+# Глобальные экземпляры
+company_directory = CompanyDirectory()
+assignee_directory = AssigneeDirectory()
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from .connection import db_connection
+from config import FSM_STATE_TTL, FSM_CACHE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Запись кэша: (состояние, данные)
+Record = Tuple[Optional[str], Dict[str, Any]]
+
+
+class PostgresStorage(BaseStorage):
+    """FSM-хранилище в PostgreSQL (таблица fsm_state).
+
+    Чтения обслуживаются из локального LRU-кэша, записи копятся в буфере
+    и сбрасываются одной командой, как только обработчик отдает управление
+    циклу событий. Поэтому пара update_data + set_state в шаге мастера
+    стоит одного UPSERT. При нескольких процессах бота FSM_CACHE_SIZE=0
+    отключает кэш, и каждое чтение идет в базу.
+    """
+
+    def __init__(self, state_ttl: int = FSM_STATE_TTL, cache_size: int = FSM_CACHE_SIZE,
+                 key_builder: Optional[KeyBuilder] = None):
+        self.state_ttl = state_ttl
+        self.cache_size = cache_size
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self._cache: "OrderedDict[str, Record]" = OrderedDict()
+        self._dirty: Dict[str, Record] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def cache_len(self) -> int:
+        """Количество ключей в локальном кэше"""
+        return len(self._cache)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        """Установка состояния"""
+        storage_key = self.key_builder.build(key)
+        _, data = await self._get(storage_key)
+        value = state.state if isinstance(state, State) else state
+        self._put(storage_key, (value, data))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        """Получение состояния"""
+        state, _ = await self._get(self.key_builder.build(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        """Запись данных (с заменой)"""
+        storage_key = self.key_builder.build(key)
+        state, _ = await self._get(storage_key)
+        self._put(storage_key, (state, dict(data)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        """Получение данных"""
+        _, data = await self._get(self.key_builder.build(key))
+        return dict(data)
+
+    async def close(self) -> None:
+        """Сброс несохраненных записей"""
+        if self._flush_task and not self._flush_task.done():
+            await self._flush_task
+        if self._dirty:
+            await self._flush()
+
+    async def _get(self, storage_key: str) -> Record:
+        """Чтение записи: буфер -> кэш -> база"""
+        if storage_key in self._dirty:
+            return self._dirty[storage_key]
+
+        if storage_key in self._cache:
+            self._cache.move_to_end(storage_key)
+            return self._cache[storage_key]
+
+        record: Record = (None, {})
+        try:
+            row = await db_connection.execute_one(
+                """
+                SELECT state, data
+                FROM fsm_state
+                WHERE storage_key = $1 AND expires_at > NOW()
+                """,
+                storage_key
+            )
+            if row:
+                record = (row['state'], json.loads(row['data']) if row['data'] else {})
+        except Exception as e:
+            logger.error(f"Ошибка чтения FSM-состояния {storage_key}: {e}")
+
+        # Пока шел запрос, ключ мог быть перезаписан
+        if storage_key in self._dirty:
+            return self._dirty[storage_key]
+
+        self._remember(storage_key, record)
+        return record
+
+    def _put(self, storage_key: str, record: Record) -> None:
+        """Запись в кэш и буфер, планирование сброса"""
+        self._remember(storage_key, record)
+        self._dirty[storage_key] = record
+
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+
+    def _remember(self, storage_key: str, record: Record) -> None:
+        """Добавление записи в LRU-кэш"""
+        if self.cache_size <= 0:
+            return
+        self._cache[storage_key] = record
+        self._cache.move_to_end(storage_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _flush(self) -> None:
+        """Сброс буфера одной командой на все измененные ключи.
+
+        Ключи, записанные во время сброса, сбрасываются следующей командой
+        той же задачи; при ошибке сброс повторяется через секунду.
+        """
+        while self._dirty:
+            batch, self._dirty = self._dirty, {}
+            try:
+                await self._write(batch)
+            except Exception as e:
+                logger.error(f"Ошибка сохранения FSM-состояний ({len(batch)} ключей): {e}")
+                # Возвращаем в буфер то, что не было перезаписано за время сброса
+                for storage_key, record in batch.items():
+                    self._dirty.setdefault(storage_key, record)
+                await asyncio.sleep(1)
+                if self._dirty:
+                    self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+                return
+
+    async def _write(self, batch: Dict[str, Record]) -> None:
+        """Запись пачки: upsert состояний и удаление пустых"""
+        upsert_keys, states, payloads, delete_keys = [], [], [], []
+        for storage_key, (state, data) in batch.items():
+            if state is None and not data:
+                delete_keys.append(storage_key)
+            else:
+                upsert_keys.append(storage_key)
+                states.append(state)
+                payloads.append(json.dumps(data, ensure_ascii=False, default=str))
+
+        if upsert_keys:
+            await db_connection.execute_command(
+                """
+                INSERT INTO fsm_state (storage_key, state, data, expires_at)
+                SELECT k, s, d::jsonb, NOW() + make_interval(secs => $4)
+                FROM unnest($1::text[], $2::text[], $3::text[]) AS u(k, s, d)
+                ON CONFLICT (storage_key) DO UPDATE
+                SET state = EXCLUDED.state,
+                    data = EXCLUDED.data,
+                    expires_at = EXCLUDED.expires_at
+                """,
+                upsert_keys, states, payloads, float(self.state_ttl)
+            )
+        if delete_keys:
+            await db_connection.execute_command(
+                "DELETE FROM fsm_state WHERE storage_key = ANY($1::text[])",
+                delete_keys
+            )
+
+    @staticmethod
+    async def purge_expired() -> int:
+        """Удаление просроченных FSM-состояний"""
+        try:
+            result = await db_connection.execute_command(
+                "DELETE FROM fsm_state WHERE expires_at <= NOW()"
+            )
+            return int(result.split()[-1])
+        except Exception as e:
+            logger.error(f"Ошибка очистки FSM-состояний: {e}")
+            return 0
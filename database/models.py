@@ -1,6 +1,7 @@
+import json
 import uuid
-from datetime import datetime, timezone, timedelta
-from typing import Optional, List, Dict, Any
+from datetime import date, datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable
 from .connection import db_connection
 import logging
 
@@ -8,6 +9,11 @@ logger = logging.getLogger(__name__)
 
 # Часовой пояс UTC+5
 TIMEZONE = timezone(timedelta(hours=5))
+# Тот же часовой пояс для выражений AT TIME ZONE в SQL
+TIMEZONE_SQL = "INTERVAL '+05:00'"
+
+# Статусы незавершенных задач (нагрузка исполнителя)
+OPEN_STATUSES = ('new', 'in_progress', 'overdue')
 
 def generate_uuid() -> str:
     """Генерация UUID строки"""
@@ -17,6 +23,56 @@ def get_current_time() -> datetime:
     """Получение текущего времени в UTC+5"""
     return datetime.now(TIMEZONE)
 
+def daily_stats_upsert_sql(source: str, day_param: str) -> str:
+    """SQL прибавления событий к дневной сводке task_daily_stats.
+    
+    source - CTE с колонками company_id, assignee_id, is_urgent, status;
+    day_param - параметр запроса с датой события.
+    """
+    return f"""
+    INSERT INTO task_daily_stats (day, company_id, assignee_id, status, task_count, urgent_count)
+    SELECT {day_param}, company_id, assignee_id, status, COUNT(*), COUNT(*) FILTER (WHERE is_urgent)
+    FROM {source}
+    GROUP BY company_id, assignee_id, status
+    ON CONFLICT (day, company_id, assignee_id, status) DO UPDATE
+    SET task_count = task_daily_stats.task_count + EXCLUDED.task_count,
+        urgent_count = task_daily_stats.urgent_count + EXCLUDED.urgent_count
+    """
+
+def status_events_insert_sql(source: str, changed_by: str) -> str:
+    """SQL записи переходов статуса в журнал task_status_events.
+    
+    source - CTE с колонками task_id, company_id, assignee_id, old_status, status;
+    changed_by - выражение с автором изменения (параметр запроса или колонка).
+    """
+    return f"""
+    INSERT INTO task_status_events (task_id, company_id, assignee_id, old_status, new_status, changed_by)
+    SELECT task_id, company_id, assignee_id, old_status, status, {changed_by}
+    FROM {source}
+    """
+
+def task_counters_upsert_sql(source: str, status: str, old_status: Optional[str] = None) -> str:
+    """SQL пересчета счетчиков task_counters по измененным задачам.
+    
+    source - CTE с колонками company_id, assignee_id; status и old_status -
+    выражения нового и прежнего статуса (old_status = None - новые задачи).
+    Переходы сворачиваются в одну дельту на ключ, нулевые не пишутся.
+    """
+    removed = f"""
+        UNION ALL
+        SELECT company_id, assignee_id, {old_status}, -1 FROM {source}""" if old_status else ""
+    return f"""
+    INSERT INTO task_counters (company_id, assignee_id, status, task_count)
+    SELECT company_id, assignee_id, status, SUM(delta)
+    FROM (
+        SELECT company_id, assignee_id, {status} AS status, 1 AS delta FROM {source}{removed}
+    ) changes
+    GROUP BY company_id, assignee_id, status
+    HAVING SUM(delta) <> 0
+    ON CONFLICT (company_id, assignee_id, status) DO UPDATE
+    SET task_count = task_counters.task_count + EXCLUDED.task_count
+    """
+
 def format_datetime(dt: datetime) -> str:
     """Форматирование datetime для отображения"""
     if not dt:
@@ -90,6 +146,24 @@ class DatabaseManager:
         CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status);
         CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks(deadline);
         CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at);
+        
+        -- Списки задач с фильтрами: новые первыми внутри компании/исполнителя,
+        -- окна дедлайна по статусу, срочные - частичным индексом
+        CREATE INDEX IF NOT EXISTS idx_tasks_company_created ON tasks(company_id, created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_tasks_assignee_created ON tasks(assignee_id, created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_tasks_assignee_status_deadline
+            ON tasks(assignee_id, status, deadline);
+        CREATE INDEX IF NOT EXISTS idx_tasks_status_deadline ON tasks(status, deadline);
+        CREATE INDEX IF NOT EXISTS idx_tasks_urgent_created ON tasks(created_at DESC) WHERE is_urgent;
+        
+        -- Полнотекстовый поиск: название важнее описания, описание - инициатора
+        ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+                setweight(to_tsvector('russian', coalesce(initiator_name, '')), 'C')
+            ) STORED;
+        CREATE INDEX IF NOT EXISTS idx_tasks_search_vector ON tasks USING GIN (search_vector);
         """
         
         # Таблица комментариев
@@ -122,6 +196,175 @@ class DatabaseManager:
         
         CREATE INDEX IF NOT EXISTS idx_files_task_id ON task_files(task_id);
         CREATE INDEX IF NOT EXISTS idx_files_user_id ON task_files(user_id);
+        
+        -- Содержимое файлов по SHA-256 (blobs/ab/cd/<hash>). Счетчика ссылок нет:
+        -- ссылки - строки task_files с этим blob_hash (по idx_files_blob_hash)
+        CREATE TABLE IF NOT EXISTS file_blobs (
+            blob_hash CHAR(64) PRIMARY KEY,
+            file_path VARCHAR(1000) NOT NULL,
+            thumbnail_path VARCHAR(1000),
+            file_size BIGINT NOT NULL,
+            content_type VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        );
+        ALTER TABLE file_blobs DROP COLUMN IF EXISTS ref_count;
+        
+        -- NULL - файл, загруженный до хранилища блобов (путь в file_path)
+        ALTER TABLE task_files ADD COLUMN IF NOT EXISTS blob_hash CHAR(64)
+            REFERENCES file_blobs(blob_hash);
+        CREATE INDEX IF NOT EXISTS idx_files_blob_hash ON task_files(blob_hash);
+        
+        -- Идентификаторы файла в Telegram: повторная отправка без загрузки.
+        -- media_type - как файл был получен ботом ('photo' или 'document')
+        ALTER TABLE task_files ADD COLUMN IF NOT EXISTS media_type VARCHAR(20);
+        ALTER TABLE task_files ADD COLUMN IF NOT EXISTS telegram_file_id TEXT;
+        ALTER TABLE task_files ADD COLUMN IF NOT EXISTS telegram_file_unique_id VARCHAR(255);
+        
+        -- Перцептивный хэш (dHash) фото или изображения-документа: поиск похожих снимков
+        ALTER TABLE task_files ADD COLUMN IF NOT EXISTS phash BIGINT;
+        """
+        
+        # Таблица состояний FSM
+        fsm_state_table = """
+        CREATE TABLE IF NOT EXISTS fsm_state (
+            storage_key VARCHAR(255) PRIMARY KEY,
+            state VARCHAR(255),
+            data JSONB NOT NULL DEFAULT '{}'::jsonb,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_fsm_state_expires_at ON fsm_state(expires_at);
+        """
+        
+        # Таблица истории сообщений бота (для очистки чата)
+        chat_messages_table = """
+        CREATE TABLE IF NOT EXISTS chat_messages (
+            chat_id BIGINT PRIMARY KEY,
+            history JSONB NOT NULL DEFAULT '{}'::jsonb,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        );
+        """
+        
+        # Дневная сводка по задачам: число переходов в статус за день
+        # ('created' - создание задачи), ведется в тех же командах, что меняют tasks
+        daily_stats_table = f"""
+        CREATE TABLE IF NOT EXISTS task_daily_stats (
+            day DATE NOT NULL,
+            company_id UUID NOT NULL REFERENCES companies(company_id),
+            assignee_id UUID NOT NULL REFERENCES users(user_id),
+            status VARCHAR(50) NOT NULL,
+            task_count INTEGER NOT NULL DEFAULT 0,
+            urgent_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, company_id, assignee_id, status)
+        );
+        
+        -- Первичное заполнение по существующим задачам
+        INSERT INTO task_daily_stats (day, company_id, assignee_id, status, task_count, urgent_count)
+        SELECT day, company_id, assignee_id, status, COUNT(*), COUNT(*) FILTER (WHERE is_urgent)
+        FROM (
+            SELECT (created_at AT TIME ZONE {TIMEZONE_SQL})::date AS day,
+                   company_id, assignee_id, 'created' AS status, is_urgent
+            FROM tasks
+            UNION ALL
+            SELECT (updated_at AT TIME ZONE {TIMEZONE_SQL})::date,
+                   company_id, assignee_id, status, is_urgent
+            FROM tasks
+            WHERE status <> 'new'
+        ) events
+        WHERE NOT EXISTS (SELECT 1 FROM task_daily_stats)
+        GROUP BY day, company_id, assignee_id, status;
+        """
+        
+        # Журнал переходов статуса (только добавление): основа метрик времени выполнения.
+        # Пишется в тех же командах, что меняют tasks; old_status = NULL - создание задачи
+        status_events_table = """
+        CREATE TABLE IF NOT EXISTS task_status_events (
+            event_id BIGSERIAL PRIMARY KEY,
+            task_id UUID NOT NULL REFERENCES tasks(task_id) ON DELETE CASCADE,
+            company_id UUID NOT NULL REFERENCES companies(company_id),
+            assignee_id UUID NOT NULL REFERENCES users(user_id),
+            old_status VARCHAR(50),
+            new_status VARCHAR(50) NOT NULL,
+            changed_by UUID REFERENCES users(user_id),
+            changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+        );
+        
+        -- Журнал растет в порядке времени: BRIN для сканов по диапазону дат
+        CREATE INDEX IF NOT EXISTS idx_status_events_changed_at
+            ON task_status_events USING BRIN (changed_at);
+        CREATE INDEX IF NOT EXISTS idx_status_events_task
+            ON task_status_events(task_id, changed_at);
+        CREATE INDEX IF NOT EXISTS idx_status_events_new_status
+            ON task_status_events(new_status, changed_at);
+        
+        -- Первичное заполнение: создание и текущий статус существующих задач
+        INSERT INTO task_status_events (task_id, company_id, assignee_id, old_status,
+                                        new_status, changed_by, changed_at)
+        SELECT task_id, company_id, assignee_id, old_status, new_status, changed_by, changed_at
+        FROM (
+            SELECT task_id, company_id, assignee_id, NULL AS old_status, 'new' AS new_status,
+                   created_by AS changed_by, created_at AS changed_at
+            FROM tasks
+            UNION ALL
+            SELECT task_id, company_id, assignee_id, 'new', status, NULL, updated_at
+            FROM tasks
+            WHERE status <> 'new'
+        ) events
+        WHERE NOT EXISTS (SELECT 1 FROM task_status_events)
+        ORDER BY changed_at;
+        """
+        
+        # Текущее число задач по (компания, исполнитель, статус): счетчики списков
+        # и фильтров. Ведется в тех же командах, что меняют tasks
+        task_counters_table = """
+        CREATE TABLE IF NOT EXISTS task_counters (
+            company_id UUID NOT NULL REFERENCES companies(company_id),
+            assignee_id UUID NOT NULL REFERENCES users(user_id),
+            status VARCHAR(50) NOT NULL,
+            task_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (company_id, assignee_id, status)
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_task_counters_assignee ON task_counters(assignee_id);
+        
+        -- Первичное заполнение по существующим задачам
+        INSERT INTO task_counters (company_id, assignee_id, status, task_count)
+        SELECT company_id, assignee_id, status, COUNT(*)
+        FROM tasks
+        WHERE NOT EXISTS (SELECT 1 FROM task_counters)
+        GROUP BY company_id, assignee_id, status;
+        """
+        
+        # Объем файлов по задачам (логический: одинаковые блобы считаются в каждой
+        # задаче). Ведется в командах, добавляющих файлы, и сверяется сборщиком
+        # мусора хранилища; по компании и в целом - суммы по индексу
+        storage_usage_table = """
+        CREATE TABLE IF NOT EXISTS storage_usage (
+            task_id UUID PRIMARY KEY REFERENCES tasks(task_id) ON DELETE CASCADE,
+            company_id UUID NOT NULL REFERENCES companies(company_id),
+            file_count INTEGER NOT NULL DEFAULT 0,
+            bytes BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_storage_usage_company ON storage_usage(company_id);
+        
+        -- Первичное заполнение по существующим файлам
+        INSERT INTO storage_usage (task_id, company_id, file_count, bytes)
+        SELECT t.task_id, t.company_id, COUNT(*), SUM(f.file_size)
+        FROM task_files f
+        JOIN tasks t ON t.task_id = f.task_id
+        WHERE NOT EXISTS (SELECT 1 FROM storage_usage)
+        GROUP BY t.task_id, t.company_id;
+        """
+        
+        # Отправленные графики: хэш данных и параметров -> file_id в Telegram
+        chart_cache_table = """
+        CREATE TABLE IF NOT EXISTS chart_cache (
+            chart_key VARCHAR(64) PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        );
         """
         
         tables = [
@@ -129,7 +372,14 @@ class DatabaseManager:
             ("companies", companies_table), 
             ("tasks", tasks_table),
             ("task_comments", comments_table),
-            ("task_files", files_table)
+            ("task_files", files_table),
+            ("fsm_state", fsm_state_table),
+            ("chat_messages", chat_messages_table),
+            ("task_daily_stats", daily_stats_table),
+            ("task_status_events", status_events_table),
+            ("task_counters", task_counters_table),
+            ("storage_usage", storage_usage_table),
+            ("chart_cache", chart_cache_table)
         ]
         
         for table_name, table_sql in tables:
@@ -139,6 +389,19 @@ class DatabaseManager:
             except Exception as e:
                 logger.error(f"Ошибка создания таблицы {table_name}: {e}")
                 raise e
+        
+        # Триграммный индекс для поиска компаний по части названия.
+        # Расширение может требовать прав суперпользователя: без него
+        # поиск работает, но без индекса
+        try:
+            await db_connection.execute_command("""
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS idx_companies_name_trgm
+                ON companies USING GIN (name gin_trgm_ops);
+            """)
+            logger.info("Триграммный индекс компаний создан/проверен")
+        except Exception as e:
+            logger.warning(f"Не удалось создать триграммный индекс компаний: {e}")
 
 class UserManager:
     
@@ -159,6 +422,8 @@ class UserManager:
             )
             
             if result:
+                from .directory import assignee_directory
+                assignee_directory.invalidate()
                 return str(result['user_id'])
             return None
             
@@ -212,6 +477,8 @@ class UserManager:
         try:
             query = "UPDATE users SET role = $1 WHERE user_id = $2"
             await db_connection.execute_command(query, new_role, user_id)
+            from .directory import assignee_directory
+            assignee_directory.invalidate()
             return True
             
         except Exception as e:
@@ -248,6 +515,24 @@ class UserManager:
             logger.error(f"Ошибка получения исполнителей: {e}")
             return []
 
+    @staticmethod
+    async def get_open_task_counts() -> Optional[Dict[str, int]]:
+        """Количество незавершенных задач по исполнителям"""
+        try:
+            query = """
+            SELECT assignee_id, SUM(task_count) AS open_tasks
+            FROM task_counters
+            WHERE status = ANY($1::varchar[])
+            GROUP BY assignee_id
+            """
+            
+            results = await db_connection.execute_query(query, list(OPEN_STATUSES))
+            return {str(row['assignee_id']): row['open_tasks'] for row in results}
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения нагрузки исполнителей: {e}")
+            return None
+
 class CompanyManager:
     
     @staticmethod
@@ -266,6 +551,9 @@ class CompanyManager:
             )
             
             if result:
+                # Справочник компаний перечитается при следующем обращении
+                from .directory import company_directory
+                company_directory.invalidate()
                 return str(result['company_id'])
             return None
             
@@ -301,6 +589,29 @@ class CompanyManager:
             logger.error(f"Ошибка получения компаний: {e}")
             return []
     
+    @staticmethod
+    async def search_companies(text: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Поиск компаний по части названия (триграммный индекс)"""
+        try:
+            pattern = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query = """
+            SELECT company_id, name
+            FROM companies
+            WHERE name ILIKE '%' || $1 || '%'
+            ORDER BY position(lower($2) IN lower(name)), length(name), name
+            LIMIT $3
+            """
+            
+            results = await db_connection.execute_query(query, pattern, text, limit)
+            return [
+                {'company_id': str(row['company_id']), 'name': row['name']}
+                for row in results
+            ]
+            
+        except Exception as e:
+            logger.error(f"Ошибка поиска компаний: {e}")
+            return []
+    
     @staticmethod
     async def get_company_by_id(company_id: str) -> Optional[Dict[str, Any]]:
         """Получение компании по ID"""
@@ -336,20 +647,34 @@ class TaskManager:
                          deadline: datetime) -> Optional[str]:
         """Создание новой задачи"""
         try:
-            query = """
-            INSERT INTO tasks (title, description, company_id, initiator_name,
-                              initiator_phone, assignee_id, created_by, is_urgent,
-                              deadline)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-            RETURNING task_id
+            query = f"""
+            WITH new_task AS (
+                INSERT INTO tasks (title, description, company_id, initiator_name,
+                                  initiator_phone, assignee_id, created_by, is_urgent,
+                                  deadline)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                RETURNING task_id, company_id, assignee_id, is_urgent, created_by,
+                          'created'::varchar AS status
+            ), daily_stats AS (
+                {daily_stats_upsert_sql('new_task', '$10')}
+            ), status_events AS (
+                INSERT INTO task_status_events (task_id, company_id, assignee_id, new_status, changed_by)
+                SELECT task_id, company_id, assignee_id, 'new', created_by FROM new_task
+            ), counters AS (
+                {task_counters_upsert_sql('new_task', "'new'")}
+            )
+            SELECT task_id FROM new_task
             """
             
             result = await db_connection.execute_one(
                 query, title, description, company_id, initiator_name,
-                initiator_phone, assignee_id, created_by, is_urgent, deadline
+                initiator_phone, assignee_id, created_by, is_urgent, deadline,
+                get_current_time().date()
             )
             
             if result:
+                from .directory import assignee_directory
+                assignee_directory.task_created(assignee_id)
                 return str(result['task_id'])
             return None
             
@@ -357,63 +682,75 @@ class TaskManager:
             logger.error(f"Ошибка создания задачи: {e}")
             return None
     
+    # Эмодзи статусов в списках задач
+    STATUS_EMOJI = {
+        'new': '🆕',
+        'in_progress': '⏳',
+        'completed': '✅',
+        'overdue': '⚠️',
+        'cancelled': '❌'
+    }
+    
+    @staticmethod
+    def _task_list_item(row) -> Dict[str, Any]:
+        """Строка списка задач"""
+        return {
+            'task_id': str(row['task_id']),
+            'title': row['title'],
+            'description': row['description'],
+            'is_urgent': row['is_urgent'],
+            'status': row['status'],
+            'deadline_str': format_datetime(row['deadline']),
+            'deadline_short': row['deadline'].strftime('%d.%m') if row['deadline'] else 'Нет',
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'company_name': row['company_name'],
+            'status_emoji': TaskManager.STATUS_EMOJI.get(row['status'], '❓')
+        }
+    
     @staticmethod
-    async def get_user_tasks(user_id: str, role: str) -> List[Dict[str, Any]]:
-        """Получение задач пользователя в зависимости от роли"""
+    async def list_tasks(task_filter, limit: int, offset: int = 0) -> List[Dict[str, Any]]:
+        """Страница задач по фильтру (TaskFilter), новые первыми"""
         try:
-            if role in ['director', 'manager']:
-                # Директор и менеджер видят все задачи
-                query = """
-                SELECT t.task_id, t.title, t.description, t.is_urgent, t.status, 
-                       t.deadline, t.created_at, c.name as company_name
-                FROM tasks t
-                INNER JOIN companies c ON t.company_id = c.company_id
-                ORDER BY t.created_at DESC
-                """
-                results = await db_connection.execute_query(query)
-            else:
-                # Админы видят только свои задачи
-                query = """
-                SELECT t.task_id, t.title, t.description, t.is_urgent, t.status,
-                       t.deadline, t.created_at, c.name as company_name
-                FROM tasks t
-                INNER JOIN companies c ON t.company_id = c.company_id
-                WHERE t.assignee_id = $1
-                ORDER BY t.created_at DESC
-                """
-                results = await db_connection.execute_query(query, user_id)
+            where, params = task_filter.where('t')
+            query = f"""
+            SELECT t.task_id, t.title, t.description, t.is_urgent, t.status,
+                   t.deadline, t.created_at, t.updated_at, c.name as company_name
+            FROM tasks t
+            INNER JOIN companies c ON t.company_id = c.company_id
+            {where}
+            ORDER BY t.created_at DESC, t.task_id DESC
+            LIMIT {int(limit)} OFFSET {int(offset)}
+            """
             
-            tasks = []
-            status_emoji = {
-                'new': '🆕',
-                'in_progress': '⏳',
-                'completed': '✅',
-                'overdue': '⚠️',
-                'cancelled': '❌'
-            }
+            results = await db_connection.execute_query(query, *params)
+            return [TaskManager._task_list_item(row) for row in results]
             
-            for row in results:
-                deadline_str = format_datetime(row['deadline'])
-                deadline_short = row['deadline'].strftime('%d.%m') if row['deadline'] else 'Нет'
-                
-                tasks.append({
-                    'task_id': str(row['task_id']),
-                    'title': row['title'],
-                    'description': row['description'],
-                    'is_urgent': row['is_urgent'],
-                    'status': row['status'],
-                    'deadline_str': deadline_str,
-                    'deadline_short': deadline_short,
-                    'created_at': row['created_at'],
-                    'company_name': row['company_name'],
-                    'status_emoji': status_emoji.get(row['status'], '❓')
-                })
+        except Exception as e:
+            logger.error(f"Ошибка получения списка задач: {e}")
+            return []
+    
+    @staticmethod
+    async def count_tasks(task_filter) -> Optional[int]:
+        """Количество задач по фильтру.
+        
+        Фильтр по компании, исполнителю и статусу считается по task_counters
+        и не зависит от размера tasks; остальные - COUNT по индексам tasks.
+        """
+        try:
+            if task_filter.counter_compatible:
+                where, params = task_filter.where('tc')
+                query = f"SELECT COALESCE(SUM(task_count), 0) FROM task_counters tc {where}"
+            else:
+                where, params = task_filter.where('t')
+                query = f"SELECT COUNT(*) FROM tasks t {where}"
             
-            return tasks
+            result = await db_connection.execute_one(query, *params)
+            return result[0] if result else 0
             
         except Exception as e:
-            logger.error(f"Ошибка получения задач: {e}")
-            return []
+            logger.error(f"Ошибка подсчета задач: {e}")
+            return None
     
     @staticmethod
     async def get_companies_with_tasks(user_id: str, role: str) -> List[Dict[str, Any]]:
@@ -421,22 +758,22 @@ class TaskManager:
         try:
             if role in ['director', 'manager']:
                 query = """
-                SELECT c.company_id, c.name, COUNT(t.task_id) as task_count
-                FROM companies c
-                LEFT JOIN tasks t ON c.company_id = t.company_id
+                SELECT c.company_id, c.name, SUM(tc.task_count) as task_count
+                FROM task_counters tc
+                INNER JOIN companies c ON c.company_id = tc.company_id
                 GROUP BY c.company_id, c.name
-                HAVING COUNT(t.task_id) > 0
+                HAVING SUM(tc.task_count) > 0
                 ORDER BY c.name
                 """
                 results = await db_connection.execute_query(query)
             else:
                 query = """
-                SELECT c.company_id, c.name, COUNT(t.task_id) as task_count
-                FROM companies c
-                LEFT JOIN tasks t ON c.company_id = t.company_id
-                WHERE t.assignee_id = $1
+                SELECT c.company_id, c.name, SUM(tc.task_count) as task_count
+                FROM task_counters tc
+                INNER JOIN companies c ON c.company_id = tc.company_id
+                WHERE tc.assignee_id = $1
                 GROUP BY c.company_id, c.name
-                HAVING COUNT(t.task_id) > 0
+                HAVING SUM(tc.task_count) > 0
                 ORDER BY c.name
                 """
                 results = await db_connection.execute_query(query, user_id)
@@ -455,16 +792,72 @@ class TaskManager:
             logger.error(f"Ошибка получения компаний: {e}")
             return []
     
+    @staticmethod
+    async def search_tasks(text: str, task_filter, after: Optional[tuple] = None,
+                           limit: int = 10, prefix: bool = False) -> List[Dict[str, Any]]:
+        """Полнотекстовый поиск задач с сортировкой по релевантности.
+        
+        task_filter (TaskFilter) задает видимость по роли и доп. условия;
+        after - ключ (rank, task_id) последней строки предыдущей страницы;
+        prefix - text уже является выражением to_tsquery (поиск по началу слов).
+        """
+        try:
+            conditions, params = task_filter.conditions('t', start=4)
+            scope = "".join(f" AND {condition}" for condition in conditions)
+            parser = 'to_tsquery' if prefix else 'websearch_to_tsquery'
+            
+            query = f"""
+            SELECT task_id, title, status, is_urgent, deadline, company_name, rank
+            FROM (
+                SELECT t.task_id, t.title, t.status, t.is_urgent, t.deadline,
+                       c.name AS company_name,
+                       ts_rank_cd(t.search_vector, q.query) AS rank
+                FROM tasks t
+                CROSS JOIN {parser}('russian', $1) AS q(query)
+                INNER JOIN companies c ON t.company_id = c.company_id
+                WHERE t.search_vector @@ q.query{scope}
+            ) found
+            WHERE $2::real IS NULL OR (rank, task_id) < ($2::real, $3::uuid)
+            ORDER BY rank DESC, task_id DESC
+            LIMIT {int(limit)}
+            """
+            
+            rank, task_id = after if after else (None, None)
+            results = await db_connection.execute_query(query, text, rank, task_id, *params)
+            
+            return [
+                {
+                    'task_id': str(row['task_id']),
+                    'title': row['title'],
+                    'status': row['status'],
+                    'is_urgent': row['is_urgent'],
+                    'deadline': row['deadline'],
+                    'company_name': row['company_name'],
+                    'rank': row['rank']
+                }
+                for row in results
+            ]
+            
+        except Exception as e:
+            logger.error(f"Ошибка поиска задач: {e}")
+            return []
+    
     @staticmethod
     async def get_task_by_id(task_id: str) -> Optional[Dict[str, Any]]:
         """Получение подробной информации о задаче"""
         try:
             query = """
             SELECT t.task_id, t.title, t.description, t.is_urgent, t.status,
-                   t.deadline, t.created_at, c.name as company_name,
-                   t.initiator_name, t.initiator_phone, t.assignee_id
+                   t.deadline, t.created_at, t.updated_at, c.name as company_name,
+                   t.initiator_name, t.initiator_phone, t.assignee_id,
+                   f.file_count, f.files_updated_at
             FROM tasks t
             INNER JOIN companies c ON t.company_id = c.company_id
+            CROSS JOIN LATERAL (
+                SELECT COUNT(*) AS file_count, MAX(created_at) AS files_updated_at
+                FROM task_files
+                WHERE task_id = t.task_id
+            ) f
             WHERE t.task_id = $1
             """
             
@@ -489,10 +882,13 @@ class TaskManager:
                     'status_emoji': status_emoji.get(result['status'], '❓'),
                     'deadline_str': format_datetime(result['deadline']),
                     'created_at': result['created_at'],
+                    'updated_at': result['updated_at'],
                     'company_name': result['company_name'],
                     'initiator_name': result['initiator_name'],
                     'initiator_phone': result['initiator_phone'],
-                    'assignee_id': str(result['assignee_id'])
+                    'assignee_id': str(result['assignee_id']),
+                    # Версия карточки: меняется вместе с задачей и ее файлами
+                    'version': (result['updated_at'], result['file_count'], result['files_updated_at'])
                 }
             return None
             
@@ -501,45 +897,412 @@ class TaskManager:
             return None
     
     @staticmethod
-    async def update_task_status(task_id: str, new_status: str) -> bool:
+    async def update_task_status(task_id: str, new_status: str,
+                                 changed_by: str = None) -> bool:
         """Изменение статуса задачи"""
         try:
-            query = """
-            UPDATE tasks 
-            SET status = $1, updated_at = NOW()
-            WHERE task_id = $2
+            query = f"""
+            WITH previous AS (
+                SELECT task_id, status AS old_status
+                FROM tasks
+                WHERE task_id = $2
+                FOR UPDATE
+            ), changed AS (
+                UPDATE tasks t
+                SET status = $1, updated_at = NOW()
+                FROM previous c
+                WHERE t.task_id = c.task_id
+                RETURNING t.task_id, t.company_id, t.assignee_id, t.is_urgent, t.status, c.old_status
+            ), daily_stats AS (
+                {daily_stats_upsert_sql('changed', '$3')}
+            ), status_events AS (
+                {status_events_insert_sql('changed', '$4::uuid')}
+            ), counters AS (
+                {task_counters_upsert_sql('changed', 'status', 'old_status')}
+            )
+            SELECT assignee_id, old_status, status FROM changed
             """
             
-            await db_connection.execute_command(query, new_status, task_id)
+            result = await db_connection.execute_one(
+                query, new_status, task_id, get_current_time().date(), changed_by
+            )
+            if result:
+                from .directory import assignee_directory
+                assignee_directory.task_status_changed(
+                    str(result['assignee_id']), result['old_status'], result['status']
+                )
             return True
             
         except Exception as e:
             logger.error(f"Ошибка изменения статуса задачи: {e}")
             return False
 
-class FileManager:
+    @staticmethod
+    async def mark_overdue_tasks(now: datetime) -> List[Dict[str, Any]]:
+        """Перевод просроченных задач в статус 'overdue'"""
+        try:
+            query = f"""
+            WITH expired AS (
+                SELECT task_id, status AS old_status
+                FROM tasks
+                WHERE deadline < $1 
+                AND status IN ('new', 'in_progress')
+                FOR UPDATE
+            ), overdue AS (
+                UPDATE tasks t
+                SET status = 'overdue', updated_at = NOW()
+                FROM expired e
+                WHERE t.task_id = e.task_id
+                RETURNING t.task_id, t.title, t.assignee_id, t.company_id, t.is_urgent, t.status,
+                          e.old_status
+            ), daily_stats AS (
+                {daily_stats_upsert_sql('overdue', '$2')}
+            ), status_events AS (
+                {status_events_insert_sql('overdue', 'NULL::uuid')}
+            ), counters AS (
+                {task_counters_upsert_sql('overdue', 'status', 'old_status')}
+            )
+            SELECT task_id, title, assignee_id FROM overdue
+            """
+            
+            results = await db_connection.execute_query(query, now, now.date())
+            return [dict(row) for row in results]
+            
+        except Exception as e:
+            logger.error(f"Ошибка обновления просроченных задач: {e}")
+            return []
+
+class AnalyticsManager:
     
     @staticmethod
-    async def save_file_info(task_id: str, user_id: str, file_name: str,
-                           file_path: str, file_size: int, content_type: str,
-                           thumbnail_path: str = None) -> bool:
-        """Сохранение информации о файле в БД"""
+    async def get_daily_stats(date_from: date, date_to: date) -> List[Dict[str, Any]]:
+        """Строки дневной сводки за период (включительно)"""
         try:
             query = """
-            INSERT INTO task_files (task_id, user_id, file_name, file_path,
-                                  file_size, content_type, thumbnail_path)
-            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            SELECT s.day, s.status, s.task_count, s.urgent_count,
+                   s.company_id, c.name AS company_name,
+                   s.assignee_id, u.first_name, u.last_name, u.username
+            FROM task_daily_stats s
+            JOIN companies c ON s.company_id = c.company_id
+            JOIN users u ON s.assignee_id = u.user_id
+            WHERE s.day BETWEEN $1 AND $2
+            """
+            
+            results = await db_connection.execute_query(query, date_from, date_to)
+            return [dict(row) for row in results]
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения дневной сводки: {e}")
+            return []
+
+    @staticmethod
+    async def get_status_events(since: datetime, until: datetime) -> List[Dict[str, Any]]:
+        """Журнал статусов задач, выполненных в промежутке [since, until)"""
+        try:
+            query = """
+            WITH completed AS (
+                SELECT DISTINCT task_id
+                FROM task_status_events
+                WHERE new_status = 'completed'
+                AND changed_at >= $1 AND changed_at < $2
+            )
+            SELECT e.task_id, e.old_status, e.new_status, e.changed_at,
+                   e.company_id, c.name AS company_name,
+                   e.assignee_id, u.first_name, u.last_name, u.username
+            FROM task_status_events e
+            JOIN completed USING (task_id)
+            JOIN companies c ON e.company_id = c.company_id
+            JOIN users u ON e.assignee_id = u.user_id
+            WHERE e.changed_at < $2
+            """
+            
+            results = await db_connection.execute_query(query, since, until)
+            return [dict(row) for row in results]
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения журнала статусов: {e}")
+            return []
+
+class ExportManager:
+    """Потоковая выгрузка задач: строки не собираются в памяти целиком.
+    
+    Ошибки не подавляются - выгрузка прерывается и сообщает о сбое.
+    """
+    
+    # Статусы в выгрузке
+    STATUS_TITLES = {
+        'new': 'Новая',
+        'in_progress': 'В работе',
+        'completed': 'Выполнена',
+        'overdue': 'Просрочена',
+        'cancelled': 'Отменена'
+    }
+    
+    # Колонки выгрузки: заголовок -> выражение SQL
+    COLUMNS = {
+        'Задача': "t.title",
+        'Описание': "t.description",
+        'Компания': "c.name",
+        'Статус': "COALESCE(st.title, t.status)",
+        'Срочная': "CASE WHEN t.is_urgent THEN 'Да' ELSE 'Нет' END",
+        'Дедлайн': f"to_char(t.deadline AT TIME ZONE {TIMEZONE_SQL}, 'DD.MM.YYYY HH24:MI')",
+        'Исполнитель': "COALESCE(NULLIF(concat_ws(' ', u.first_name, u.last_name), ''), u.username)",
+        'Инициатор': "t.initiator_name",
+        'Телефон': "t.initiator_phone",
+        'Создана': f"to_char(t.created_at AT TIME ZONE {TIMEZONE_SQL}, 'DD.MM.YYYY HH24:MI')",
+        'Изменена': f"to_char(t.updated_at AT TIME ZONE {TIMEZONE_SQL}, 'DD.MM.YYYY HH24:MI')"
+    }
+    
+    @classmethod
+    def tasks_query(cls, task_filter) -> tuple:
+        """Запрос выгрузки и его параметры по фильтру TaskFilter"""
+        where, params = task_filter.where('t')
+        statuses = ", ".join(
+            f"('{status}', '{title}')" for status, title in cls.STATUS_TITLES.items()
+        )
+        columns = ",\n                   ".join(
+            f'{expression} AS "{header}"' for header, expression in cls.COLUMNS.items()
+        )
+        query = f"""
+            SELECT {columns}
+            FROM tasks t
+            JOIN companies c ON t.company_id = c.company_id
+            JOIN users u ON t.assignee_id = u.user_id
+            LEFT JOIN (VALUES {statuses}) AS st(status, title) ON st.status = t.status
+            {where}
+            ORDER BY t.created_at
+        """
+        return query, params
+    
+    @staticmethod
+    async def count_tasks(task_filter) -> int:
+        """Количество задач по фильтру (для прогресса выгрузки)"""
+        where, params = task_filter.where('t')
+        result = await db_connection.execute_one(
+            f"SELECT COUNT(*) AS total FROM tasks t {where}", *params
+        )
+        return result['total'] if result else 0
+    
+    @classmethod
+    async def copy_tasks_csv(cls, task_filter, output: Callable[[bytes], Awaitable[None]],
+                             timeout: float = None) -> None:
+        """COPY ... TO STDOUT в формате CSV: фрагменты передаются в output"""
+        query, params = cls.tasks_query(task_filter)
+        async with db_connection.acquire() as conn:
+            await conn.copy_from_query(
+                query, *params, output=output, format='csv', header=True, timeout=timeout
+            )
+    
+    @classmethod
+    async def iter_tasks(cls, task_filter, batch_size: int,
+                         timeout: float = None) -> AsyncIterator[List[tuple]]:
+        """Пачки строк выгрузки из серверного курсора"""
+        query, params = cls.tasks_query(task_filter)
+        async with db_connection.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                cursor = await conn.cursor(query, *params)
+                while True:
+                    rows = await cursor.fetch(batch_size, timeout=timeout)
+                    if not rows:
+                        break
+                    yield [tuple(row) for row in rows]
+
+class ImportManager:
+    
+    # Колонки временной таблицы импорта (порядок записей для COPY)
+    STAGING_COLUMNS = [
+        'row_number', 'title', 'description', 'company_id', 'initiator_name',
+        'initiator_phone', 'assignee_id', 'is_urgent', 'deadline'
+    ]
+    
+    @staticmethod
+    async def import_tasks(records: List[tuple], created_by: str) -> int:
+        """Создание задач из проверенных строк одной транзакцией.
+        
+        Строки загружаются COPY во временную таблицу, затем одна команда
+        переносит их в tasks и пишет дневную сводку и журнал статусов.
+        Ошибка откатывает весь импорт и пробрасывается вызывающему.
+        """
+        try:
+            query = f"""
+            WITH new_task AS (
+                INSERT INTO tasks (title, description, company_id, initiator_name,
+                                  initiator_phone, assignee_id, created_by, is_urgent,
+                                  deadline)
+                SELECT title, description, company_id, initiator_name,
+                       initiator_phone, assignee_id, $1, is_urgent, deadline
+                FROM task_import
+                ORDER BY row_number
+                RETURNING task_id, company_id, assignee_id, is_urgent, created_by,
+                          'created'::varchar AS status
+            ), daily_stats AS (
+                {daily_stats_upsert_sql('new_task', '$2')}
+            ), status_events AS (
+                INSERT INTO task_status_events (task_id, company_id, assignee_id, new_status, changed_by)
+                SELECT task_id, company_id, assignee_id, 'new', created_by FROM new_task
+            ), counters AS (
+                {task_counters_upsert_sql('new_task', "'new'")}
+            )
+            SELECT COUNT(*) FROM new_task
+            """
+            
+            async with db_connection.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute("""
+                        CREATE TEMP TABLE task_import (
+                            row_number INTEGER NOT NULL,
+                            title VARCHAR(500) NOT NULL,
+                            description TEXT,
+                            company_id UUID NOT NULL,
+                            initiator_name VARCHAR(255) NOT NULL,
+                            initiator_phone VARCHAR(50) NOT NULL,
+                            assignee_id UUID NOT NULL,
+                            is_urgent BOOLEAN NOT NULL,
+                            deadline TIMESTAMP WITH TIME ZONE NOT NULL
+                        ) ON COMMIT DROP
+                    """)
+                    await conn.copy_records_to_table(
+                        'task_import', records=records, columns=ImportManager.STAGING_COLUMNS
+                    )
+                    imported = await conn.fetchval(query, created_by, get_current_time().date())
+            
+            from .directory import assignee_directory
+            assignee_directory.invalidate_counts()
+            return imported
+            
+        except Exception as e:
+            logger.error(f"Ошибка импорта задач: {e}")
+            raise
+
+class ChartCacheManager:
+    
+    @staticmethod
+    async def get_file_id(chart_key: str) -> Optional[str]:
+        """file_id ранее отправленного графика"""
+        try:
+            query = "SELECT file_id FROM chart_cache WHERE chart_key = $1"
+            result = await db_connection.execute_one(query, chart_key)
+            return result['file_id'] if result else None
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения графика из кэша: {e}")
+            return None
+    
+    @staticmethod
+    async def save_file_id(chart_key: str, file_id: str) -> bool:
+        """Запоминание file_id отправленного графика"""
+        try:
+            query = """
+            INSERT INTO chart_cache (chart_key, file_id)
+            VALUES ($1, $2)
+            ON CONFLICT (chart_key) DO UPDATE
+            SET file_id = EXCLUDED.file_id, created_at = NOW()
             """
             
+            await db_connection.execute_command(query, chart_key, file_id)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка сохранения графика в кэш: {e}")
+            return False
+    
+    @staticmethod
+    async def delete_file_id(chart_key: str) -> bool:
+        """Удаление недействительного file_id"""
+        try:
             await db_connection.execute_command(
-                query, task_id, user_id, file_name, file_path,
-                file_size, content_type, thumbnail_path
+                "DELETE FROM chart_cache WHERE chart_key = $1", chart_key
             )
             return True
             
         except Exception as e:
-            logger.error(f"Ошибка сохранения файла: {e}")
+            logger.error(f"Ошибка удаления графика из кэша: {e}")
             return False
+
+class FileManager:
+    
+    @staticmethod
+    async def save_files_info(task_id: str, user_id: str, files: List[Dict[str, Any]]) -> int:
+        """Сохранение пачки файлов задачи одной командой; число добавленных строк.
+        
+        files - результаты file_storage.store_file (с полями type и
+        telegram_file_id, если файл получен от Telegram). Одинаковые
+        блобы пачки дают одну запись file_blobs.
+        """
+        if not files:
+            return 0
+        try:
+            query = """
+            WITH incoming AS (
+                SELECT *
+                FROM unnest($3::varchar[], $4::varchar[], $5::bigint[], $6::varchar[],
+                            $7::varchar[], $8::char(64)[], $9::varchar[], $10::text[],
+                            $11::varchar[], $12::bigint[])
+                    AS f(file_name, file_path, file_size, content_type, thumbnail_path,
+                         blob_hash, media_type, telegram_file_id, telegram_file_unique_id,
+                         phash)
+            ),
+            blobs AS (
+                INSERT INTO file_blobs (blob_hash, file_path, thumbnail_path, file_size,
+                                        content_type)
+                SELECT blob_hash, MIN(file_path), MIN(thumbnail_path), MIN(file_size),
+                       MIN(content_type)
+                FROM incoming
+                WHERE blob_hash IS NOT NULL
+                GROUP BY blob_hash
+                ON CONFLICT (blob_hash) DO UPDATE
+                SET thumbnail_path = COALESCE(file_blobs.thumbnail_path, EXCLUDED.thumbnail_path)
+            ),
+            usage AS (
+                INSERT INTO storage_usage (task_id, company_id, file_count, bytes)
+                SELECT t.task_id, t.company_id, COUNT(*), SUM(i.file_size)
+                FROM incoming i
+                CROSS JOIN tasks t
+                WHERE t.task_id = $1
+                GROUP BY t.task_id, t.company_id
+                ON CONFLICT (task_id) DO UPDATE
+                SET file_count = storage_usage.file_count + EXCLUDED.file_count,
+                    bytes = storage_usage.bytes + EXCLUDED.bytes,
+                    updated_at = NOW()
+            )
+            INSERT INTO task_files (task_id, user_id, file_name, file_path,
+                                  file_size, content_type, thumbnail_path, blob_hash,
+                                  media_type, telegram_file_id, telegram_file_unique_id, phash)
+            SELECT $1, $2, file_name, file_path, file_size, content_type, thumbnail_path,
+                   blob_hash, media_type, telegram_file_id, telegram_file_unique_id, phash
+            FROM incoming
+            """
+            
+            columns = [
+                [file['original_name'] for file in files],
+                [file['file_path'] for file in files],
+                [file['size'] for file in files],
+                [file['content_type'] for file in files],
+                [file.get('thumbnail_path') for file in files],
+                [file.get('blob_hash') for file in files],
+                [file.get('type') for file in files],
+                [file.get('telegram_file_id') for file in files],
+                [file.get('telegram_file_unique_id') for file in files],
+                [file.get('phash') for file in files]
+            ]
+            result = await db_connection.execute_command(query, task_id, user_id, *columns)
+            return int(result.split()[-1])
+            
+        except Exception as e:
+            logger.error(f"Ошибка сохранения файлов задачи {task_id}: {e}")
+            return 0
+    
+    @staticmethod
+    async def get_task_phashes(task_id: str) -> List[int]:
+        """Перцептивные хэши фото задачи (для отсева похожих снимков)"""
+        try:
+            query = "SELECT phash FROM task_files WHERE task_id = $1 AND phash IS NOT NULL"
+            results = await db_connection.execute_query(query, task_id)
+            return [row['phash'] for row in results]
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения хэшей фото задачи {task_id}: {e}")
+            return []
     
     @staticmethod
     async def get_task_files(task_id: str) -> List[Dict[str, Any]]:
@@ -547,7 +1310,8 @@ class FileManager:
         try:
             query = """
             SELECT f.file_id, f.file_name, f.file_path, f.file_size,
-                   f.content_type, f.thumbnail_path, f.created_at,
+                   f.content_type, f.thumbnail_path, f.blob_hash, f.created_at,
+                   f.media_type, f.telegram_file_id,
                    u.first_name, u.last_name, u.username
             FROM task_files f
             JOIN users u ON f.user_id = u.user_id
@@ -570,6 +1334,9 @@ class FileManager:
                     'file_size': row['file_size'],
                     'content_type': row['content_type'],
                     'thumbnail_path': row['thumbnail_path'],
+                    'blob_hash': row['blob_hash'],
+                    'media_type': row['media_type'],
+                    'telegram_file_id': row['telegram_file_id'],
                     'created_at': row['created_at'],
                     'uploader_name': uploader_name
                 })
@@ -578,4 +1345,180 @@ class FileManager:
             
         except Exception as e:
             logger.error(f"Ошибка получения файлов: {e}")
-            return []
\ No newline at end of file
+            return []
+    
+    @staticmethod
+    async def update_telegram_ids(updates: List[tuple]) -> bool:
+        """Новые идентификаторы Telegram после загрузки с диска.
+        
+        updates - кортежи (file_id, media_type, telegram_file_id, telegram_file_unique_id).
+        """
+        try:
+            query = """
+            UPDATE task_files f
+            SET media_type = u.media_type,
+                telegram_file_id = u.telegram_file_id,
+                telegram_file_unique_id = u.telegram_file_unique_id
+            FROM unnest($1::uuid[], $2::varchar[], $3::text[], $4::varchar[])
+                AS u(file_id, media_type, telegram_file_id, telegram_file_unique_id)
+            WHERE f.file_id = u.file_id
+            """
+            
+            columns = [list(column) for column in zip(*updates)]
+            await db_connection.execute_command(query, *columns)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка обновления идентификаторов файлов: {e}")
+            return False
+
+class StorageManager:
+    """Запросы сборщика мусора хранилища и учет объема файлов"""
+    
+    @staticmethod
+    async def unreferenced_blobs(blob_hashes: List[str]) -> Optional[List[str]]:
+        """Хэши из списка, на которые не ссылается ни одна строка task_files.
+        
+        None - ошибка базы: в этом случае ничего удалять нельзя.
+        """
+        try:
+            query = """
+            SELECT h.blob_hash
+            FROM unnest($1::char(64)[]) AS h(blob_hash)
+            WHERE NOT EXISTS (SELECT 1 FROM task_files f WHERE f.blob_hash = h.blob_hash)
+            """
+            results = await db_connection.execute_query(query, blob_hashes)
+            return [row['blob_hash'] for row in results]
+            
+        except Exception as e:
+            logger.error(f"Ошибка поиска неиспользуемых блобов: {e}")
+            return None
+    
+    @staticmethod
+    async def missing_tasks(task_ids: List[str]) -> Optional[List[str]]:
+        """id из списка, для которых нет задачи; None - ошибка базы"""
+        try:
+            query = """
+            SELECT t.task_id::text AS task_id
+            FROM unnest($1::uuid[]) AS t(task_id)
+            WHERE NOT EXISTS (SELECT 1 FROM tasks WHERE tasks.task_id = t.task_id)
+            """
+            results = await db_connection.execute_query(query, task_ids)
+            return [row['task_id'] for row in results]
+            
+        except Exception as e:
+            logger.error(f"Ошибка поиска удаленных задач: {e}")
+            return None
+    
+    @staticmethod
+    async def forget_blobs(blob_hashes: List[str]) -> int:
+        """Удаление записей file_blobs для блобов без ссылок"""
+        try:
+            query = """
+            DELETE FROM file_blobs b
+            WHERE b.blob_hash = ANY($1::char(64)[])
+            AND NOT EXISTS (SELECT 1 FROM task_files f WHERE f.blob_hash = b.blob_hash)
+            """
+            result = await db_connection.execute_command(query, blob_hashes)
+            return int(result.split()[-1])
+            
+        except Exception as e:
+            logger.error(f"Ошибка удаления записей блобов: {e}")
+            return 0
+    
+    @staticmethod
+    async def reconcile_usage() -> bool:
+        """Сверка storage_usage с task_files (после сбоев и удалений)"""
+        try:
+            query = """
+            WITH actual AS (
+                SELECT t.task_id, t.company_id, COUNT(*) AS file_count,
+                       SUM(f.file_size) AS bytes
+                FROM task_files f
+                JOIN tasks t ON t.task_id = f.task_id
+                GROUP BY t.task_id, t.company_id
+            ),
+            stale AS (
+                DELETE FROM storage_usage u
+                WHERE NOT EXISTS (SELECT 1 FROM actual a WHERE a.task_id = u.task_id)
+            )
+            INSERT INTO storage_usage (task_id, company_id, file_count, bytes)
+            SELECT task_id, company_id, file_count, bytes FROM actual
+            ON CONFLICT (task_id) DO UPDATE
+            SET company_id = EXCLUDED.company_id,
+                file_count = EXCLUDED.file_count,
+                bytes = EXCLUDED.bytes,
+                updated_at = NOW()
+            WHERE (storage_usage.company_id, storage_usage.file_count, storage_usage.bytes)
+                IS DISTINCT FROM (EXCLUDED.company_id, EXCLUDED.file_count, EXCLUDED.bytes)
+            """
+            await db_connection.execute_command(query)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка сверки объема файлов: {e}")
+            return False
+    
+    @staticmethod
+    async def get_usage(company_id: str = None, task_id: str = None) -> Optional[Dict[str, int]]:
+        """Объем файлов задачи, компании или всего хранилища: files и bytes"""
+        try:
+            if task_id:
+                where, args = "WHERE task_id = $1", [task_id]
+            elif company_id:
+                where, args = "WHERE company_id = $1", [company_id]
+            else:
+                where, args = "", []
+            
+            query = f"""
+            SELECT COALESCE(SUM(file_count), 0) AS files, COALESCE(SUM(bytes), 0) AS bytes
+            FROM storage_usage {where}
+            """
+            result = await db_connection.execute_one(query, *args)
+            return {'files': int(result['files']), 'bytes': int(result['bytes'])}
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения объема файлов: {e}")
+            return None
+
+class ChatHistoryManager:
+    
+    @staticmethod
+    async def get_history(chat_id: int) -> Optional[Dict[str, Any]]:
+        """Получение истории сообщений бота в чате"""
+        try:
+            query = "SELECT history FROM chat_messages WHERE chat_id = $1"
+            result = await db_connection.execute_one(query, chat_id)
+            
+            if result:
+                history = json.loads(result['history'])
+                return {
+                    'messages': history.get('messages', []),
+                    'keyboard': history.get('keyboard')
+                }
+            return None
+            
+        except Exception as e:
+            logger.error(f"Ошибка получения истории чата {chat_id}: {e}")
+            return None
+    
+    @staticmethod
+    async def save_histories(histories: Dict[int, Dict[str, Any]]) -> bool:
+        """Сохранение историй нескольких чатов одной командой"""
+        try:
+            query = """
+            INSERT INTO chat_messages (chat_id, history, updated_at)
+            SELECT c, h::jsonb, NOW()
+            FROM unnest($1::bigint[], $2::text[]) AS u(c, h)
+            ON CONFLICT (chat_id) DO UPDATE
+            SET history = EXCLUDED.history, updated_at = EXCLUDED.updated_at
+            """
+            
+            chat_ids = list(histories)
+            payloads = [json.dumps(histories[chat_id]) for chat_id in chat_ids]
+            await db_connection.execute_command(query, chat_ids, payloads)
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка сохранения истории чатов: {e}")
+            return False
@@ -0,0 +1,122 @@
+from datetime import date, datetime, time, timedelta
+from typing import Any, List, Optional, Tuple
+from .models import TIMEZONE, get_current_time
+
+# Роли, которые видят все задачи (остальные - только назначенные им)
+FULL_ACCESS_ROLES = ('director', 'manager')
+
+# Окна дедлайна: код -> название
+DEADLINE_WINDOWS = {
+    'd': 'срок сегодня',
+    'w': 'срок в ближайшую неделю',
+    'o': 'срок прошел'
+}
+
+# Завершенные задачи: в окно 'o' не попадают, если статус не выбран явно
+CLOSED_STATUSES = ['completed', 'cancelled']
+
+def deadline_bounds(window: str, now: datetime) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Границы дедлайна [from, to) для окна DEADLINE_WINDOWS"""
+    if window == 'd':
+        return now, TaskFilter.day_start(now.date() + timedelta(days=1))
+    if window == 'w':
+        return now, now + timedelta(days=7)
+    if window == 'o':
+        return None, now
+    raise ValueError(f"Неизвестное окно дедлайна: {window}")
+
+class TaskFilter:
+    """Фильтр задач для построения условия WHERE.
+
+    Все значения передаются параметрами запроса; период задается датами
+    создания в часовом поясе бота (обе границы включительно), окно
+    дедлайна - кодом DEADLINE_WINDOWS относительно момента запроса.
+    Пользователь без полного доступа всегда ограничен своими задачами.
+    """
+
+    def __init__(self, company_id: str = None, assignee_id: str = None,
+                 status: str = None, date_from: date = None, date_to: date = None,
+                 viewer_id: str = None, viewer_role: str = None,
+                 is_urgent: bool = None, deadline_window: str = None):
+        self.company_id = company_id
+        self.assignee_id = assignee_id
+        self.status = status
+        self.date_from = date_from
+        self.date_to = date_to
+        self.viewer_id = viewer_id
+        self.viewer_role = viewer_role
+        self.is_urgent = is_urgent
+        self.deadline_window = deadline_window
+
+    @property
+    def counter_compatible(self) -> bool:
+        """Фильтр выражается через ключи task_counters (компания, исполнитель, статус)"""
+        return not (self.date_from or self.date_to or
+                    self.is_urgent is not None or self.deadline_window)
+
+    def where(self, alias: str = 't', start: int = 1) -> Tuple[str, List[Any]]:
+        """Условие WHERE (или пустая строка) и его параметры, начиная с $start"""
+        conditions, params = self.conditions(alias, start)
+        if not conditions:
+            return "", params
+        return "WHERE " + " AND ".join(conditions), params
+
+    def conditions(self, alias: str = 't', start: int = 1) -> Tuple[List[str], List[Any]]:
+        """Условия фильтра для объединения через AND и их параметры"""
+        conditions: List[str] = []
+        params: List[Any] = []
+
+        def add(condition: str, value: Any) -> None:
+            params.append(value)
+            conditions.append(condition.format(alias=alias, param=f"${start + len(params) - 1}"))
+
+        if self.company_id:
+            add("{alias}.company_id = {param}", self.company_id)
+        if self.assignee_id:
+            add("{alias}.assignee_id = {param}", self.assignee_id)
+        if self.viewer_id and self.viewer_role not in FULL_ACCESS_ROLES:
+            add("{alias}.assignee_id = {param}", self.viewer_id)
+        if self.status:
+            add("{alias}.status = {param}", self.status)
+        if self.date_from:
+            add("{alias}.created_at >= {param}", self.day_start(self.date_from))
+        if self.date_to:
+            add("{alias}.created_at < {param}", self.day_start(self.date_to + timedelta(days=1)))
+        if self.is_urgent is not None:
+            add("{alias}.is_urgent = {param}", self.is_urgent)
+        if self.deadline_window:
+            deadline_from, deadline_to = deadline_bounds(self.deadline_window, get_current_time())
+            if deadline_from:
+                add("{alias}.deadline >= {param}", deadline_from)
+            if deadline_to:
+                add("{alias}.deadline < {param}", deadline_to)
+            if self.deadline_window == 'o' and not self.status:
+                add("{alias}.status <> ALL({param}::varchar[])", CLOSED_STATUSES)
+
+        return conditions, params
+
+    @staticmethod
+    def day_start(day: date) -> datetime:
+        """Начало дня в часовом поясе бота"""
+        return datetime.combine(day, time.min, tzinfo=TIMEZONE)
+
+    def describe(self, company_name: Optional[str] = None,
+                 assignee_name: Optional[str] = None,
+                 status_name: Optional[str] = None) -> str:
+        """Текстовое описание фильтра для сообщений"""
+        parts = []
+        if company_name:
+            parts.append(f"компания: {company_name}")
+        if assignee_name:
+            parts.append(f"исполнитель: {assignee_name}")
+        if self.status:
+            parts.append(f"статус: {status_name or self.status}")
+        if self.date_from:
+            parts.append(f"с {self.date_from.strftime('%d.%m.%Y')}")
+        if self.date_to:
+            parts.append(f"по {self.date_to.strftime('%d.%m.%Y')}")
+        if self.is_urgent is not None:
+            parts.append("срочные" if self.is_urgent else "обычные")
+        if self.deadline_window:
+            parts.append(DEADLINE_WINDOWS[self.deadline_window])
+        return ", ".join(parts) if parts else "все задачи"
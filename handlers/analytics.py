@@ -0,0 +1,160 @@
+from aiogram import Dispatcher
+from aiogram.types import Message
+from database.models import UserManager
+from services.analytics import (
+    PERIODS, period_report, breakdown_report, completion_time_report,
+    load_stats, trend_chart_data, workload_chart_data
+)
+from services.charts import chart_service
+from utils.chat_cleaner import chat_cleaner
+from utils.keyboards import get_main_keyboard, get_analytics_keyboard
+from utils.routing import menu_router
+from utils.decorators import smart_clear_chat
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def get_director(message: Message):
+    """Пользователь, если он директор; иначе отправляет отказ"""
+    user = await UserManager.get_user_by_telegram_id(message.from_user.id)
+    if not user or user['role'] != 'director':
+        await message.answer(
+            "❌ Аналитика доступна только директору.",
+            reply_markup=get_main_keyboard(user['role'] if user else 'admin')
+        )
+        return None
+    return user
+
+@smart_clear_chat
+async def analytics_menu_handler(message: Message):
+    """Обработчик кнопки 'Аналитика'"""
+    try:
+        logger.info(f"Аналитика от пользователя {message.from_user.id}")
+
+        if not await get_director(message):
+            return
+
+        await message.answer(
+            "📊 Аналитика\n\n"
+            "Выберите отчет:",
+            reply_markup=get_analytics_keyboard()
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка в analytics_menu_handler: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+@smart_clear_chat
+async def period_report_handler(message: Message):
+    """Обработчик кнопок 'За день', 'За неделю', 'За месяц'"""
+    try:
+        logger.info(f"Отчет '{message.text}' от пользователя {message.from_user.id}")
+
+        if not await get_director(message):
+            return
+
+        title, days = PERIODS[message.text]
+        await message.answer(
+            await period_report(title, days),
+            reply_markup=get_analytics_keyboard()
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка в period_report_handler: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+@smart_clear_chat
+async def assignees_report_handler(message: Message):
+    """Обработчик кнопки 'По исполнителям'"""
+    try:
+        logger.info(f"Отчет по исполнителям от пользователя {message.from_user.id}")
+
+        if not await get_director(message):
+            return
+
+        await message.answer(
+            await breakdown_report("👥 По исполнителям", 'assignee_name'),
+            reply_markup=get_analytics_keyboard()
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка в assignees_report_handler: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+@smart_clear_chat
+async def companies_report_handler(message: Message):
+    """Обработчик кнопки 'По компаниям'"""
+    try:
+        logger.info(f"Отчет по компаниям от пользователя {message.from_user.id}")
+
+        if not await get_director(message):
+            return
+
+        await message.answer(
+            await breakdown_report("🏢 По компаниям", 'company_name'),
+            reply_markup=get_analytics_keyboard()
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка в companies_report_handler: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+@smart_clear_chat
+async def completion_time_handler(message: Message):
+    """Обработчик кнопки 'Время выполнения'"""
+    try:
+        logger.info(f"Отчет о времени выполнения от пользователя {message.from_user.id}")
+
+        if not await get_director(message):
+            return
+
+        await message.answer(
+            await completion_time_report(),
+            reply_markup=get_analytics_keyboard()
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка в completion_time_handler: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+@smart_clear_chat
+async def charts_handler(message: Message):
+    """Обработчик кнопки 'Графики'"""
+    try:
+        logger.info(f"Графики от пользователя {message.from_user.id}")
+
+        if not await get_director(message):
+            return
+
+        days = 30
+        df = await load_stats(days)
+        if df.empty:
+            await message.answer(
+                "📈 Графики\n\nЗа последние 30 дней событий по задачам нет.",
+                reply_markup=get_analytics_keyboard()
+            )
+            return
+
+        await message.answer("📈 Графики за 30 дней", reply_markup=get_analytics_keyboard())
+
+        # Рендеринг идет в пуле процессов, цикл событий не блокируется
+        for kind, data in (
+            ('trend', trend_chart_data(df, days)),
+            ('workload', workload_chart_data(df, days))
+        ):
+            sent = await chart_service.send(message, kind, data)
+            await chat_cleaner.track(sent)
+
+    except Exception as e:
+        logger.error(f"Ошибка в charts_handler: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+def register_analytics_handlers(dp: Dispatcher):
+    """Регистрация обработчиков аналитики"""
+    menu_router.text("📊 Аналитика", analytics_menu_handler)
+    for button in PERIODS:
+        menu_router.text(button, period_report_handler)
+    menu_router.text("👥 По исполнителям", assignees_report_handler)
+    menu_router.text("🏢 По компаниям", companies_report_handler)
+    menu_router.text("⏱️ Время выполнения", completion_time_handler)
+    menu_router.text("📈 Графики", charts_handler)
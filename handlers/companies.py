@@ -1,12 +1,13 @@
 from aiogram import Dispatcher
 from aiogram.types import Message
-from aiogram import F
 from aiogram.fsm.context import FSMContext
 from database.models import UserManager, CompanyManager
+from database.directory import company_directory
 from utils.keyboards import get_main_keyboard, get_company_management_keyboard, get_back_keyboard, get_skip_keyboard
 from utils.states import CompanyStates
 import logging
 from utils.decorators import smart_clear_chat
+from utils.routing import menu_router
 
 logger = logging.getLogger(__name__)
 
@@ -81,7 +82,7 @@ async def list_companies_handler(message: Message):
             return
         
         # Получаем список компаний
-        companies = await CompanyManager.get_all_companies()
+        companies = await company_directory.all()
         
         if not companies:
             await message.answer(
@@ -276,12 +277,12 @@ async def skip_description_handler(message: Message, state: FSMContext):
 def register_company_handlers(dp: Dispatcher):
     """Регистрация обработчиков для управления компаниями"""
     # Основные обработчики
-    dp.message.register(company_management_handler, F.text == "🏢 Управление компаниями")
-    dp.message.register(add_company_handler, F.text == "➕ Добавить компанию")
-    dp.message.register(list_companies_handler, F.text == "📋 Список компаний")
-    dp.message.register(back_to_main_handler, F.text == "🔙 Назад")
+    menu_router.text("🏢 Управление компаниями", company_management_handler)
+    menu_router.text("➕ Добавить компанию", add_company_handler)
+    menu_router.text("📋 Список компаний", list_companies_handler)
+    menu_router.text("🔙 Назад", back_to_main_handler)
     
     # Обработчики состояний FSM
-    dp.message.register(process_company_name, CompanyStates.waiting_for_name)
-    dp.message.register(process_company_description, CompanyStates.waiting_for_description)
-    dp.message.register(skip_description_handler, F.text == "⏭️ Пропустить")
\ No newline at end of file
+    menu_router.state(CompanyStates.waiting_for_name, process_company_name)
+    menu_router.state(CompanyStates.waiting_for_description, process_company_description)
+    menu_router.text("⏭️ Пропустить", skip_description_handler)
\ No newline at end of file
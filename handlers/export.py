@@ -0,0 +1,145 @@
+import shlex
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from aiogram import Dispatcher
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+from database.models import UserManager, ExportManager
+from database.directory import company_directory, assignee_directory
+from database.task_filters import TaskFilter
+from services.export import EXPORT_FORMATS, export_service
+from utils.keyboards import get_main_keyboard
+from utils.decorators import smart_clear_chat
+import logging
+
+logger = logging.getLogger(__name__)
+
+EXPORT_HELP = (
+    "📤 Выгрузка задач\n\n"
+    "/export [csv|xlsx] [параметры]\n\n"
+    "Параметры (все необязательные):\n"
+    "• company=\"Название компании\"\n"
+    "• assignee=@username или имя исполнителя\n"
+    "• status=new | in_progress | completed | overdue | cancelled\n"
+    "• from=01.09.2025 to=30.09.2025 - период создания\n\n"
+    "Пример: /export xlsx company=\"Ромашка\" status=completed from=01.09.2025"
+)
+
+def find_by_name(items: List[Dict[str, Any]], value: str, names) -> Optional[Dict[str, Any]]:
+    """Точное совпадение имени без учета регистра, иначе единственное частичное"""
+    value = value.lower().lstrip('@')
+    exact = [item for item in items if value in (name.lower() for name in names(item) if name)]
+    if exact:
+        return exact[0]
+    partial = [item for item in items if any(value in name.lower() for name in names(item) if name)]
+    return partial[0] if len(partial) == 1 else None
+
+def assignee_names(user: Dict[str, Any]) -> List[str]:
+    full_name = f"{user['first_name'] or ''} {user['last_name'] or ''}".strip()
+    return [full_name, user['username'], user['first_name']]
+
+async def parse_export_args(args: str, user: Dict[str, Any]) -> Dict[str, Any]:
+    """Разбор аргументов /export; ValueError с текстом ошибки для пользователя"""
+    try:
+        tokens = shlex.split(args or "")
+    except ValueError:
+        raise ValueError("Незакрытая кавычка в параметрах.")
+
+    result = {'format': 'csv', 'company_name': None, 'assignee_name': None}
+    task_filter = TaskFilter(viewer_id=user['user_id'], viewer_role=user['role'])
+
+    for token in tokens:
+        if token.lower() in EXPORT_FORMATS:
+            result['format'] = token.lower()
+            continue
+
+        key, sep, value = token.partition('=')
+        key = key.lower()
+        if not sep or not value:
+            raise ValueError(f"Непонятный параметр: {token}")
+
+        if key == 'company':
+            company = find_by_name(await company_directory.all(), value,
+                                   lambda c: [c['name']])
+            if not company:
+                raise ValueError(f"Компания «{value}» не найдена.")
+            task_filter.company_id = company['company_id']
+            result['company_name'] = company['name']
+        elif key == 'assignee':
+            assignee = find_by_name(await assignee_directory.all(), value, assignee_names)
+            if not assignee:
+                raise ValueError(f"Исполнитель «{value}» не найден.")
+            task_filter.assignee_id = assignee['user_id']
+            result['assignee_name'] = assignee_names(assignee)[0] or assignee['username']
+        elif key == 'status':
+            status = value.lower()
+            titles = {title.lower(): code for code, title in ExportManager.STATUS_TITLES.items()}
+            status = titles.get(status, status)
+            if status not in ExportManager.STATUS_TITLES:
+                raise ValueError(f"Неизвестный статус: {value}")
+            task_filter.status = status
+        elif key in ('from', 'to'):
+            try:
+                day = datetime.strptime(value, '%d.%m.%Y').date()
+            except ValueError:
+                raise ValueError(f"Дата должна быть в формате ДД.ММ.ГГГГ: {value}")
+            if key == 'from':
+                task_filter.date_from = day
+            else:
+                task_filter.date_to = day
+        else:
+            raise ValueError(f"Неизвестный параметр: {key}")
+
+    result['filter'] = task_filter
+    return result
+
+@smart_clear_chat
+async def export_command(message: Message, command: CommandObject):
+    """Обработчик команды /export"""
+    try:
+        logger.info(f"Команда /export от пользователя {message.from_user.id}")
+
+        user = await UserManager.get_user_by_telegram_id(message.from_user.id)
+        if not user or user['role'] not in ['director', 'manager']:
+            await message.answer(
+                "❌ Выгрузка доступна только директору и менеджеру.",
+                reply_markup=get_main_keyboard(user['role'] if user else 'admin')
+            )
+            return
+
+        if command.args and command.args.strip().lower() in ('help', 'помощь'):
+            await message.answer(EXPORT_HELP)
+            return
+
+        try:
+            params = await parse_export_args(command.args, user)
+        except ValueError as e:
+            await message.answer(f"❌ {e}\n\n{EXPORT_HELP}")
+            return
+
+        task_filter = params['filter']
+        description = task_filter.describe(
+            params['company_name'], params['assignee_name'],
+            ExportManager.STATUS_TITLES.get(task_filter.status)
+        )
+
+        started = export_service.start(
+            message.bot, message.chat.id, message.from_user.id,
+            task_filter, params['format'], description
+        )
+        if not started:
+            await message.answer("⏳ Предыдущая выгрузка еще выполняется, дождитесь ее завершения.")
+            return
+
+        await message.answer(
+            f"📤 Выгрузка {params['format'].upper()} запущена ({description}).\n"
+            "Файл придет отдельным сообщением."
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка в export_command: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+def register_export_handlers(dp: Dispatcher):
+    """Регистрация обработчиков выгрузки"""
+    dp.message.register(export_command, Command("export"))
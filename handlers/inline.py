@@ -0,0 +1,62 @@
+from typing import Any, Dict
+from aiogram import Dispatcher
+from aiogram.types import InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+from config import INLINE_CACHE_TIME
+from database.models import format_datetime
+from services.inline_search import inline_search
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATUS_TITLES = {
+    'new': '🆕 Новая',
+    'in_progress': '⏳ В работе',
+    'completed': '✅ Выполнена',
+    'overdue': '⚠️ Просрочена',
+    'cancelled': '❌ Отменена'
+}
+
+def task_article(task: Dict[str, Any]) -> InlineQueryResultArticle:
+    """Результат inline-запроса: карточка задачи, отправляемая в чат"""
+    status = STATUS_TITLES.get(task['status'], task['status'])
+    urgent = "🔥 " if task['is_urgent'] else ""
+    deadline = format_datetime(task['deadline'])
+
+    return InlineQueryResultArticle(
+        id=task['task_id'],
+        title=f"{urgent}{task['title']}",
+        description=f"{task['company_name']} | {status} | до {deadline}",
+        input_message_content=InputTextMessageContent(
+            message_text=(
+                f"📋 {urgent}{task['title']}\n\n"
+                f"🏢 Компания: {task['company_name']}\n"
+                f"📊 Статус: {status}\n"
+                f"📅 Дедлайн: {deadline}"
+            )
+        )
+    )
+
+async def inline_query_handler(inline_query: InlineQuery):
+    """Обработчик inline-запросов (@бот текст): поиск по видимым задачам"""
+    try:
+        found = await inline_search.search(
+            inline_query.from_user.id, inline_query.query, inline_query.offset
+        )
+        if found is None:
+            # Запрос вытеснен более новым нажатием клавиши - отвечать не нужно
+            return
+
+        tasks, next_offset = found
+        await inline_query.answer(
+            [task_article(task) for task in tasks],
+            cache_time=INLINE_CACHE_TIME,
+            is_personal=True,
+            next_offset=next_offset
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка в inline_query_handler: {e}")
+
+def register_inline_handlers(dp: Dispatcher):
+    """Регистрация обработчика inline-режима (включается в @BotFather: /setinline)"""
+    dp.inline_query.register(inline_query_handler)
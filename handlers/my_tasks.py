@@ -1,12 +1,26 @@
+from typing import List, Optional
 from aiogram import Dispatcher
+from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from aiogram import F
 from database.models import UserManager, TaskManager, FileManager
-from utils.keyboards import get_main_keyboard, get_task_status_keyboard
-from datetime import datetime
+from utils.keyboards import get_main_keyboard, get_task_status_keyboard, get_back_keyboard
+from utils.states import TaskFileStates
+from database.directory import company_directory
+from database.task_filters import TaskFilter, DEADLINE_WINDOWS
+from config import RENDER_CACHE_SIZE
+from services.file_delivery import send_task_files
+from services.file_intake import upload_pipeline, FileIntakeError
 import logging
+from utils.cache import LRUCache
 from utils.chat_cleaner import chat_cleaner
+from utils.rendering import edit_message
 from utils.decorators import smart_clear_chat
+from utils.routing import menu_router, callback_router
+from utils.callback_data import (
+    TaskCallback, StatusMenuCallback, SetStatusCallback, CommentsCallback,
+    FilesCallback, AttachFilesCallback, TaskListCallback, CompanyFilterCallback,
+    CompanyTasksCallback
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +33,132 @@ STATUS_NAMES = {
     'cancelled': 'Отменена'
 }
 
+# Задач на странице списка "Мои задачи"
+TASK_LIST_SIZE = 15
+
+# Коды статусов в callback_data списка и порядок переключения фильтров
+LIST_STATUS_CODES = {
+    'n': 'new',
+    'p': 'in_progress',
+    'o': 'overdue',
+    'c': 'completed',
+    'x': 'cancelled'
+}
+STATUS_FILTER_CYCLE = [''] + list(LIST_STATUS_CODES)
+DUE_FILTER_CYCLE = [''] + list(DEADLINE_WINDOWS)
+DUE_FILTER_NAMES = {'': 'Любой срок', 'd': 'Сегодня', 'w': 'Неделя', 'o': 'Срок прошел'}
+
+# Готовые карточки: (task_id, версия, роль, исполнитель ли) -> (текст, клавиатура)
+card_cache = LRUCache(RENDER_CACHE_SIZE)
+# Кнопки задач в списках: (task_id, updated_at) -> строка клавиатуры
+task_button_cache = LRUCache(RENDER_CACHE_SIZE)
+
+def next_in_cycle(cycle: list, value: str) -> str:
+    return cycle[(cycle.index(value) + 1) % len(cycle)] if value in cycle else cycle[0]
+
+def list_filter(user: dict, state: TaskListCallback) -> TaskFilter:
+    """Фильтр запроса по состоянию списка с учетом роли пользователя"""
+    return TaskFilter(
+        company_id=state.company_id or None,
+        status=LIST_STATUS_CODES.get(state.status),
+        is_urgent=True if state.urgent else None,
+        deadline_window=state.due if state.due in DEADLINE_WINDOWS else None,
+        viewer_id=user['user_id'],
+        viewer_role=user['role']
+    )
+
+def task_button(task: dict) -> list:
+    """Кнопка задачи в списке (кэшируется до изменения задачи)"""
+    key = (task['task_id'], task['updated_at'])
+    button = task_button_cache.get(key)
+    if button is None:
+        button = render_task_button(task)
+        task_button_cache.set(key, button)
+    return button
+
+def render_task_button(task: dict) -> list:
+    urgent_emoji = "🔥" if task.get('is_urgent', False) else ""
+    
+    # Ограничиваем длину названия для кнопки
+    title_short = task['title'][:30] + "..." if len(task['title']) > 30 else task['title']
+    company_short = task['company_name'][:15] + "..." if len(task['company_name']) > 15 else task['company_name']
+    
+    button_text = f"{task['status_emoji']}{urgent_emoji} {title_short} | {company_short} | {task.get('deadline_short', '')}"
+    return [InlineKeyboardButton(
+        text=button_text,
+        callback_data=TaskCallback(task_id=task['task_id']).pack()
+    )]
+
+async def build_tasks_list(user: dict, state: TaskListCallback):
+    """Текст и клавиатура страницы списка задач; (None, None) - задач нет совсем"""
+    state = state.model_copy(update={'refresh': False})
+    filtered = bool(state.company_id or state.status or state.urgent or state.due)
+    task_filter = list_filter(user, state)
+    
+    # Лишняя строка показывает, есть ли следующая страница
+    tasks = await TaskManager.list_tasks(
+        task_filter, TASK_LIST_SIZE + 1, state.page * TASK_LIST_SIZE
+    )
+    has_next = len(tasks) > TASK_LIST_SIZE
+    tasks = tasks[:TASK_LIST_SIZE]
+    if not tasks and not filtered and state.page == 0:
+        return None, None
+    
+    total = await TaskManager.count_tasks(task_filter)
+    if total is None:
+        total = state.page * TASK_LIST_SIZE + len(tasks)
+    
+    def goto(**changes) -> str:
+        return state.model_copy(update=changes).pack()
+    
+    # Кнопки управления и фильтров
+    keyboard = [
+        [InlineKeyboardButton(text="🔄 Обновить", callback_data=goto(refresh=True)),
+         InlineKeyboardButton(text="🏢 Фильтр по компаниям", callback_data=CompanyFilterCallback().pack())],
+        [InlineKeyboardButton(
+            text=f"📊 {STATUS_NAMES[LIST_STATUS_CODES[state.status]] if state.status in LIST_STATUS_CODES else 'Все статусы'}",
+            callback_data=goto(status=next_in_cycle(STATUS_FILTER_CYCLE, state.status), page=0)
+        ),
+         InlineKeyboardButton(
+            text="🔥 Срочные ✅" if state.urgent else "🔥 Срочные",
+            callback_data=goto(urgent=not state.urgent, page=0)
+        ),
+         InlineKeyboardButton(
+            text=f"📅 {DUE_FILTER_NAMES.get(state.due, DUE_FILTER_NAMES[''])}",
+            callback_data=goto(due=next_in_cycle(DUE_FILTER_CYCLE, state.due), page=0)
+        )]
+    ]
+    
+    keyboard += [task_button(task) for task in tasks]
+    
+    navigation = []
+    if state.page > 0:
+        navigation.append(InlineKeyboardButton(text="◀ Назад", callback_data=goto(page=state.page - 1)))
+    if has_next:
+        navigation.append(InlineKeyboardButton(text="Вперед ▶", callback_data=goto(page=state.page + 1)))
+    if navigation:
+        keyboard.append(navigation)
+    
+    if filtered:
+        keyboard.append([InlineKeyboardButton(text="✖ Сбросить фильтры", callback_data=TaskListCallback().pack())])
+    
+    tasks_text = f"📝 Ваши задачи ({total})"
+    
+    if filtered:
+        company = await company_directory.get_by_id(state.company_id) if state.company_id else None
+        description = task_filter.describe(
+            company['name'] if company else None, None, STATUS_NAMES.get(task_filter.status)
+        )
+        tasks_text += f"\n🔎 Фильтр: {description}"
+    
+    if not tasks:
+        tasks_text += "\n\nЗадач по фильтру нет"
+    elif total > TASK_LIST_SIZE:
+        first = state.page * TASK_LIST_SIZE + 1
+        tasks_text += f"\n\nПоказаны {first}-{first + len(tasks) - 1} из {total}"
+    
+    return tasks_text, InlineKeyboardMarkup(inline_keyboard=keyboard)
+
 @smart_clear_chat
 async def my_tasks_handler(message: Message):
     """Обработчик кнопки 'Мои задачи'"""
@@ -31,394 +171,385 @@ async def my_tasks_handler(message: Message):
             await message.answer("❌ Пользователь не найден.")
             return
         
-        # Получаем задачи пользователя
-        tasks = await TaskManager.get_user_tasks(user['user_id'], user['role'])
+        # Первая страница задач без фильтров
+        tasks_text, keyboard = await build_tasks_list(user, TaskListCallback())
         
-        if not tasks:
+        if not tasks_text:
             await message.answer(
                 "📝 У вас пока нет задач",
                 reply_markup=get_main_keyboard(user['role'])
             )
             return
         
-        # Формируем кнопки управления
-        control_buttons = [
-            [InlineKeyboardButton(text="🔄 Обновить", callback_data="refresh_tasks"),
-             InlineKeyboardButton(text="🏢 Фильтр по компаниям", callback_data="filter_companies")]
-        ]
-        
-        # Формируем кнопки с задачами
-        task_buttons = []
-        for task in tasks[:15]:  # Показываем первые 15 задач
-            # Формируем текст кнопки
-            urgent_emoji = "🔥" if task.get('is_urgent', False) else ""
-            
-            # Ограничиваем длину названия для кнопки
-            title_short = task['title'][:30] + "..." if len(task['title']) > 30 else task['title']
-            company_short = task['company_name'][:15] + "..." if len(task['company_name']) > 15 else task['company_name']
-            
-            button_text = f"{task['status_emoji']}{urgent_emoji} {title_short} | {company_short} | {task.get('deadline_short', '')}"
-            
-            task_buttons.append([InlineKeyboardButton(
-                text=button_text,
-                callback_data=f"task_{task['task_id']}"
-            )])
+        # Отправляем список (декоратор автоматически очистит чат)
+        await message.answer(tasks_text, reply_markup=keyboard)
         
-        # Объединяем все кнопки
-        keyboard = control_buttons + task_buttons
+    except Exception as e:
+        logger.error(f"Ошибка в my_tasks_handler: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+async def open_task_callback(callback: CallbackQuery, callback_data: TaskCallback):
+    """Обработчик нажатия на задачу в списке"""
+    logger.info(f"Открытие задачи {callback_data.task_id} пользователем {callback.from_user.id}")
+    await process_task_callback_by_id(callback, callback_data.task_id)
+    await callback.answer()
+
+async def status_menu_callback(callback: CallbackQuery, callback_data: StatusMenuCallback):
+    """Обработчик кнопки 'Изменить статус'"""
+    try:
+        task_id = callback_data.task_id
         
-        tasks_text = f"📝 Ваши задачи ({len(tasks)}):"
-        if len(tasks) > 15:
-            tasks_text += f"\n\nПоказано первые 15 из {len(tasks)} задач"
+        # Получаем задачу и пользователя
+        task = await TaskManager.get_task_by_id(task_id)
+        user = await UserManager.get_user_by_telegram_id(callback.from_user.id)
         
-        # Отправляем список (декоратор автоматически очистит чат)
-        await message.answer(
-            tasks_text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
+        if not task or not user:
+            await callback.answer("❌ Ошибка доступа")
+            return
+        
+        # Формируем кнопки статусов
+        status_buttons = []
+        current_status = task['status']
+        
+        def status_button(text: str, status: str) -> list:
+            return [InlineKeyboardButton(
+                text=text,
+                callback_data=SetStatusCallback(task_id=task_id, status=status).pack()
+            )]
+        
+        # Логика для всех пользователей кто может менять статус
+        if current_status == 'new':
+            status_buttons.append(status_button("⏳ Взять в работу", 'in_progress'))
+        elif current_status == 'in_progress':
+            status_buttons.append(status_button("✅ Завершить", 'completed'))
+            # Можно вернуть обратно в новые
+            status_buttons.append(status_button("🆕 Вернуть в новые", 'new'))
+        elif current_status == 'overdue':
+            # Просроченную можно завершить или вернуть в работу
+            status_buttons.append(status_button("✅ Завершить", 'completed'))
+            status_buttons.append(status_button("⏳ Вернуть в работу", 'in_progress'))
+        
+        # Директор и менеджер могут:
+        if user['role'] in ['director', 'manager']:
+            # Вернуть выполненную задачу в работу
+            if current_status == 'completed':
+                status_buttons.append(status_button("⏳ Вернуть в работу", 'in_progress'))
+            
+            # Отменить любую незавершенную задачу
+            if current_status not in ['cancelled', 'completed']:
+                status_buttons.append(status_button("❌ Отменить задачу", 'cancelled'))
+        
+        status_buttons.append([InlineKeyboardButton(
+            text="🔙 Назад",
+            callback_data=TaskCallback(task_id=task_id).pack()
+        )])
+        
+        current_status_name = STATUS_NAMES.get(current_status, current_status)
+        await callback.message.edit_text(
+            f"📊 Изменение статуса задачи\n\n"
+            f"📋 Задача: {task['title']}\n"
+            f"📊 Текущий статус: {current_status_name}\n\n"
+            f"Выберите новый статус:",
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=status_buttons)
         )
+        await callback.answer()
         
     except Exception as e:
-        logger.error(f"Ошибка в my_tasks_handler: {e}")
-        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+        logger.error(f"Ошибка в status_menu_callback: {e}")
+        await callback.answer("❌ Произошла ошибка")
 
-async def process_task_callback(callback: CallbackQuery):
-    """Обработчик нажатий на задачи"""
+async def set_status_callback(callback: CallbackQuery, callback_data: SetStatusCallback):
+    """Обработчик выбора нового статуса"""
     try:
-        data = callback.data
-        logger.info(f"Callback задачи: {data} от пользователя {callback.from_user.id}")
+        task_id = callback_data.task_id
+        new_status = callback_data.status
         
-        if data.startswith("task_"):
-            task_id = data.replace("task_", "")
-            
-            # Получаем детали задачи
-            task = await TaskManager.get_task_by_id(task_id)
-            if not task:
-                await callback.answer("❌ Задача не найдена")
-                return
-            
-            # Получаем файлы задачи
-            files = await FileManager.get_task_files(task_id)
-            
-            # Получаем пользователя для определения прав
-            user = await UserManager.get_user_by_telegram_id(callback.from_user.id)
-            
-            # Формируем детальное описание
-            detail_text = f"📋 {task['title']}\n\n"
-            detail_text += f"📝 Описание: {task['description']}\n"
-            detail_text += f"🏢 Компания: {task['company_name']}\n"
-            
-            if task.get('is_urgent', False):
-                detail_text += f"⚡ Приоритет: 🔥 Срочная\n"
-            else:
-                detail_text += f"⚡ Приоритет: 📝 Обычная\n"
-            
-            status_name = STATUS_NAMES.get(task['status'], task['status'])
-            detail_text += f"📊 Статус: {task.get('status_emoji', '❓')} {status_name}\n"
-            detail_text += f"📅 Дедлайн: {task['deadline_str']}\n"
-            detail_text += f"📞 Инициатор: {task['initiator_name']}\n"
-            detail_text += f"☎️ Телефон: {task['initiator_phone']}\n"
-            
-            if files:
-                detail_text += f"\n📎 Файлы ({len(files)}):\n"
-                for file in files:
-                    # Получаем размер файла в читаемом формате
-                    size_mb = file['file_size'] / (1024 * 1024)
-                    if size_mb < 1:
-                        size_str = f"{file['file_size'] / 1024:.1f} КБ"
-                    else:
-                        size_str = f"{size_mb:.1f} МБ"
-                    
-                    detail_text += f"• {file['file_name']} ({size_str})\n"
-                    detail_text += f"  👤 Загрузил: {file['uploader_name']}\n"
-            
-            # Создаем кнопки действий
-            action_buttons = []
-            
-            # Кнопка изменения статуса (только для исполнителей и руководства)
-            task_assignee_id = task.get('assignee_id')
-            if user and (user['user_id'] == task_assignee_id or user['role'] in ['director', 'manager']):
-                action_buttons.append([InlineKeyboardButton(
-                    text="🔄 Изменить статус", 
-                    callback_data=f"status_{task_id}"
-                )])
-            
-            # Кнопка комментариев
-            action_buttons.append([InlineKeyboardButton(
-                text="💬 Комментарии", 
-                callback_data=f"comments_{task_id}"
-            )])
-            
-            # Кнопка файлов
-            if files:
-                action_buttons.append([InlineKeyboardButton(
-                    text="📎 Скачать файлы", 
-                    callback_data=f"files_{task_id}"
-                )])
-            
-            action_buttons.append([InlineKeyboardButton(
-                text="🔙 Назад к списку", 
-                callback_data="back_to_tasks"
-            )])
-            
-            await callback.message.edit_text(
-                detail_text,
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=action_buttons)
-            )
-            
-        elif data.startswith("status_"):
-            task_id = data.replace("status_", "")
-            
-            # Получаем задачу и пользователя
-            task = await TaskManager.get_task_by_id(task_id)
-            user = await UserManager.get_user_by_telegram_id(callback.from_user.id)
-            
-            if not task or not user:
-                await callback.answer("❌ Ошибка доступа")
-                return
-            
-            # Формируем кнопки статусов
-            status_buttons = []
-            current_status = task['status']
-            
-            # Логика для всех пользователей кто может менять статус
-            if current_status == 'new':
-                status_buttons.append([InlineKeyboardButton(text="⏳ Взять в работу", callback_data=f"set_status_{task_id}_in_progress")])
-            elif current_status == 'in_progress':
-                status_buttons.append([InlineKeyboardButton(text="✅ Завершить", callback_data=f"set_status_{task_id}_completed")])
-                # Можно вернуть обратно в новые
-                status_buttons.append([InlineKeyboardButton(text="🆕 Вернуть в новые", callback_data=f"set_status_{task_id}_new")])
-            elif current_status == 'overdue':
-                # Просроченную можно завершить или вернуть в работу
-                status_buttons.append([InlineKeyboardButton(text="✅ Завершить", callback_data=f"set_status_{task_id}_completed")])
-                status_buttons.append([InlineKeyboardButton(text="⏳ Вернуть в работу", callback_data=f"set_status_{task_id}_in_progress")])
-            
-            # Директор и менеджер могут:
-            if user['role'] in ['director', 'manager']:
-                # Вернуть выполненную задачу в работу
-                if current_status == 'completed':
-                    status_buttons.append([InlineKeyboardButton(text="⏳ Вернуть в работу", callback_data=f"set_status_{task_id}_in_progress")])
-                
-                # Отменить любую незавершенную задачу
-                if current_status not in ['cancelled', 'completed']:
-                    status_buttons.append([InlineKeyboardButton(text="❌ Отменить задачу", callback_data=f"set_status_{task_id}_cancelled")])
-            
-            status_buttons.append([InlineKeyboardButton(text="🔙 Назад", callback_data=f"task_{task_id}")])
-            
-            current_status_name = STATUS_NAMES.get(current_status, current_status)
-            await callback.message.edit_text(
-                f"📊 Изменение статуса задачи\n\n"
-                f"📋 Задача: {task['title']}\n"
-                f"📊 Текущий статус: {current_status_name}\n\n"
-                f"Выберите новый статус:",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=status_buttons)
-            )
-            
-        elif data.startswith("set_status_"):
-            # Изменение статуса
-            parts = data.split("_", 3)  # Ограничиваем разделение
-            task_id = parts[2]
-            new_status = parts[3]
-            
-            # Получаем пользователя
-            user = await UserManager.get_user_by_telegram_id(callback.from_user.id)
-            
-            if not user:
-                await callback.answer("❌ Ошибка доступа")
-                return
-            
-            # Обновляем статус
-            if await TaskManager.update_task_status(task_id, new_status):
-                status_name = STATUS_NAMES.get(new_status, new_status)
-                
-                await callback.answer(f"✅ Статус изменен на: {status_name}")
-                
-                # Возвращаемся к детальному просмотру задачи
-                await process_task_callback_by_id(callback, task_id)
-                
-                logger.info(f"Статус задачи {task_id} изменен на {new_status} пользователем {user['user_id']}")
-            else:
-                await callback.answer("❌ Ошибка изменения статуса")
-            
-        elif data == "filter_companies":
-            # Показываем фильтр по компаниям
-            telegram_id = callback.from_user.id
-            user = await UserManager.get_user_by_telegram_id(telegram_id)
-            companies = await TaskManager.get_companies_with_tasks(user['user_id'], user['role'])
-            
-            keyboard = []
-            for company in companies:
-                keyboard.append([InlineKeyboardButton(
-                    text=f"{company['name']} ({company['task_count']})",
-                    callback_data=f"company_{company['company_id']}"
-                )])
-            
-            keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data="back_to_tasks")])
+        # Получаем пользователя
+        user = await UserManager.get_user_by_telegram_id(callback.from_user.id)
+        
+        if not user:
+            await callback.answer("❌ Ошибка доступа")
+            return
+        
+        # Обновляем статус
+        if await TaskManager.update_task_status(task_id, new_status, user['user_id']):
+            status_name = STATUS_NAMES.get(new_status, new_status)
             
-            await callback.message.edit_text(
-                "🏢 Выберите компанию для фильтрации:",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-            )
+            await callback.answer(f"✅ Статус изменен на: {status_name}")
             
-        elif data == "back_to_tasks":
-            # Возвращаемся к списку задач
-            await show_tasks_list(callback)
+            # Возвращаемся к детальному просмотру задачи
+            await process_task_callback_by_id(callback, task_id)
             
-        elif data == "refresh_tasks":
-            # Получаем обновленный список задач
-            await show_tasks_list(callback, "✅ Список обновлен")
+            logger.info(f"Статус задачи {task_id} изменен на {new_status} пользователем {user['user_id']}")
+        else:
+            await callback.answer("❌ Ошибка изменения статуса")
+        
+    except Exception as e:
+        logger.error(f"Ошибка в set_status_callback: {e}")
+        await callback.answer("❌ Произошла ошибка")
 
+async def company_filter_callback(callback: CallbackQuery):
+    """Обработчик кнопки 'Фильтр по компаниям'"""
+    try:
+        telegram_id = callback.from_user.id
+        user = await UserManager.get_user_by_telegram_id(telegram_id)
+        companies = await TaskManager.get_companies_with_tasks(user['user_id'], user['role'])
+        
+        keyboard = []
+        for company in companies:
+            keyboard.append([InlineKeyboardButton(
+                text=f"{company['name']} ({company['task_count']})",
+                callback_data=CompanyTasksCallback(company_id=company['company_id']).pack()
+            )])
+        
+        keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data=TaskListCallback().pack())])
+        
+        await edit_message(
+            callback.message,
+            "🏢 Выберите компанию для фильтрации:",
+            InlineKeyboardMarkup(inline_keyboard=keyboard)
+        )
         await callback.answer()
         
     except Exception as e:
-        logger.error(f"Ошибка в process_task_callback: {e}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error(f"Ошибка в company_filter_callback: {e}")
         await callback.answer("❌ Произошла ошибка")
 
+async def company_tasks_callback(callback: CallbackQuery, callback_data: CompanyTasksCallback):
+    """Обработчик выбора компании в фильтре"""
+    await show_tasks_list(callback, TaskListCallback(company_id=callback_data.company_id))
+    await callback.answer()
+
+async def task_list_callback(callback: CallbackQuery, callback_data: TaskListCallback):
+    """Обработчик кнопок списка: 'Назад к списку', 'Обновить', фильтры и страницы"""
+    edited = await show_tasks_list(callback, callback_data)
+    if callback_data.refresh:
+        await callback.answer("✅ Список обновлен" if edited else "Список не изменился")
+    else:
+        await callback.answer()
+
+def render_task_card(task: dict, files: list, can_change_status: bool):
+    """Текст и клавиатура карточки задачи"""
+    task_id = task['task_id']
+    
+    # Формируем детальное описание
+    detail_text = f"📋 {task['title']}\n\n"
+    detail_text += f"📝 Описание: {task['description']}\n"
+    detail_text += f"🏢 Компания: {task['company_name']}\n"
+    
+    if task.get('is_urgent', False):
+        detail_text += f"⚡ Приоритет: 🔥 Срочная\n"
+    else:
+        detail_text += f"⚡ Приоритет: 📝 Обычная\n"
+    
+    status_name = STATUS_NAMES.get(task['status'], task['status'])
+    detail_text += f"📊 Статус: {task.get('status_emoji', '❓')} {status_name}\n"
+    detail_text += f"📅 Дедлайн: {task['deadline_str']}\n"
+    detail_text += f"📞 Инициатор: {task['initiator_name']}\n"
+    detail_text += f"☎️ Телефон: {task['initiator_phone']}\n"
+    
+    if files:
+        detail_text += f"\n📎 Файлы ({len(files)}):\n"
+        for file in files:
+            # Получаем размер файла в читаемом формате
+            size_mb = file['file_size'] / (1024 * 1024)
+            if size_mb < 1:
+                size_str = f"{file['file_size'] / 1024:.1f} КБ"
+            else:
+                size_str = f"{size_mb:.1f} МБ"
+            
+            detail_text += f"• {file['file_name']} ({size_str})\n"
+            detail_text += f"  👤 Загрузил: {file['uploader_name']}\n"
+    
+    # Создаем кнопки действий
+    action_buttons = []
+    
+    # Кнопка изменения статуса (только для исполнителей и руководства)
+    if can_change_status:
+        action_buttons.append([InlineKeyboardButton(
+            text="🔄 Изменить статус", 
+            callback_data=StatusMenuCallback(task_id=task_id).pack()
+        )])
+    
+    # Кнопка комментариев
+    action_buttons.append([InlineKeyboardButton(
+        text="💬 Комментарии", 
+        callback_data=CommentsCallback(task_id=task_id).pack()
+    )])
+    
+    # Кнопка файлов
+    if files:
+        action_buttons.append([InlineKeyboardButton(
+            text="📎 Скачать файлы", 
+            callback_data=FilesCallback(task_id=task_id).pack()
+        )])
+    
+    # Фото выполненной работы и прочие файлы прикладывают те же, кто меняет статус
+    if can_change_status:
+        action_buttons.append([InlineKeyboardButton(
+            text="📎 Прикрепить файлы", 
+            callback_data=AttachFilesCallback(task_id=task_id).pack()
+        )])
+    
+    action_buttons.append([InlineKeyboardButton(
+        text="🔙 Назад к списку", 
+        callback_data=TaskListCallback().pack()
+    )])
+    
+    return detail_text, InlineKeyboardMarkup(inline_keyboard=action_buttons)
+
 async def process_task_callback_by_id(callback: CallbackQuery, task_id: str):
     """Показать детали задачи по ID"""
-    # Вызываем напрямую код обработки задачи
     try:
-        # Получаем детали задачи
+        # Получаем детали задачи (вместе с версией карточки)
         task = await TaskManager.get_task_by_id(task_id)
         if not task:
             await callback.answer("❌ Задача не найдена")
             return
         
-        # Получаем файлы задачи
-        files = await FileManager.get_task_files(task_id)
-        
         # Получаем пользователя для определения прав
         user = await UserManager.get_user_by_telegram_id(callback.from_user.id)
+        role = user['role'] if user else None
+        is_assignee = bool(user) and user['user_id'] == task.get('assignee_id')
         
-        # Формируем детальное описание
-        detail_text = f"📋 {task['title']}\n\n"
-        detail_text += f"📝 Описание: {task['description']}\n"
-        detail_text += f"🏢 Компания: {task['company_name']}\n"
+        key = (task_id, task['version'], role, is_assignee)
+        card = card_cache.get(key)
+        if card is None:
+            # Файлы читаются только при изменении задачи или ее файлов
+            files = await FileManager.get_task_files(task_id)
+            can_change_status = is_assignee or role in ['director', 'manager']
+            card = render_task_card(task, files, can_change_status)
+            card_cache.set(key, card)
         
-        if task.get('is_urgent', False):
-            detail_text += f"⚡ Приоритет: 🔥 Срочная\n"
-        else:
-            detail_text += f"⚡ Приоритет: 📝 Обычная\n"
-        
-        status_name = STATUS_NAMES.get(task['status'], task['status'])
-        detail_text += f"📊 Статус: {task.get('status_emoji', '❓')} {status_name}\n"
-        detail_text += f"📅 Дедлайн: {task['deadline_str']}\n"
-        detail_text += f"📞 Инициатор: {task['initiator_name']}\n"
-        detail_text += f"☎️ Телефон: {task['initiator_phone']}\n"
-        
-        if files:
-            detail_text += f"\n📎 Файлы ({len(files)}):\n"
-            for file in files:
-                # Получаем размер файла в читаемом формате
-                size_mb = file['file_size'] / (1024 * 1024)
-                if size_mb < 1:
-                    size_str = f"{file['file_size'] / 1024:.1f} КБ"
-                else:
-                    size_str = f"{size_mb:.1f} МБ"
-                
-                detail_text += f"• {file['file_name']} ({size_str})\n"
-                detail_text += f"  👤 Загрузил: {file['uploader_name']}\n"
-        
-        # Создаем кнопки действий
-        action_buttons = []
-        
-        # Кнопка изменения статуса (только для исполнителей и руководства)
-        task_assignee_id = task.get('assignee_id')
-        if user and (user['user_id'] == task_assignee_id or user['role'] in ['director', 'manager']):
-            action_buttons.append([InlineKeyboardButton(
-                text="🔄 Изменить статус", 
-                callback_data=f"status_{task_id}"
-            )])
+        await edit_message(callback.message, *card)
         
-        # Кнопка комментариев
-        action_buttons.append([InlineKeyboardButton(
-            text="💬 Комментарии", 
-            callback_data=f"comments_{task_id}"
-        )])
+    except Exception as e:
+        logger.error(f"Ошибка в process_task_callback_by_id: {e}")
+        await callback.answer("❌ Произошла ошибка")
+
+async def files_callback(callback: CallbackQuery, callback_data: FilesCallback):
+    """Обработчик кнопки 'Скачать файлы': файлы задачи альбомами"""
+    try:
+        task = await TaskManager.get_task_by_id(callback_data.task_id)
+        if not task:
+            await callback.answer("❌ Задача не найдена")
+            return
         
-        # Кнопка файлов
-        if files:
-            action_buttons.append([InlineKeyboardButton(
-                text="📎 Скачать файлы", 
-                callback_data=f"files_{task_id}"
-            )])
+        user = await UserManager.get_user_by_telegram_id(callback.from_user.id)
+        if not user or (user['user_id'] != task.get('assignee_id')
+                        and user['role'] not in ['director', 'manager']):
+            await callback.answer("❌ Ошибка доступа")
+            return
         
-        action_buttons.append([InlineKeyboardButton(
-            text="🔙 Назад к списку", 
-            callback_data="back_to_tasks"
-        )])
+        files = await FileManager.get_task_files(callback_data.task_id)
+        if not files:
+            await callback.answer("📎 У задачи нет файлов")
+            return
         
-        await callback.message.edit_text(
-            detail_text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=action_buttons)
+        await callback.answer(f"📎 Отправляю файлы ({len(files)})...")
+        sent, missing = await send_task_files(callback.bot, callback.message.chat.id, files)
+        
+        logger.info(f"Файлы задачи {callback_data.task_id} отправлены пользователю "
+                    f"{callback.from_user.id}: {sent}, не найдено {missing}")
+        if missing:
+            await callback.message.answer(f"⚠️ Не удалось найти файлов: {missing}")
+        
+    except Exception as e:
+        logger.error(f"Ошибка в files_callback: {e}")
+        await callback.message.answer("❌ Не удалось отправить файлы. Попробуйте позже.")
+
+async def attach_files_callback(callback: CallbackQuery, callback_data: AttachFilesCallback,
+                                state: FSMContext):
+    """Обработчик кнопки 'Прикрепить файлы': ожидание файлов к задаче"""
+    try:
+        task = await TaskManager.get_task_by_id(callback_data.task_id)
+        if not task:
+            await callback.answer("❌ Задача не найдена")
+            return
+        
+        user = await UserManager.get_user_by_telegram_id(callback.from_user.id)
+        if not user or (user['user_id'] != task.get('assignee_id')
+                        and user['role'] not in ['director', 'manager']):
+            await callback.answer("❌ Нет прав на добавление файлов")
+            return
+        
+        await state.set_state(TaskFileStates.waiting_for_files)
+        await state.update_data(attach_task_id=task['task_id'], attach_user_id=user['user_id'])
+        
+        await callback.answer()
+        await callback.message.answer(
+            f"📎 Файлы к задаче «{task['title']}»\n\n"
+            "Отправьте фото или документы (можно альбомами). "
+            "Когда закончите, нажмите «🔙 Назад».",
+            reply_markup=get_back_keyboard()
         )
         
     except Exception as e:
-        logger.error(f"Ошибка в process_task_callback_by_id: {e}")
+        logger.error(f"Ошибка в attach_files_callback: {e}")
         await callback.answer("❌ Произошла ошибка")
 
-async def show_tasks_list(callback: CallbackQuery, message_prefix: str = ""):
-    """Показать список задач"""
+async def process_attached_files(message: Message, state: FSMContext,
+                                 album: Optional[List[Message]] = None):
+    """Прием файлов к существующей задаче.
+    
+    Без smart_clear_chat: присланные фото остаются в чате, а прогресс
+    загрузки показывается в одном сообщении конвейера загрузок.
+    """
     try:
-        telegram_id = callback.from_user.id
-        user = await UserManager.get_user_by_telegram_id(telegram_id)
-        tasks = await TaskManager.get_user_tasks(user['user_id'], user['role'])
-        
-        if not tasks:
-            await callback.message.edit_text("📝 У вас пока нет задач")
+        messages = album or [message]
+        if not any(item.photo or item.document for item in messages):
+            await message.answer(
+                "❌ Отправьте фото или файл. Чтобы закончить, нажмите «🔙 Назад».",
+                reply_markup=get_back_keyboard()
+            )
             return
         
-        # Формируем кнопки как в основном обработчике
-        control_buttons = [
-            [InlineKeyboardButton(text="🔄 Обновить", callback_data="refresh_tasks"),
-             InlineKeyboardButton(text="🏢 Фильтр по компаниям", callback_data="filter_companies")]
-        ]
+        data = await state.get_data()
+        try:
+            queued = upload_pipeline.submit(
+                message.bot, message.chat.id, message.from_user.id,
+                data['attach_task_id'], data['attach_user_id'], messages
+            )
+        except FileIntakeError as e:
+            await message.answer(f"❌ {e}", reply_markup=get_back_keyboard())
+            return
         
-        task_buttons = []
-        for task in tasks[:15]:
-            urgent_emoji = "🔥" if task.get('is_urgent', False) else ""
-            
-            status_name = STATUS_NAMES.get(task['status'], task['status'])
-            title_short = task['title'][:30] + "..." if len(task['title']) > 30 else task['title']
-            company_short = task['company_name'][:15] + "..." if len(task['company_name']) > 15 else task['company_name']
-            
-            # Отладка - посмотрим что точно в task['status']
-            print(f"DEBUG: task status = '{task['status']}'")
-            status_name = STATUS_NAMES.get(task['status'], task['status'])
-            button_text = f"{task['status_emoji']}{urgent_emoji} {title_short} | {company_short} | {task.get('deadline_short', '')}"
-            
-            task_buttons.append([InlineKeyboardButton(
-                text=button_text,
-                callback_data=f"task_{task['task_id']}"
-            )])
+        if queued is None:
+            await message.answer("⏳ Слишком много файлов в очереди. Дождитесь окончания загрузки.")
+            return
         
-        keyboard = control_buttons + task_buttons
+        logger.info(f"Файлы к задаче {data['attach_task_id']} от пользователя "
+                    f"{message.from_user.id} поставлены в очередь: {queued}")
         
-        # Добавляем временную метку если это обновление
-        tasks_text = f"📝 Ваши задачи ({len(tasks)})"
-        if message_prefix:
-            current_time = datetime.now().strftime("%H:%M:%S")
-            tasks_text += f" - обновлено {current_time}"
+    except Exception as e:
+        logger.error(f"Ошибка в process_attached_files: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+async def show_tasks_list(callback: CallbackQuery, state: TaskListCallback) -> bool:
+    """Показать страницу списка задач с фильтрами; False - сообщение не изменилось"""
+    try:
+        telegram_id = callback.from_user.id
+        user = await UserManager.get_user_by_telegram_id(telegram_id)
+        tasks_text, keyboard = await build_tasks_list(user, state)
         
-        if len(tasks) > 15:
-            tasks_text += f"\n\nПоказано первые 15 из {len(tasks)} задач"
+        if not tasks_text:
+            return await edit_message(callback.message, "📝 У вас пока нет задач")
         
-        await callback.message.edit_text(
-            tasks_text,
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard)
-        )
+        return await edit_message(callback.message, tasks_text, keyboard)
         
     except Exception as e:
         logger.error(f"Ошибка в show_tasks_list: {e}")
+        return False
 
 def register_my_tasks_handlers(dp: Dispatcher):
     """Регистрация обработчиков просмотра задач"""
-    dp.message.register(my_tasks_handler, F.text == "📝 Мои задачи")
-    dp.callback_query.register(process_task_callback, F.data.startswith("task_"))
-    dp.callback_query.register(process_task_callback, F.data.startswith("status_"))
-    dp.callback_query.register(process_task_callback, F.data.startswith("set_status_"))
-    dp.callback_query.register(process_task_callback, F.data == "filter_companies")
-    dp.callback_query.register(process_task_callback, F.data == "back_to_tasks")
-    dp.callback_query.register(process_task_callback, F.data.startswith("company_"))
-    dp.callback_query.register(process_task_callback, F.data == "refresh_tasks")
\ No newline at end of file
+    menu_router.text("📝 Мои задачи", my_tasks_handler)
+    menu_router.state(TaskFileStates.waiting_for_files, process_attached_files)
+    callback_router.register(TaskCallback, open_task_callback)
+    callback_router.register(StatusMenuCallback, status_menu_callback)
+    callback_router.register(SetStatusCallback, set_status_callback)
+    callback_router.register(FilesCallback, files_callback)
+    callback_router.register(AttachFilesCallback, attach_files_callback)
+    callback_router.register(CompanyFilterCallback, company_filter_callback)
+    callback_router.register(CompanyTasksCallback, company_tasks_callback)
+    callback_router.register(TaskListCallback, task_list_callback)
@@ -0,0 +1,174 @@
+from typing import Any, Dict, List, Optional, Tuple
+from aiogram import Dispatcher
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+from database.models import UserManager, TaskManager
+from database.task_filters import TaskFilter
+from utils.keyboards import get_back_keyboard
+from utils.states import SearchStates
+from utils.routing import menu_router, callback_router
+from utils.callback_data import TaskCallback, SearchPageCallback
+from utils.decorators import smart_clear_chat
+import logging
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PAGE_SIZE = 10
+SEARCH_MIN_LENGTH = 2
+SEARCH_MAX_LENGTH = 200
+
+STATUS_EMOJI = {
+    'new': '🆕',
+    'in_progress': '⏳',
+    'completed': '✅',
+    'overdue': '⚠️',
+    'cancelled': '❌'
+}
+
+def search_result_button(task: Dict[str, Any]) -> List[InlineKeyboardButton]:
+    """Кнопка задачи в результатах поиска (формат как в списке задач)"""
+    urgent_emoji = "🔥" if task['is_urgent'] else ""
+    title_short = task['title'][:30] + "..." if len(task['title']) > 30 else task['title']
+    company_short = task['company_name'][:15] + "..." if len(task['company_name']) > 15 else task['company_name']
+    deadline_short = task['deadline'].strftime('%d.%m') if task['deadline'] else 'Нет'
+
+    return [InlineKeyboardButton(
+        text=f"{STATUS_EMOJI.get(task['status'], '❓')}{urgent_emoji} {title_short} | {company_short} | {deadline_short}",
+        callback_data=TaskCallback(task_id=task['task_id']).pack()
+    )]
+
+async def build_search_page(user: Dict[str, Any], query: str, cursors: List[Optional[list]],
+                            page: int) -> Tuple[str, Optional[InlineKeyboardMarkup], List[Optional[list]]]:
+    """Страница результатов: текст, клавиатура и обновленный список курсоров.
+
+    cursors[n] - ключ (rank, task_id), после которого начинается страница n
+    (None для первой), поэтому переход по страницам не использует OFFSET.
+    """
+    task_filter = TaskFilter(viewer_id=user['user_id'], viewer_role=user['role'])
+    after = tuple(cursors[page]) if cursors[page] else None
+    tasks = await TaskManager.search_tasks(query, task_filter, after, SEARCH_PAGE_SIZE + 1)
+
+    has_next = len(tasks) > SEARCH_PAGE_SIZE
+    tasks = tasks[:SEARCH_PAGE_SIZE]
+    cursors = cursors[:page + 1]
+    if has_next:
+        cursors.append([tasks[-1]['rank'], tasks[-1]['task_id']])
+
+    if not tasks:
+        return f"🔍 По запросу «{query}» ничего не найдено.", None, cursors
+
+    keyboard = [search_result_button(task) for task in tasks]
+
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton(
+            text="◀ Назад", callback_data=SearchPageCallback(page=page - 1).pack()
+        ))
+    if has_next:
+        navigation.append(InlineKeyboardButton(
+            text="Дальше ▶", callback_data=SearchPageCallback(page=page + 1).pack()
+        ))
+    if navigation:
+        keyboard.append(navigation)
+
+    text = f"🔍 Поиск: «{query}»\nСтраница {page + 1}"
+    return text, InlineKeyboardMarkup(inline_keyboard=keyboard), cursors
+
+async def show_search_results(message: Message, state: FSMContext, user: Dict[str, Any], query: str):
+    """Первая страница результатов; запрос и курсоры сохраняются в FSM"""
+    text, markup, cursors = await build_search_page(user, query, [None], 0)
+    await state.update_data(search={'query': query, 'cursors': cursors})
+    await message.answer(text, reply_markup=markup)
+
+def validate_query(query: str) -> Optional[str]:
+    """Текст ошибки для некорректного запроса"""
+    if len(query) < SEARCH_MIN_LENGTH:
+        return f"❌ Запрос слишком короткий (минимум {SEARCH_MIN_LENGTH} символа)."
+    if len(query) > SEARCH_MAX_LENGTH:
+        return f"❌ Запрос слишком длинный (максимум {SEARCH_MAX_LENGTH} символов)."
+    return None
+
+@smart_clear_chat
+async def search_command(message: Message, state: FSMContext, command: CommandObject):
+    """Обработчик команды /search"""
+    try:
+        logger.info(f"Команда /search от пользователя {message.from_user.id}")
+
+        user = await UserManager.get_user_by_telegram_id(message.from_user.id)
+        if not user:
+            await message.answer("❌ Пользователь не найден.")
+            return
+
+        query = (command.args or "").strip()
+        if not query:
+            await state.set_state(SearchStates.waiting_for_query)
+            await message.answer(
+                "🔍 Поиск задач\n\n"
+                "Введите слова из названия, описания или имени инициатора.\n"
+                "💡 Фразу можно взять в кавычки, исключить слово - через минус.",
+                reply_markup=get_back_keyboard()
+            )
+            return
+
+        error = validate_query(query)
+        if error:
+            await message.answer(error)
+            return
+
+        await show_search_results(message, state, user, query)
+
+    except Exception as e:
+        logger.error(f"Ошибка в search_command: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+@smart_clear_chat
+async def process_search_query(message: Message, state: FSMContext):
+    """Обработчик ввода поискового запроса"""
+    try:
+        query = (message.text or "").strip()
+        error = validate_query(query)
+        if error:
+            await message.answer(error, reply_markup=get_back_keyboard())
+            return
+
+        user = await UserManager.get_user_by_telegram_id(message.from_user.id)
+        if not user:
+            await message.answer("❌ Пользователь не найден.")
+            return
+
+        await state.set_state(None)
+        await show_search_results(message, state, user, query)
+
+    except Exception as e:
+        logger.error(f"Ошибка в process_search_query: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+async def search_page_callback(callback: CallbackQuery, callback_data: SearchPageCallback, state: FSMContext):
+    """Обработчик переключения страниц результатов поиска"""
+    try:
+        search = (await state.get_data()).get('search')
+        page = callback_data.page
+        if not search or page >= len(search['cursors']):
+            await callback.answer("Результаты устарели, повторите /search")
+            return
+
+        user = await UserManager.get_user_by_telegram_id(callback.from_user.id)
+        if not user:
+            await callback.answer("❌ Ошибка доступа")
+            return
+
+        text, markup, cursors = await build_search_page(user, search['query'], search['cursors'], page)
+        await state.update_data(search={'query': search['query'], 'cursors': cursors})
+        await callback.message.edit_text(text, reply_markup=markup)
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Ошибка в search_page_callback: {e}")
+        await callback.answer("❌ Произошла ошибка")
+
+def register_search_handlers(dp: Dispatcher):
+    """Регистрация обработчиков поиска задач"""
+    dp.message.register(search_command, Command("search"))
+    menu_router.state(SearchStates.waiting_for_query, process_search_query)
+    callback_router.register(SearchPageCallback, search_page_callback)
@@ -0,0 +1,109 @@
+import os
+from aiogram import Dispatcher
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message, BufferedInputFile
+from database.models import UserManager
+from services.task_import import (
+    IMPORT_COLUMNS, IMPORT_EXTENSIONS, ImportFileError, import_tasks, error_report
+)
+from utils.keyboards import get_main_keyboard, get_back_keyboard
+from utils.states import ImportStates
+from utils.routing import menu_router
+from utils.decorators import smart_clear_chat
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Максимальный размер файла, который бот может скачать через Bot API
+IMPORT_MAX_FILE_SIZE = 20 * 1024 * 1024
+
+@smart_clear_chat
+async def import_command(message: Message, state: FSMContext):
+    """Обработчик команды /import"""
+    try:
+        logger.info(f"Команда /import от пользователя {message.from_user.id}")
+
+        user = await UserManager.get_user_by_telegram_id(message.from_user.id)
+        if not user or user['role'] not in ['director', 'manager']:
+            await message.answer(
+                "❌ У вас нет прав для создания задач.",
+                reply_markup=get_main_keyboard(user['role'] if user else 'admin')
+            )
+            return
+
+        await state.set_state(ImportStates.waiting_for_file)
+        await state.update_data(created_by=user['user_id'])
+
+        await message.answer(
+            "📥 Импорт задач\n\n"
+            "Отправьте файл CSV или XLSX. Первая строка - заголовки колонок:\n"
+            f"{', '.join(IMPORT_COLUMNS)}\n\n"
+            "• Компания - название, как в списке компаний\n"
+            "• Исполнитель - имя и фамилия или @username\n"
+            "• Срочная - «да» или пусто\n"
+            "• Дедлайн - ДД.ММ.ГГГГ или ДД.ММ.ГГГГ ЧЧ:ММ\n\n"
+            "💡 Файл выгрузки /export подходит как шаблон.",
+            reply_markup=get_back_keyboard()
+        )
+
+    except Exception as e:
+        logger.error(f"Ошибка в import_command: {e}")
+        await message.answer("❌ Произошла ошибка. Попробуйте позже.")
+
+@smart_clear_chat
+async def process_import_file(message: Message, state: FSMContext):
+    """Обработчик файла импорта"""
+    try:
+        document = message.document
+        if not document or os.path.splitext(document.file_name or '')[1].lower() not in IMPORT_EXTENSIONS:
+            await message.answer(
+                "❌ Отправьте файл CSV или XLSX.",
+                reply_markup=get_back_keyboard()
+            )
+            return
+
+        if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+            await message.answer(
+                "❌ Файл больше 20 МБ. Разделите его на несколько частей.",
+                reply_markup=get_back_keyboard()
+            )
+            return
+
+        logger.info(f"Файл импорта {document.file_name} от пользователя {message.from_user.id}")
+        await message.answer("⏳ Файл получен, проверяем и загружаем задачи...")
+
+        data = await state.get_data()
+        file_data = await message.bot.download(document)
+
+        try:
+            imported, invalid = await import_tasks(
+                file_data.read(), document.file_name, data['created_by']
+            )
+        except ImportFileError as e:
+            await message.answer(f"❌ {e}", reply_markup=get_back_keyboard())
+            return
+
+        await state.clear()
+        user = await UserManager.get_user_by_telegram_id(message.from_user.id)
+
+        text = f"✅ Импорт завершен\n\n📋 Создано задач: {imported}"
+        if len(invalid):
+            text += f"\n❌ Строк с ошибками: {len(invalid)} (отчет ниже)"
+        await message.answer(text, reply_markup=get_main_keyboard(user['role'] if user else 'admin'))
+
+        if len(invalid):
+            report_name = f"{os.path.splitext(document.file_name)[0]}_errors.csv"
+            await message.answer_document(
+                BufferedInputFile(error_report(invalid), filename=report_name),
+                caption="Строки, которые не удалось импортировать"
+            )
+
+    except Exception as e:
+        logger.error(f"Ошибка в process_import_file: {e}")
+        await message.answer("❌ Ошибка импорта, задачи не созданы. Попробуйте позже.")
+
+def register_import_handlers(dp: Dispatcher):
+    """Регистрация обработчиков импорта задач"""
+    dp.message.register(import_command, Command("import"))
+    menu_router.state(ImportStates.waiting_for_file, process_import_file)
@@ -2,17 +2,30 @@ from aiogram import Dispatcher
 from aiogram.types import Message, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from aiogram import F
 from aiogram.fsm.context import FSMContext
-from database.models import UserManager, CompanyManager, TaskManager
-from utils.keyboards import get_main_keyboard, get_back_keyboard, get_task_urgent_keyboard, get_task_deadline_keyboard
+from database.models import UserManager, CompanyManager, TaskManager, FileManager, get_current_time
+from utils.keyboards import get_main_keyboard, get_back_keyboard, get_task_urgent_keyboard, get_task_deadline_keyboard, FrozenInlineKeyboardMarkup
 from utils.states import TaskStates
 from utils.file_storage import file_storage
-from datetime import datetime, timedelta
+from services.file_intake import receive_files, FileIntakeError
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import List, Optional
 import calendar
 import logging
 from utils.decorators import smart_clear_chat
+from utils.routing import menu_router, callback_router
+from utils.callback_data import CompanyPickCallback, CompanyPageCallback
+from utils.cache import LRUCache
+from database.directory import company_directory, assignee_directory
 
 logger = logging.getLogger(__name__)
 
+# Компаний на странице выбора
+COMPANY_PAGE_SIZE = 8
+
+# Клавиатуры страниц выбора компании: (версия справочника, страница) -> клавиатура
+company_picker_cache = LRUCache(256)
+
 @smart_clear_chat
 async def create_task_handler(message: Message, state: FSMContext):
     """Обработчик кнопки 'Создать задачу'"""
@@ -88,17 +101,21 @@ async def process_task_title(message: Message, state: FSMContext):
         await message.answer("❌ Произошла ошибка. Попробуйте позже.")
 
 @smart_clear_chat
-async def process_task_description(message: Message, state: FSMContext):
-    """Обработчик ввода описания задачи (текст или файлы)"""
+async def process_task_description(message: Message, state: FSMContext,
+                                   album: Optional[List[Message]] = None):
+    """Обработчик ввода описания задачи (текст, файлы или альбом)"""
     try:
         logger.info(f"Обработка описания задачи от пользователя {message.from_user.id}")
         
+        # Альбом приходит одним вызовом (см. utils/media_group.py)
+        messages = album or [message]
         task_description = ""
         task_files = []
         
-        # Обрабатываем текст
-        if message.text:
-            task_description = message.text.strip()
+        # Текст или подпись (у альбома подпись есть только у одного сообщения)
+        text = message.text or next((item.caption for item in messages if item.caption), None)
+        if text:
+            task_description = text.strip()
             if len(task_description) > 2000:
                 await message.answer(
                     "❌ Описание задачи слишком длинное!\n\n"
@@ -107,87 +124,20 @@ async def process_task_description(message: Message, state: FSMContext):
                 )
                 return
         
-        # Обрабатываем подпись к фото/файлу
-        elif message.caption:
-            task_description = message.caption.strip()
-            if len(task_description) > 2000:
-                await message.answer(
-                    "❌ Описание задачи слишком длинное!\n\n"
-                    "Введите описание задачи (максимум 2000 символов):",
-                    reply_markup=get_back_keyboard()
-                )
-                return
-        
-        # Обрабатываем фото
-        if message.photo:
-            # Берем фото наибольшего размера
-            photo = message.photo[-1]
-            await message.answer("📷 Фото получено! Обрабатываем...")
-            
-            # Скачиваем файл
-            from main import bot
-            file_obj = await bot.get_file(photo.file_id)
-            file_data = await bot.download_file(file_obj.file_path)
-            
-            # Читаем данные
-            file_content = file_data.read()
-            
-            # Проверяем размер
-            if not file_storage.validate_file_size(len(file_content)):
-                await message.answer(
-                    "❌ Файл слишком большой! Максимальный размер: 100 МБ",
-                    reply_markup=get_back_keyboard()
-                )
-                return
-            
-            task_files.append({
-                'type': 'photo',
-                'file_id': photo.file_id,
-                'file_size': len(file_content),
-                'file_name': f"photo_{photo.file_id}.jpg",
-                'content_type': 'image/jpeg',
-                'file_data': file_content
-            })
-        
-        # Обрабатываем документы
-        elif message.document:
-            document = message.document
-            
-            # Проверяем размер файла
-            if not file_storage.validate_file_size(document.file_size):
-                await message.answer(
-                    "❌ Файл слишком большой! Максимальный размер: 100 МБ",
-                    reply_markup=get_back_keyboard()
-                )
-                return
+        # Фото и документы: загружаются параллельно одной партией
+        if any(item.photo or item.document for item in messages):
+            if len(messages) > 1:
+                await message.answer(f"📎 Получено файлов: {len(messages)}. Обрабатываем...")
+            elif message.photo:
+                await message.answer("📷 Фото получено! Обрабатываем...")
+            else:
+                await message.answer("📎 Файл получен! Обрабатываем...")
             
-            # Проверяем расширение файла
-            if not file_storage.validate_file_extension(document.file_name):
-                await message.answer(
-                    "❌ Неподдерживаемый тип файла!\n\n"
-                    "Поддерживаются: изображения, документы PDF/DOC/XLS, архивы ZIP/RAR",
-                    reply_markup=get_back_keyboard()
-                )
+            try:
+                task_files = await receive_files(message.bot, messages)
+            except FileIntakeError as e:
+                await message.answer(f"❌ {e}", reply_markup=get_back_keyboard())
                 return
-            
-            await message.answer("📎 Файл получен! Обрабатываем...")
-            
-            # Скачиваем файл
-            from main import bot
-            file_obj = await bot.get_file(document.file_id)
-            file_data = await bot.download_file(file_obj.file_path)
-            
-            # Читаем данные
-            file_content = file_data.read()
-            
-            task_files.append({
-                'type': 'document',
-                'file_id': document.file_id,
-                'file_name': document.file_name,
-                'file_size': len(file_content),
-                'content_type': file_storage.get_content_type_by_extension(document.file_name),
-                'file_data': file_content
-            })
         
         # Если нет ни текста, ни подписи, ни файлов
         if not task_description and not task_files:
@@ -207,8 +157,8 @@ async def process_task_description(message: Message, state: FSMContext):
             task_files=task_files
         )
         
-        # Получаем список компаний для выбора
-        companies = await CompanyManager.get_all_companies()
+        # Первая страница справочника компаний для выбора
+        companies, pages = await company_directory.page(0, COMPANY_PAGE_SIZE)
         
         if not companies:
             await message.answer(
@@ -219,9 +169,6 @@ async def process_task_description(message: Message, state: FSMContext):
             await state.clear()
             return
         
-        # Создаем клавиатуру с компаниями
-        company_keyboard = create_company_keyboard(companies)
-        
         # Переходим к выбору компании
         await state.set_state(TaskStates.waiting_for_company)
         
@@ -231,8 +178,8 @@ async def process_task_description(message: Message, state: FSMContext):
         
         await message.answer(
             f"{success_text}\n\n"
-            f"Шаг 3/7: Выберите компанию для задачи:",
-            reply_markup=company_keyboard
+            f"Шаг 3/7: Выберите компанию для задачи или введите часть названия для поиска:",
+            reply_markup=await create_company_picker(0)
         )
         
     except Exception as e:
@@ -245,35 +192,32 @@ async def process_company_selection(message: Message, state: FSMContext):
     try:
         logger.info(f"Выбор компании от пользователя {message.from_user.id}")
         
-        # Получаем список компаний
-        companies = await CompanyManager.get_all_companies()
-        selected_company = None
+        query = (message.text or "").strip()
         
-        # Ищем выбранную компанию
-        for company in companies:
-            if company['name'] == message.text:
-                selected_company = company
-                break
+        # Точное название - поиск по индексу справочника
+        selected_company = await company_directory.get_by_name(query) if query else None
         
         if not selected_company:
-            await message.answer(
-                "❌ Компания не найдена! Выберите компанию из списка:",
-                reply_markup=create_company_keyboard(companies)
-            )
+            # Иначе - поиск по части названия
+            found = await CompanyManager.search_companies(query, COMPANY_PAGE_SIZE) if len(query) >= 2 else []
+            if found:
+                await message.answer(
+                    f"🔍 Компании по запросу «{query}»:\n\n"
+                    f"Выберите компанию или уточните название:",
+                    reply_markup=create_company_search_keyboard(found)
+                )
+            else:
+                await message.answer(
+                    "❌ Компания не найдена! Выберите компанию из списка "
+                    "или введите часть названия:",
+                    reply_markup=await create_company_picker(0)
+                )
             return
         
-        # Сохраняем выбранную компанию
-        await state.update_data(
-            company_id=selected_company['company_id'],
-            company_name=selected_company['name']
-        )
-        
-        # Переходим к вводу инициатора
-        await state.set_state(TaskStates.waiting_for_initiator_name)
+        await select_company(state, selected_company)
         
         await message.answer(
-            f"✅ Компания: **{selected_company['name']}**\n\n"
-            f"**Шаг 4/7:** Введите имя инициатора задачи:",
+            company_selected_text(selected_company['name']),
             reply_markup=get_back_keyboard(),
             parse_mode="Markdown"
         )
@@ -350,8 +294,8 @@ async def process_initiator_phone(message: Message, state: FSMContext):
         # Сохраняем телефон
         await state.update_data(initiator_phone=phone)
         
-        # Получаем список исполнителей
-        assignees = await UserManager.get_assignees()
+        # Исполнители по возрастанию нагрузки
+        assignees = await assignee_directory.by_workload()
         
         if not assignees:
             await message.answer(
@@ -379,27 +323,109 @@ async def process_initiator_phone(message: Message, state: FSMContext):
         logger.error(f"Ошибка в process_initiator_phone: {e}")
         await message.answer("❌ Произошла ошибка. Попробуйте позже.")
 
-def create_company_keyboard(companies):
-    """Создает клавиатуру с компаниями"""
-    buttons = []
-    for company in companies:
-        buttons.append([KeyboardButton(text=company['name'])])
-    buttons.append([KeyboardButton(text="🔙 Назад")])
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
+async def select_company(state: FSMContext, company: dict):
+    """Сохранение выбранной компании и переход к вводу инициатора"""
+    await state.update_data(
+        company_id=company['company_id'],
+        company_name=company['name']
+    )
+    await state.set_state(TaskStates.waiting_for_initiator_name)
+
+def company_selected_text(company_name: str) -> str:
+    return (
+        f"✅ Компания: **{company_name}**\n\n"
+        f"**Шаг 4/7:** Введите имя инициатора задачи:"
     )
 
+async def create_company_picker(page: int) -> InlineKeyboardMarkup:
+    """Страница выбора компании (кэшируется до изменения справочника)"""
+    key = (company_directory.version, page)
+    keyboard = company_picker_cache.get(key)
+    if keyboard is not None:
+        return keyboard
+    
+    companies, pages = await company_directory.page(page, COMPANY_PAGE_SIZE)
+    page = min(page, pages - 1)
+    buttons = [
+        [InlineKeyboardButton(
+            text=company['name'],
+            callback_data=CompanyPickCallback(company_id=company['company_id']).pack()
+        )]
+        for company in companies
+    ]
+    
+    if pages > 1:
+        buttons.append([
+            InlineKeyboardButton(
+                text="◀" if page > 0 else " ",
+                callback_data=CompanyPageCallback(page=page - 1).pack() if page > 0 else "ignore"
+            ),
+            InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="ignore"),
+            InlineKeyboardButton(
+                text="▶" if page < pages - 1 else " ",
+                callback_data=CompanyPageCallback(page=page + 1).pack() if page < pages - 1 else "ignore"
+            )
+        ])
+    
+    keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
+    company_picker_cache.set(key, keyboard)
+    return keyboard
+
+def create_company_search_keyboard(companies) -> InlineKeyboardMarkup:
+    """Результаты поиска компаний"""
+    buttons = [
+        [InlineKeyboardButton(
+            text=company['name'],
+            callback_data=CompanyPickCallback(company_id=company['company_id']).pack()
+        )]
+        for company in companies
+    ]
+    buttons.append([InlineKeyboardButton(
+        text="📋 Весь список", callback_data=CompanyPageCallback(page=0).pack()
+    )])
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+async def company_page_callback(callback: CallbackQuery, callback_data: CompanyPageCallback, state: FSMContext):
+    """Листание списка компаний"""
+    try:
+        if await state.get_state() != TaskStates.waiting_for_company.state:
+            await callback.answer("Выбор компании уже завершен")
+            return
+        
+        await callback.message.edit_reply_markup(
+            reply_markup=await create_company_picker(callback_data.page)
+        )
+        await callback.answer()
+        
+    except Exception as e:
+        logger.error(f"Ошибка в company_page_callback: {e}")
+        await callback.answer("❌ Произошла ошибка")
+
+async def company_pick_callback(callback: CallbackQuery, callback_data: CompanyPickCallback, state: FSMContext):
+    """Выбор компании inline-кнопкой"""
+    try:
+        if await state.get_state() != TaskStates.waiting_for_company.state:
+            await callback.answer("Выбор компании уже завершен")
+            return
+        
+        company = await company_directory.get_by_id(callback_data.company_id)
+        if not company:
+            await callback.answer("❌ Компания не найдена")
+            return
+        
+        await select_company(state, company)
+        await callback.message.edit_text(company_selected_text(company['name']), parse_mode="Markdown")
+        await callback.answer()
+        
+    except Exception as e:
+        logger.error(f"Ошибка в company_pick_callback: {e}")
+        await callback.answer("❌ Произошла ошибка")
+
 def create_assignee_keyboard(assignees):
-    """Создает клавиатуру с исполнителями"""
+    """Создает клавиатуру с исполнителями: (исполнитель, открытых задач)"""
     buttons = []
-    for assignee in assignees:
-        name = f"{assignee['first_name'] or ''} {assignee['last_name'] or ''}".strip()
-        if not name:
-            name = assignee['username'] or f"ID: {assignee['telegram_id']}"
-        buttons.append([KeyboardButton(text=name)])
+    for assignee, open_tasks in assignees:
+        buttons.append([KeyboardButton(text=f"{assignee['name']} ({open_tasks})")])
     buttons.append([KeyboardButton(text="🔙 Назад")])
     
     return ReplyKeyboardMarkup(
@@ -411,18 +437,20 @@ def create_assignee_keyboard(assignees):
 def register_task_handlers(dp: Dispatcher):
     """Регистрация обработчиков для управления задачами"""
     # Основные обработчики
-    dp.message.register(create_task_handler, F.text == "📋 Создать задачу")
+    menu_router.text("📋 Создать задачу", create_task_handler)
     
     # Обработчики состояний FSM
-    dp.message.register(process_task_title, TaskStates.waiting_for_title)
-    dp.message.register(process_task_description, TaskStates.waiting_for_description)
-    dp.message.register(process_company_selection, TaskStates.waiting_for_company)
-    dp.message.register(process_initiator_name, TaskStates.waiting_for_initiator_name)
-    dp.message.register(process_initiator_phone, TaskStates.waiting_for_initiator_phone)
-    dp.message.register(process_assignee_selection, TaskStates.waiting_for_assignee)
-    dp.message.register(process_priority_selection, TaskStates.waiting_for_priority)
-    dp.message.register(process_deadline_selection, TaskStates.waiting_for_deadline)
-    dp.message.register(process_custom_date, TaskStates.waiting_for_custom_date)
+    menu_router.state(TaskStates.waiting_for_title, process_task_title)
+    menu_router.state(TaskStates.waiting_for_description, process_task_description)
+    menu_router.state(TaskStates.waiting_for_company, process_company_selection)
+    callback_router.register(CompanyPickCallback, company_pick_callback)
+    callback_router.register(CompanyPageCallback, company_page_callback)
+    menu_router.state(TaskStates.waiting_for_initiator_name, process_initiator_name)
+    menu_router.state(TaskStates.waiting_for_initiator_phone, process_initiator_phone)
+    menu_router.state(TaskStates.waiting_for_assignee, process_assignee_selection)
+    menu_router.state(TaskStates.waiting_for_priority, process_priority_selection)
+    menu_router.state(TaskStates.waiting_for_deadline, process_deadline_selection)
+    menu_router.state(TaskStates.waiting_for_custom_date, process_custom_date)
     dp.callback_query.register(process_calendar_callback, F.data.startswith("cal_"))
 
 @smart_clear_chat
@@ -431,38 +459,27 @@ async def process_assignee_selection(message: Message, state: FSMContext):
     try:
         logger.info(f"Выбор исполнителя от пользователя {message.from_user.id}")
         
-        # Получаем список исполнителей
-        assignees = await UserManager.get_assignees()
-        selected_assignee = None
-        
-        # Ищем выбранного исполнителя по имени
-        for assignee in assignees:
-            name = f"{assignee['first_name'] or ''} {assignee['last_name'] or ''}".strip()
-            if not name:
-                name = assignee['username'] or f"ID: {assignee['telegram_id']}"
-            
-            if name == message.text:
-                selected_assignee = assignee
-                break
+        # Ищем выбранного исполнителя по подписи кнопки
+        selected_assignee = await assignee_directory.get_by_label(message.text)
         
         if not selected_assignee:
             await message.answer(
                 "❌ Исполнитель не найден! Выберите исполнителя из списка:",
-                reply_markup=create_assignee_keyboard(assignees)
+                reply_markup=create_assignee_keyboard(await assignee_directory.by_workload())
             )
             return
         
         # Сохраняем выбранного исполнителя
         await state.update_data(
             assignee_id=selected_assignee['user_id'],
-            assignee_name=f"{selected_assignee['first_name'] or ''} {selected_assignee['last_name'] or ''}".strip() or selected_assignee['username']
+            assignee_name=selected_assignee['name']
         )
         
         # Переходим к выбору приоритета
         await state.set_state(TaskStates.waiting_for_priority)
         
         await message.answer(
-            f"✅ Исполнитель: **{message.text}**\n\n"
+            f"✅ Исполнитель: **{selected_assignee['name']}**\n\n"
             f"**Шаг 7/8:** Выберите приоритет задачи:",
             reply_markup=get_task_urgent_keyboard(),
             parse_mode="Markdown"
@@ -649,40 +666,28 @@ async def create_final_task(message: Message, state: FSMContext, deadline: datet
         if task_id:
             # Сохраняем файлы если есть
             uploaded_files = []
+            failed_files = []
             task_files = data.get('task_files', [])
             
             if task_files:
+                # Блобы уже в хранилище (проверяем, что они на месте);
+                # старые временные файлы переносим в папку задачи
+                stored = []
                 for file_info in task_files:
-                    try:
-                        # Сохраняем файл
-                        save_result = await file_storage.save_file(
-                            file_data=file_info['file_data'],
-                            file_name=file_info['file_name'],
-                            content_type=file_info['content_type'],
-                            task_id=task_id
-                        )
-                        
-                        if save_result:
-                            # Сохраняем информацию о файле в БД
-                            from database.models import FileManager
-                            if await FileManager.save_file_info(
-                                task_id=task_id,
-                                user_id=data['created_by'],
-                                file_name=save_result['original_name'],
-                                file_path=save_result['file_path'],
-                                file_size=save_result['size'],
-                                content_type=save_result['content_type'],
-                                thumbnail_path=save_result['thumbnail_path']
-                            ):
-                                uploaded_files.append(save_result['original_name'])
-                                logger.info(f"Файл {file_info['file_name']} успешно сохранен")
-                            else:
-                                logger.error(f"Ошибка сохранения файла {file_info['file_name']} в БД")
-                        else:
-                            logger.error(f"Ошибка сохранения файла {file_info['file_name']}")
-                            
-                    except Exception as e:
-                        logger.error(f"Ошибка обработки файла: {e}")
+                    save_result = await file_storage.move_to_task(file_info, task_id)
+                    if save_result:
+                        stored.append(save_result)
+                    else:
+                        failed_files.append(file_info['original_name'])
+                        logger.error(f"Ошибка сохранения файла {file_info['original_name']}")
+                
+                # Информация о файлах - одной командой
+                if await FileManager.save_files_info(task_id, data['created_by'], stored):
+                    uploaded_files = [file['original_name'] for file in stored]
+                    logger.info(f"Файлы задачи {task_id} сохранены: {len(stored)}")
+                elif stored:
+                    failed_files.extend(file['original_name'] for file in stored)
+                    logger.error(f"Ошибка сохранения файлов задачи {task_id} в БД")
             
             # Формируем сообщение об успехе (убираем Markdown чтобы избежать ошибок парсинга)
             success_text = "✅ Задача успешно создана!\n\n"
@@ -702,6 +707,11 @@ async def create_final_task(message: Message, state: FSMContext, deadline: datet
 
             if uploaded_files:
                 success_text += f"\n📎 Файлы: {', '.join(uploaded_files)}"
+            if failed_files:
+                success_text += (
+                    f"\n⚠️ Не удалось сохранить файлы: {', '.join(failed_files)}. "
+                    "Прикрепите их к задаче заново."
+                )
             
             await message.answer(
                 success_text,
@@ -710,12 +720,8 @@ async def create_final_task(message: Message, state: FSMContext, deadline: datet
             
             # Уведомляем исполнителя о новой задаче
             try:
-                assignee_telegram_id = None
-                assignees = await UserManager.get_assignees()
-                for assignee in assignees:
-                    if assignee['user_id'] == data['assignee_id']:
-                        assignee_telegram_id = assignee['telegram_id']
-                        break
+                assignee = await assignee_directory.get_by_id(data['assignee_id'])
+                assignee_telegram_id = assignee['telegram_id'] if assignee else None
                 
                 if assignee_telegram_id and assignee_telegram_id != telegram_id:
                     from main import bot
@@ -744,6 +750,11 @@ async def create_final_task(message: Message, state: FSMContext, deadline: datet
 
 def create_calendar_keyboard(year: int, month: int):
     """Создает календарь для выбора даты"""
+    return build_calendar_keyboard(year, month, get_current_time().date())
+
+@lru_cache(maxsize=32)
+def build_calendar_keyboard(year: int, month: int, today: date) -> InlineKeyboardMarkup:
+    """Сетка месяца; дни до today недоступны. Кэшируется, today входит в ключ"""
     keyboard = []
     
     # Заголовок с названием месяца
@@ -768,9 +779,7 @@ def create_calendar_keyboard(year: int, month: int):
                 week_buttons.append(InlineKeyboardButton(text=" ", callback_data="ignore"))
             else:
                 # Проверяем, не в прошлом ли дата
-                from datetime import datetime
-                date_obj = datetime(year, month, day)
-                if date_obj.date() < datetime.now().date():
+                if date(year, month, day) < today:
                     week_buttons.append(InlineKeyboardButton(text=str(day), callback_data="ignore"))
                 else:
                     callback_data = f"cal_{year}_{month}_{day}"
@@ -792,7 +801,7 @@ def create_calendar_keyboard(year: int, month: int):
     # Кнопка назад
     keyboard.append([InlineKeyboardButton(text="🔙 Назад", callback_data="cal_back")])
     
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+    return FrozenInlineKeyboardMarkup(inline_keyboard=keyboard)
 
 @smart_clear_chat
 async def process_calendar_callback(callback: CallbackQuery, state: FSMContext):
@@ -3,13 +3,30 @@ import logging
 from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
-from aiogram.fsm.storage.memory import MemoryStorage
 from database.connection import db_connection
 from database.models import DatabaseManager
+from database.fsm_storage import PostgresStorage
+from utils.chat_cleaner import chat_cleaner
+from utils.routing import menu_router, callback_router
+from utils.metrics import (
+    setup_bot_metrics, setup_dispatcher_metrics, setup_fsm_metrics,
+    setup_metrics_routes
+)
+from utils.loop_watchdog import loop_watchdog
+from utils.media_group import setup_media_groups
 from handlers.start import register_start_handlers
 from handlers.companies import register_company_handlers
 from handlers.tasks import register_task_handlers
 from handlers.my_tasks import register_my_tasks_handlers
+from handlers.analytics import register_analytics_handlers
+from handlers.export import register_export_handlers
+from handlers.task_import import register_import_handlers
+from handlers.search import register_search_handlers
+from handlers.inline import register_inline_handlers
+from services.charts import chart_service
+from services.export import export_service
+from services.file_intake import upload_pipeline
+from services.images import image_service
 from config import BOT_TOKEN
 
 # Настройка логирования
@@ -34,10 +51,18 @@ WEB_SERVER_HOST = "0.0.0.0"
 WEB_SERVER_PORT = 8080  # Свободный порт
 
 # Создание экземпляров бота и диспетчера
-storage = MemoryStorage()
+storage = PostgresStorage()
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher(storage=storage)
 
+# Метрики Prometheus
+setup_bot_metrics(bot)
+setup_dispatcher_metrics(dp)
+setup_fsm_metrics(storage)
+
+# Альбомы доставляются обработчикам одним вызовом
+setup_media_groups(dp)
+
 async def init_database():
     """Инициализация базы данных"""
     try:
@@ -59,6 +84,15 @@ def register_handlers():
     register_company_handlers(dp)
     register_task_handlers(dp)
     register_my_tasks_handlers(dp)
+    register_analytics_handlers(dp)
+    register_export_handlers(dp)
+    register_import_handlers(dp)
+    register_search_handlers(dp)
+    register_inline_handlers(dp)
+    
+    # Таблицы маршрутов регистрируются в диспетчере одним обработчиком каждая
+    menu_router.setup(dp)
+    callback_router.setup(dp)
     logger.info("Обработчики зарегистрированы")
 
 async def on_startup():
@@ -70,6 +104,13 @@ async def on_startup():
         # Регистрация обработчиков
         register_handlers()
         
+        # Пул рендеринга графиков (процессы создаются до запуска потоков)
+        chart_service.start()
+        image_service.start()
+        
+        # Сторож цикла событий: задержка и стеки блокирующих вызовов
+        loop_watchdog.start()
+        
         # Установка webhook
         await bot.set_webhook(WEBHOOK_URL)
         logger.info(f"Webhook установлен: {WEBHOOK_URL}")
@@ -81,11 +122,19 @@ async def on_startup():
 async def on_shutdown():
     """Действия при остановке"""
     try:
+        loop_watchdog.stop()
+        
         # Удаление webhook
         await bot.delete_webhook()
         logger.info("Webhook удален")
         
-        # Закрытие соединений
+        # Сохранение FSM-состояний, истории чатов и закрытие соединений
+        await export_service.close()
+        await upload_pipeline.close()
+        await storage.close()
+        await chat_cleaner.close()
+        chart_service.close()
+        image_service.close()
         await db_connection.close()
         await bot.session.close()
         logger.info("Соединения закрыты")
@@ -104,6 +153,9 @@ def create_app():
     )
     webhook_requests_handler.register(app, path=WEBHOOK_PATH)
     
+    # Метрики и проверка здоровья
+    setup_metrics_routes(app)
+    
     # Настройка приложения
     setup_application(app, dp, bot=bot)
     
@@ -0,0 +1,234 @@
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Tuple
+import pandas as pd
+from database.models import AnalyticsManager, TIMEZONE, get_current_time
+
+logger = logging.getLogger(__name__)
+
+# События дневной сводки в порядке вывода
+EVENT_NAMES = {
+    'created': '🆕 Создано',
+    'in_progress': '⏳ Взято в работу',
+    'completed': '✅ Выполнено',
+    'overdue': '⚠️ Просрочено',
+    'cancelled': '❌ Отменено'
+}
+
+# Периоды отчетов: кнопка -> (заголовок, количество дней)
+PERIODS = {
+    "📊 За день": ("за сегодня", 1),
+    "📊 За неделю": ("за 7 дней", 7),
+    "📊 За месяц": ("за 30 дней", 30)
+}
+
+# Подписи событий на графиках (без эмодзи: их нет в шрифтах matplotlib)
+CHART_LABELS = {
+    'created': 'Создано',
+    'in_progress': 'Взято в работу',
+    'completed': 'Выполнено',
+    'overdue': 'Просрочено',
+    'cancelled': 'Отменено'
+}
+
+# Статусы в отчете о времени выполнения
+TIME_IN_STATUS_NAMES = {
+    'new': '🆕 Ожидание',
+    'in_progress': '⏳ В работе',
+    'overdue': '⚠️ Просрочена'
+}
+
+def period_bounds(days: int) -> Tuple[date, date]:
+    """Границы периода из последних days дней, включая сегодня"""
+    today = get_current_time().date()
+    return today - timedelta(days=days - 1), today
+
+def window_bounds(days: int) -> Tuple[datetime, datetime]:
+    """Промежуток [since, until) из последних days дней до текущего момента"""
+    date_from, _ = period_bounds(days)
+    return datetime.combine(date_from, time.min, tzinfo=TIMEZONE), get_current_time()
+
+def add_assignee_name(df: pd.DataFrame) -> pd.DataFrame:
+    """Колонка assignee_name из имени, фамилии и username"""
+    full_name = (df['first_name'].fillna('') + ' ' + df['last_name'].fillna('')).str.strip()
+    df['assignee_name'] = full_name.where(full_name != '', df['username'].fillna('Неизвестный'))
+    return df
+
+def build_stats_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """DataFrame из строк сводки с вычисленным именем исполнителя"""
+    df = pd.DataFrame(rows, columns=[
+        'day', 'status', 'task_count', 'urgent_count', 'company_id', 'company_name',
+        'assignee_id', 'first_name', 'last_name', 'username'
+    ])
+    return add_assignee_name(df)
+
+def build_events_frame(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """DataFrame из журнала статусов, упорядоченный по задаче и времени"""
+    df = pd.DataFrame(rows, columns=[
+        'task_id', 'old_status', 'new_status', 'changed_at', 'company_id', 'company_name',
+        'assignee_id', 'first_name', 'last_name', 'username'
+    ])
+    df['changed_at'] = pd.to_datetime(df['changed_at'], utc=True)
+    return add_assignee_name(df).sort_values(['task_id', 'changed_at'], ignore_index=True)
+
+def time_in_status(events: pd.DataFrame, until: datetime) -> pd.DataFrame:
+    """Часы, проведенные каждой задачей в каждом статусе.
+    
+    Статус длится до следующего события задачи, последний - до until.
+    """
+    next_change = events.groupby('task_id')['changed_at'].shift(-1).fillna(pd.Timestamp(until))
+    hours = (next_change - events['changed_at']).dt.total_seconds() / 3600
+    return events.assign(hours=hours).pivot_table(
+        index='task_id', columns='new_status', values='hours', aggfunc='sum', fill_value=0
+    )
+
+def completion_times(events: pd.DataFrame) -> pd.DataFrame:
+    """Время выполнения по задачам в часах.
+    
+    lead - от создания до последнего выполнения, cycle - от первого взятия
+    в работу до него же (NaN, если задача в работу не бралась). Компания и
+    исполнитель берутся из события выполнения.
+    """
+    completed = events[events['new_status'] == 'completed']
+    done = completed.loc[
+        completed.groupby('task_id')['changed_at'].idxmax(),
+        ['task_id', 'changed_at', 'company_name', 'assignee_name']
+    ].set_index('task_id').rename(columns={'changed_at': 'completed_at'})
+
+    created_at = events.groupby('task_id')['changed_at'].min().reindex(done.index)
+    started_at = (
+        events[events['new_status'] == 'in_progress']
+        .groupby('task_id')['changed_at'].min()
+        .reindex(done.index)
+    )
+    started_at = started_at.where(started_at <= done['completed_at'])
+
+    done['lead_hours'] = (done['completed_at'] - created_at).dt.total_seconds() / 3600
+    done['cycle_hours'] = (done['completed_at'] - started_at).dt.total_seconds() / 3600
+    return done
+
+def completion_percentiles(times: pd.DataFrame, by: str) -> pd.DataFrame:
+    """Медиана (p50) и p90 времени lead/cycle в разрезе by"""
+    groups = times.groupby(by)
+    table = groups[['lead_hours', 'cycle_hours']].quantile([0.5, 0.9]).unstack()
+    table.columns = [f"{metric.split('_')[0]}_p{round(q * 100)}" for metric, q in table.columns]
+    table['tasks'] = groups.size()
+    return table.sort_values('tasks', ascending=False)
+
+def format_hours(hours: float) -> str:
+    """Длительность: часы до двух суток, дальше дни"""
+    if pd.isna(hours):
+        return "—"
+    if hours < 48:
+        return f"{hours:.1f} ч"
+    return f"{hours / 24:.1f} дн"
+
+def pivot_events(df: pd.DataFrame, by: str) -> pd.DataFrame:
+    """Таблица: строки - значения by, колонки - события сводки"""
+    table = df.pivot_table(
+        index=by, columns='status', values='task_count', aggfunc='sum', fill_value=0
+    ).reindex(columns=list(EVENT_NAMES), fill_value=0)
+    table['completion_rate'] = (table['completed'] / table['created'].where(table['created'] > 0)).fillna(0)
+    return table.sort_values(['created', 'completed'], ascending=False)
+
+async def load_stats(days: int) -> pd.DataFrame:
+    """Сводка за последние days дней"""
+    date_from, date_to = period_bounds(days)
+    rows = await AnalyticsManager.get_daily_stats(date_from, date_to)
+    return build_stats_frame(rows)
+
+async def period_report(title: str, days: int) -> str:
+    """Общий отчет за период"""
+    df = await load_stats(days)
+    if df.empty:
+        return f"📊 Отчет {title}\n\nЗа этот период событий по задачам нет."
+
+    totals = df.groupby('status')['task_count'].sum().reindex(list(EVENT_NAMES), fill_value=0)
+    urgent_created = int(df.loc[df['status'] == 'created', 'urgent_count'].sum())
+
+    text = f"📊 Отчет {title}\n\n"
+    for status, name in EVENT_NAMES.items():
+        text += f"{name}: {int(totals[status])}\n"
+    text += f"🔥 Срочных создано: {urgent_created}\n"
+
+    if totals['created'] > 0:
+        text += f"\n📈 Выполнено от созданных: {totals['completed'] / totals['created']:.0%}"
+
+    return text
+
+async def breakdown_report(title: str, by: str, days: int = 30, limit: int = 20) -> str:
+    """Отчет в разрезе исполнителей или компаний"""
+    df = await load_stats(days)
+    if df.empty:
+        return f"{title} ({days} дней)\n\nЗа этот период событий по задачам нет."
+
+    table = pivot_events(df, by).head(limit)
+
+    text = f"{title} ({days} дней)\n\n"
+    for name, row in table.iterrows():
+        text += (
+            f"• {name}\n"
+            f"   🆕 {int(row['created'])}  ⏳ {int(row['in_progress'])}  "
+            f"✅ {int(row['completed'])}  ⚠️ {int(row['overdue'])}  ❌ {int(row['cancelled'])}"
+            f"  ({row['completion_rate']:.0%})\n"
+        )
+    return text
+
+async def completion_time_report(days: int = 30, limit: int = 10) -> str:
+    """Отчет о времени выполнения задач, выполненных за последние days дней"""
+    since, until = window_bounds(days)
+    events = build_events_frame(await AnalyticsManager.get_status_events(since, until))
+    if events.empty:
+        return f"⏱️ Время выполнения ({days} дней)\n\nЗа этот период выполненных задач нет."
+
+    times = completion_times(events)
+    statuses = time_in_status(events, until).reindex(
+        index=times.index, columns=list(TIME_IN_STATUS_NAMES), fill_value=0
+    ).median()
+
+    text = (
+        f"⏱️ Время выполнения ({days} дней)\n\n"
+        f"✅ Выполнено задач: {len(times)}\n"
+        f"📥 От создания (p50 / p90): {format_hours(times['lead_hours'].median())} / "
+        f"{format_hours(times['lead_hours'].quantile(0.9))}\n"
+        f"🔧 В работе (p50 / p90): {format_hours(times['cycle_hours'].median())} / "
+        f"{format_hours(times['cycle_hours'].quantile(0.9))}\n\n"
+        "Медиана времени в статусе:\n"
+    )
+    for status, name in TIME_IN_STATUS_NAMES.items():
+        text += f"{name}: {format_hours(statuses[status])}\n"
+
+    for title, by in (("👥 По исполнителям", 'assignee_name'), ("🏢 По компаниям", 'company_name')):
+        text += f"\n{title} (от создания / в работе, p50 · p90):\n"
+        for name, row in completion_percentiles(times, by).head(limit).iterrows():
+            text += (
+                f"• {name} ({int(row['tasks'])})\n"
+                f"   {format_hours(row['lead_p50'])} · {format_hours(row['lead_p90'])}"
+                f"  /  {format_hours(row['cycle_p50'])} · {format_hours(row['cycle_p90'])}\n"
+            )
+    return text
+
+def trend_chart_data(df: pd.DataFrame, days: int) -> Dict[str, Any]:
+    """Данные графика событий по дням (все дни периода, включая пустые)"""
+    date_from, date_to = period_bounds(days)
+    statuses = ['created', 'completed', 'overdue']
+    table = df.pivot_table(
+        index='day', columns='status', values='task_count', aggfunc='sum', fill_value=0
+    ).reindex(index=pd.date_range(date_from, date_to).date, columns=statuses, fill_value=0)
+    return {
+        'title': f"События по дням ({days} дней)",
+        'days': [day.strftime('%d.%m') for day in table.index],
+        'series': {status: table[status].astype(int).tolist() for status in statuses},
+        'labels': {status: CHART_LABELS[status] for status in statuses}
+    }
+
+def workload_chart_data(df: pd.DataFrame, days: int, limit: int = 10) -> Dict[str, Any]:
+    """Данные графика созданных и выполненных задач по исполнителям"""
+    statuses = ['created', 'completed']
+    table = pivot_events(df, 'assignee_name').head(limit)
+    return {
+        'title': f"Исполнители ({days} дней)",
+        'names': table.index.tolist(),
+        'series': {status: table[status].astype(int).tolist() for status in statuses},
+        'labels': {status: CHART_LABELS[status] for status in statuses}
+    }
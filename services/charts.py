@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, Message
+from config import CHART_WORKERS, CHART_CACHE_SIZE
+from database.models import ChartCacheManager
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Параметры графиков по умолчанию (входят в ключ кэша)
+DEFAULT_PARAMS = {'width': 10, 'height': 5, 'dpi': 100}
+
+# Цвета событий сводки
+EVENT_COLORS = {
+    'created': '#4c78a8',
+    'in_progress': '#f58518',
+    'completed': '#54a24b',
+    'overdue': '#e45756',
+    'cancelled': '#9d9d9d'
+}
+
+def init_worker() -> None:
+    """Инициализация процесса рендеринга: matplotlib с бэкендом Agg
+    импортируется один раз при старте процесса"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+
+def _render_trend(ax, data: Dict[str, Any]) -> None:
+    """Линии событий по дням"""
+    positions = range(len(data['days']))
+    for status, values in data['series'].items():
+        ax.plot(positions, values, marker='o', label=data['labels'][status],
+                color=EVENT_COLORS.get(status))
+    ax.set_xticks(positions)
+    ax.set_xticklabels(data['days'], rotation=45)
+    ax.set_title(data['title'])
+    ax.legend()
+
+def _render_workload(ax, data: Dict[str, Any]) -> None:
+    """Горизонтальные столбцы событий по исполнителям"""
+    names = data['names']
+    positions = range(len(names))
+    height = 0.8 / len(data['series'])
+    for i, (status, values) in enumerate(data['series'].items()):
+        ax.barh([p + i * height for p in positions], values, height=height,
+                label=data['labels'][status], color=EVENT_COLORS.get(status))
+    ax.set_yticks([p + height * (len(data['series']) - 1) / 2 for p in positions])
+    ax.set_yticklabels(names)
+    ax.invert_yaxis()
+    ax.set_title(data['title'])
+    ax.legend()
+
+RENDERERS = {
+    'trend': _render_trend,
+    'workload': _render_workload
+}
+
+def render_chart(kind: str, data: Dict[str, Any], params: Dict[str, Any]) -> bytes:
+    """Рендеринг графика в PNG (выполняется в процессе пула)"""
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(params['width'], params['height']), dpi=params['dpi'])
+    try:
+        RENDERERS[kind](ax, data)
+        ax.grid(alpha=0.3)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format='png', bbox_inches='tight')
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
+
+class ChartService:
+    """Рендеринг графиков в пуле процессов с кэшем по хэшу содержимого.
+
+    Ключ графика - sha256 от вида, данных и параметров. Готовые PNG хранятся
+    в LRU-кэше, а file_id первой отправки - в памяти и в таблице chart_cache,
+    так что повторный показ отправляется по file_id без загрузки файла.
+    Одинаковые графики, запрошенные одновременно, рендерятся один раз.
+    """
+
+    def __init__(self, workers: int = CHART_WORKERS, cache_size: int = CHART_CACHE_SIZE):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._png = LRUCache(cache_size)
+        self._file_ids = LRUCache(cache_size * 16)
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    def start(self) -> None:
+        """Создание пула и прогрев процессов (до запуска фоновых потоков)"""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker)
+            for _ in range(self.workers):
+                self._pool.submit(init_worker)
+            logger.info(f"Пул рендеринга графиков запущен ({self.workers} проц.)")
+
+    def close(self) -> None:
+        """Остановка пула"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @staticmethod
+    def chart_key(kind: str, data: Dict[str, Any], params: Dict[str, Any]) -> str:
+        """Хэш содержимого графика"""
+        payload = json.dumps([kind, data, params], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def render(self, kind: str, data: Dict[str, Any], params: Dict[str, Any],
+                     key: str = None) -> bytes:
+        """PNG графика из кэша или из пула процессов"""
+        key = key or self.chart_key(kind, data, params)
+        png = self._png.get(key)
+        if png is not None:
+            return png
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        self.start()
+        future = asyncio.get_running_loop().run_in_executor(self._pool, render_chart, kind, data, params)
+        self._pending[key] = future
+        try:
+            png = await asyncio.shield(future)
+        finally:
+            self._pending.pop(key, None)
+
+        self._png.set(key, png)
+        return png
+
+    async def send(self, message: Message, kind: str, data: Dict[str, Any],
+                   caption: str = None, **params) -> Message:
+        """Отправка графика: по file_id, если он уже отправлялся, иначе PNG"""
+        params = {**DEFAULT_PARAMS, **params}
+        key = self.chart_key(kind, data, params)
+
+        file_id = self._file_ids.get(key) or await ChartCacheManager.get_file_id(key)
+        if file_id:
+            try:
+                sent = await message.answer_photo(file_id, caption=caption)
+                self._file_ids.set(key, file_id)
+                return sent
+            except TelegramBadRequest as e:
+                logger.warning(f"file_id графика {key} недействителен: {e}")
+                self._file_ids.pop(key)
+                await ChartCacheManager.delete_file_id(key)
+
+        png = await self.render(kind, data, params, key)
+        sent = await message.answer_photo(BufferedInputFile(png, filename=f"{kind}.png"), caption=caption)
+
+        file_id = sent.photo[-1].file_id
+        self._file_ids.set(key, file_id)
+        await ChartCacheManager.save_file_id(key, file_id)
+        return sent
+
+# Глобальный экземпляр
+chart_service = ChartService()
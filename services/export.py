@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, List
+import aiofiles
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, Message
+from openpyxl import Workbook
+from config import EXPORT_BATCH_SIZE, EXPORT_TIMEOUT, EXPORT_PROGRESS_INTERVAL
+from database.models import ExportManager, get_current_time
+from database.task_filters import TaskFilter
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# Лимит строк листа Excel (включая заголовок)
+XLSX_MAX_ROWS = 1048576
+
+class ExportProgress:
+    """Прогресс выгрузки в одном сообщении (не чаще раза в interval секунд)"""
+
+    def __init__(self, message: Message, total: int, interval: float = EXPORT_PROGRESS_INTERVAL):
+        self.message = message
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self._edited_at = time.monotonic()
+
+    async def advance(self, rows: int) -> None:
+        self.done = min(self.done + rows, self.total)
+        if time.monotonic() - self._edited_at >= self.interval:
+            await self.show(f"⏳ Выгрузка: {self.done} из {self.total} ({self.done / self.total:.0%})")
+
+    async def show(self, text: str) -> None:
+        self._edited_at = time.monotonic()
+        try:
+            await self.message.edit_text(text)
+        except TelegramBadRequest as e:
+            logger.debug(f"Не удалось обновить прогресс выгрузки: {e}")
+
+class ExportService:
+    """Фоновая выгрузка задач в CSV/XLSX с постоянным расходом памяти.
+
+    CSV идет через COPY ... TO STDOUT прямо в файл, XLSX - пачками из
+    серверного курсора в Workbook(write_only=True), запись пачки выполняется
+    в потоке. Готовый файл отправляется документом и удаляется.
+    На пользователя одновременно выполняется одна выгрузка.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[int, asyncio.Task] = {}
+
+    def is_running(self, user_key: int) -> bool:
+        job = self._jobs.get(user_key)
+        return job is not None and not job.done()
+
+    def start(self, bot: Bot, chat_id: int, user_key: int, task_filter: TaskFilter,
+              export_format: str, description: str) -> bool:
+        """Запуск выгрузки в фоне; False, если у пользователя уже есть выгрузка"""
+        if self.is_running(user_key):
+            return False
+        job = asyncio.get_running_loop().create_task(
+            self._run(bot, chat_id, task_filter, export_format, description)
+        )
+        self._jobs[user_key] = job
+        job.add_done_callback(lambda _: self._jobs.pop(user_key, None))
+        return True
+
+    async def close(self) -> None:
+        """Отмена незавершенных выгрузок"""
+        jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+        if jobs:
+            await asyncio.gather(*jobs, return_exceptions=True)
+
+    async def _run(self, bot: Bot, chat_id: int, task_filter: TaskFilter,
+                   export_format: str, description: str) -> None:
+        message = await bot.send_message(chat_id, f"⏳ Подготовка выгрузки ({description})...")
+        fd, path = tempfile.mkstemp(prefix="tasks_export_", suffix=f".{export_format}")
+        os.close(fd)
+        try:
+            total = await ExportManager.count_tasks(task_filter)
+            if total == 0:
+                await message.edit_text(f"📭 Задач для выгрузки нет ({description}).")
+                return
+            if export_format == 'xlsx' and total >= XLSX_MAX_ROWS:
+                await message.edit_text(
+                    f"❌ {total} задач не помещаются в лист Excel. Используйте /export csv."
+                )
+                return
+
+            progress = ExportProgress(message, total)
+            await progress.show(f"⏳ Выгрузка: 0 из {total}")
+            if export_format == 'csv':
+                await self._write_csv(path, task_filter, progress)
+            else:
+                await self._write_xlsx(path, task_filter, progress)
+
+            file_name = f"tasks_{get_current_time().strftime('%Y%m%d_%H%M')}.{export_format}"
+            await bot.send_document(
+                chat_id, FSInputFile(path, filename=file_name),
+                caption=f"📤 Выгрузка задач: {total} ({description})"
+            )
+            await progress.show(f"✅ Выгрузка готова: {total} задач")
+            logger.info(f"Выгрузка {export_format} ({total} задач) отправлена в чат {chat_id}")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка выгрузки задач: {e}")
+            try:
+                await message.edit_text("❌ Ошибка выгрузки. Попробуйте позже.")
+            except TelegramBadRequest:
+                pass
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def _write_csv(self, path: str, task_filter: TaskFilter, progress: ExportProgress) -> None:
+        """CSV через COPY: фрагменты пишутся в файл по мере получения"""
+        async with aiofiles.open(path, 'wb') as f:
+            # BOM, чтобы Excel открыл UTF-8 без вопросов о кодировке
+            await f.write('\ufeff'.encode())
+            header = True
+
+            async def write_chunk(chunk: bytes) -> None:
+                nonlocal header
+                await f.write(chunk)
+                # Число строк по переводам строк (без учета заголовка)
+                rows = chunk.count(b'\n')
+                if header and rows:
+                    rows, header = rows - 1, False
+                await progress.advance(rows)
+
+            await ExportManager.copy_tasks_csv(task_filter, write_chunk, timeout=EXPORT_TIMEOUT)
+
+    async def _write_xlsx(self, path: str, task_filter: TaskFilter, progress: ExportProgress) -> None:
+        """XLSX из серверного курсора в книгу в режиме write_only"""
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Задачи")
+        sheet.append(list(ExportManager.COLUMNS))
+
+        async for rows in ExportManager.iter_tasks(task_filter, EXPORT_BATCH_SIZE, timeout=EXPORT_TIMEOUT):
+            await asyncio.to_thread(self._append_rows, sheet, rows)
+            await progress.advance(len(rows))
+
+        await asyncio.to_thread(workbook.save, path)
+
+    @staticmethod
+    def _append_rows(sheet, rows: List[tuple]) -> None:
+        for row in rows:
+            sheet.append(row)
+
+# Глобальный экземпляр
+export_service = ExportService()
@@ -0,0 +1,134 @@
+import logging
+import os
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import FSInputFile, InputMediaDocument, InputMediaPhoto, Message
+from config import THUMBNAIL_SIZES
+from database.models import FileManager
+from utils.file_storage import file_storage
+from utils.thumbnails import thumbnail_cache
+
+logger = logging.getLogger(__name__)
+
+# Максимум файлов в одном альбоме sendMediaGroup
+MEDIA_GROUP_SIZE = 10
+# Фото больше этого размера Telegram не принимает как фото
+PHOTO_MAX_SIZE = 10 * 1024 * 1024
+PHOTO_CONTENT_TYPES = ('image/jpeg', 'image/png')
+# Максимальная сторона превью документа, которое принимает Telegram
+DOCUMENT_THUMBNAIL_SIZE = 320
+
+def media_kind(file: Dict[str, Any]) -> str:
+    """'photo' или 'document': как файл получен ботом, иначе по типу и размеру"""
+    if file.get('media_type') in ('photo', 'document'):
+        return file['media_type']
+    if file['content_type'] in PHOTO_CONTENT_TYPES and file['file_size'] <= PHOTO_MAX_SIZE:
+        return 'photo'
+    return 'document'
+
+def media_batches(files: List[Dict[str, Any]]) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """Альбомы по MEDIA_GROUP_SIZE: фото и документы отдельно (смешивать их нельзя)"""
+    batches = []
+    for kind in ('photo', 'document'):
+        same_kind = [file for file in files if media_kind(file) == kind]
+        for start in range(0, len(same_kind), MEDIA_GROUP_SIZE):
+            batches.append((kind, same_kind[start:start + MEDIA_GROUP_SIZE]))
+    return batches
+
+async def document_thumbnail(file: Dict[str, Any], stack: AsyncExitStack) -> Optional[FSInputFile]:
+    """Превью для отправки изображения документом (JPEG до 320 пикселей).
+
+    Превью закрепляется в кэше до закрытия stack: FSInputFile читает
+    файл только при отправке запроса.
+    """
+    if not file_storage.is_image(file['content_type']) or THUMBNAIL_SIZES[0] > DOCUMENT_THUMBNAIL_SIZE:
+        return None
+    path = await stack.enter_async_context(thumbnail_cache.pinned(file['file_path'], THUMBNAIL_SIZES[0]))
+    return FSInputFile(path) if path else None
+
+def sent_file_ids(message: Message) -> Optional[Tuple[str, str]]:
+    """(file_id, file_unique_id) отправленного фото или документа"""
+    if message.photo:
+        return message.photo[-1].file_id, message.photo[-1].file_unique_id
+    if message.document:
+        return message.document.file_id, message.document.file_unique_id
+    return None
+
+async def send_batch(bot: Bot, chat_id: int, kind: str, files: List[Dict[str, Any]],
+                     upload: bool) -> Tuple[List[Tuple[Dict[str, Any], Message, bool]], int]:
+    """Отправка одного альбома.
+
+    Файл уходит по telegram_file_id, если он есть и upload=False, иначе
+    загружается с диска. Возвращает [(файл, сообщение, загружен ли)] и
+    число файлов, которых нет ни в Telegram, ни на диске.
+    """
+    sources = []
+    missing = 0
+    for file in files:
+        if file.get('telegram_file_id') and not upload:
+            sources.append((file, file['telegram_file_id'], False))
+            continue
+        path = file_storage.get_file_path(file['file_path'])
+        if not os.path.exists(path):
+            logger.warning(f"Файл {file['file_id']} не найден на диске: {file['file_path']}")
+            missing += 1
+            continue
+        sources.append((file, FSInputFile(path, filename=file['file_name']), True))
+
+    if not sources:
+        return [], missing
+
+    if kind == 'photo':
+        if len(sources) == 1:
+            # Альбом должен содержать от 2 файлов
+            messages = [await bot.send_photo(chat_id, sources[0][1])]
+        else:
+            messages = await bot.send_media_group(
+                chat_id, [InputMediaPhoto(media=media) for _, media, _ in sources]
+            )
+    else:
+        # Изображение-документ при загрузке получает превью (строится по запросу)
+        async with AsyncExitStack() as stack:
+            thumbnails = [await document_thumbnail(file, stack) if uploaded else None
+                          for file, _, uploaded in sources]
+            if len(sources) == 1:
+                messages = [await bot.send_document(chat_id, sources[0][1], thumbnail=thumbnails[0])]
+            else:
+                messages = await bot.send_media_group(chat_id, [
+                    InputMediaDocument(media=media, thumbnail=thumbnail)
+                    for (_, media, _), thumbnail in zip(sources, thumbnails)
+                ])
+
+    return [(file, message, uploaded) for (file, _, uploaded), message in zip(sources, messages)], missing
+
+async def send_task_files(bot: Bot, chat_id: int, files: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """Отправка файлов задачи альбомами; (отправлено, не найдено).
+
+    Повторная отправка идет по file_id без загрузки. Если Telegram отклонил
+    file_id, альбом загружается с диска, а новые идентификаторы
+    сохраняются, чтобы следующая отправка снова обошлась без загрузки.
+    """
+    sent = 0
+    missing = 0
+    updates = []
+
+    for kind, batch in media_batches(files):
+        try:
+            results, batch_missing = await send_batch(bot, chat_id, kind, batch, upload=False)
+        except TelegramBadRequest as e:
+            logger.warning(f"Telegram отклонил file_id, загрузка с диска: {e}")
+            results, batch_missing = await send_batch(bot, chat_id, kind, batch, upload=True)
+
+        sent += len(results)
+        missing += batch_missing
+        for file, message, uploaded in results:
+            ids = sent_file_ids(message)
+            if uploaded and ids:
+                updates.append((file['file_id'], kind, *ids))
+
+    if updates:
+        await FileManager.update_telegram_ids(updates)
+
+    return sent, missing
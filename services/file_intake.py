@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+from config import DOWNLOAD_CONCURRENCY, UPLOAD_QUEUE_SIZE, UPLOAD_PROGRESS_INTERVAL
+from database.models import FileManager
+from services.images import image_service, drop_near_duplicates
+from utils.file_storage import file_storage
+
+logger = logging.getLogger(__name__)
+
+# Общий лимит одновременных загрузок файлов из Telegram
+download_semaphore = asyncio.Semaphore(DOWNLOAD_CONCURRENCY)
+
+class FileIntakeError(ValueError):
+    """Файл нельзя принять (размер, тип, ошибка загрузки); текст - для пользователя"""
+
+def incoming_file(message: Message) -> Optional[Dict[str, Any]]:
+    """Описание фото или документа из сообщения (без загрузки)"""
+    if message.photo:
+        # Берем фото наибольшего размера
+        photo = message.photo[-1]
+        return {
+            'type': 'photo',
+            'telegram_file_id': photo.file_id,
+            'telegram_file_unique_id': photo.file_unique_id,
+            'file_name': f"photo_{photo.file_id}.jpg",
+            'content_type': 'image/jpeg',
+            'file_size': photo.file_size
+        }
+    if message.document:
+        document = message.document
+        return {
+            'type': 'document',
+            'telegram_file_id': document.file_id,
+            'telegram_file_unique_id': document.file_unique_id,
+            'file_name': document.file_name or f"document_{document.file_unique_id}",
+            'content_type': file_storage.get_content_type_by_extension(document.file_name or ''),
+            'file_size': document.file_size
+        }
+    return None
+
+def check_file(file: Dict[str, Any]) -> None:
+    """Проверка размера и типа до загрузки"""
+    if file['file_size'] and not file_storage.validate_file_size(file['file_size']):
+        raise FileIntakeError("Файл слишком большой! Максимальный размер: 100 МБ")
+    if file['type'] == 'document' and not file_storage.validate_file_extension(file['file_name']):
+        raise FileIntakeError(
+            "Неподдерживаемый тип файла!\n\n"
+            "Поддерживаются: изображения, документы PDF/DOC/XLS, архивы ZIP/RAR"
+        )
+
+async def receive_file(bot: Bot, file: Dict[str, Any]) -> Dict[str, Any]:
+    """Загрузка файла из Telegram потоком на диск и перенос в хранилище блобов"""
+    path = file_storage.incoming_path()
+    try:
+        async with download_semaphore:
+            file_obj = await bot.get_file(file['telegram_file_id'])
+            await bot.download_file(file_obj.file_path, destination=path)
+
+        # Размер фото известен точно только после загрузки
+        if not file_storage.validate_file_size(os.path.getsize(path)):
+            raise FileIntakeError("Файл слишком большой! Максимальный размер: 100 МБ")
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    # Фото: поворот, без метаданных, в пределах бюджета размера (если включено).
+    # Документ сохраняется байт в байт, у изображения считается только phash
+    normalized = None
+    if file['type'] == 'photo':
+        normalized = await image_service.normalize(path, file['file_name'], file['content_type'])
+        phash = normalized['phash'] if normalized else None
+    else:
+        phash = await image_service.phash(path, file['file_name'], file['content_type'])
+
+    if normalized:
+        save_result = await file_storage.store_file(
+            path, normalized['file_name'], normalized['content_type'], normalized['sha256']
+        )
+    else:
+        save_result = await file_storage.store_file(path, file['file_name'], file['content_type'])
+    if not save_result:
+        raise FileIntakeError("Не удалось сохранить файл. Попробуйте еще раз.")
+
+    return {
+        'type': file['type'],
+        'telegram_file_id': file['telegram_file_id'],
+        'telegram_file_unique_id': file['telegram_file_unique_id'],
+        'phash': phash,
+        **save_result
+    }
+
+async def receive_files(bot: Bot, messages: List[Message]) -> List[Dict[str, Any]]:
+    """Прием файлов одного или нескольких сообщений (альбома) одной партией.
+
+    Все файлы проверяются до загрузки, затем загружаются параллельно
+    (в пределах общего download_semaphore). Партия принимается целиком:
+    при первой ошибке возбуждается FileIntakeError.
+    """
+    files = [file for file in map(incoming_file, messages) if file]
+    for file in files:
+        check_file(file)
+
+    results = await asyncio.gather(
+        *(receive_file(bot, file) for file in files), return_exceptions=True
+    )
+    for file, result in zip(files, results):
+        if isinstance(result, FileIntakeError):
+            raise result
+        if isinstance(result, Exception):
+            logger.error(f"Ошибка загрузки файла {file['telegram_file_id']}: {result}")
+            raise FileIntakeError("Не удалось загрузить файл. Попробуйте еще раз.")
+
+    # Похожие снимки альбома сохраняются все: phash пишется в task_files
+    # для поиска, а не для отбраковки
+    _, similar = drop_near_duplicates(results, [])
+    if similar:
+        logger.info(f"Похожих фото в альбоме: {len(similar)}")
+    return results
+
+class UploadProgress:
+    """Прогресс серии загрузок пользователя в одном сообщении"""
+
+    def __init__(self, interval: float = UPLOAD_PROGRESS_INTERVAL):
+        self.interval = interval
+        self.total = 0
+        self.saved = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.message: Optional[Message] = None
+        self._text = None
+        self._edited_at = 0.0
+
+    def text(self) -> str:
+        text = f"⏳ Загрузка файлов: {self.saved + self.failed + self.duplicates} из {self.total}"
+        if self.failed:
+            text += f" (ошибок: {self.failed})"
+        return text
+
+    async def advance(self, saved: int, failed: int, duplicates: int = 0) -> None:
+        self.saved += saved
+        self.failed += failed
+        self.duplicates += duplicates
+        if time.monotonic() - self._edited_at >= self.interval:
+            await self.show(self.text())
+
+    async def show(self, text: str) -> None:
+        # Повторная правка тем же текстом - ошибка Bot API
+        if self.message is None or text == self._text:
+            return
+        self._edited_at = time.monotonic()
+        self._text = text
+        try:
+            await self.message.edit_text(text)
+        except TelegramBadRequest as e:
+            logger.debug(f"Не удалось обновить прогресс загрузки: {e}")
+
+class UploadPipeline:
+    """Прием файлов к существующим задачам.
+
+    У каждого пользователя своя очередь (до UPLOAD_QUEUE_SIZE сообщений)
+    и один обработчик: сообщения и альбомы обрабатываются по порядку,
+    файлы одного сообщения загружаются параллельно в пределах общего
+    download_semaphore, потоком на диск, и записываются в task_files
+    одной командой. Прогресс всей серии отражается в одном сообщении.
+    """
+
+    def __init__(self):
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._progress: Dict[int, UploadProgress] = {}
+        self._workers: Dict[str, asyncio.Task] = {}
+
+    def submit(self, bot: Bot, chat_id: int, user_key: int, task_id: str,
+               user_id: str, messages: List[Message]) -> Optional[int]:
+        """Постановка файлов сообщения (альбома) в очередь пользователя.
+
+        Возвращает число файлов или None, если очередь заполнена;
+        FileIntakeError - если файл не проходит проверку.
+        """
+        files = [file for file in map(incoming_file, messages) if file]
+        for file in files:
+            check_file(file)
+        if not files:
+            return 0
+
+        queue = self._queues.get(user_key)
+        if queue is None:
+            # Новая серия: своя очередь, сообщение прогресса и обработчик
+            queue = self._queues[user_key] = asyncio.Queue(UPLOAD_QUEUE_SIZE)
+            self._progress[user_key] = UploadProgress()
+            worker = asyncio.get_running_loop().create_task(self._run(bot, chat_id, user_key))
+            self._workers[worker.get_name()] = worker
+            worker.add_done_callback(lambda task: self._workers.pop(task.get_name(), None))
+        try:
+            queue.put_nowait((task_id, user_id, files))
+        except asyncio.QueueFull:
+            return None
+        self._progress[user_key].total += len(files)
+        return len(files)
+
+    async def close(self) -> None:
+        """Отмена незавершенных загрузок"""
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _run(self, bot: Bot, chat_id: int, user_key: int) -> None:
+        queue = self._queues[user_key]
+        progress = self._progress[user_key]
+        try:
+            progress.message = await bot.send_message(chat_id, progress.text())
+            while not queue.empty():
+                task_id, user_id, files = queue.get_nowait()
+                await progress.advance(*await self._upload(bot, task_id, user_id, files))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка загрузки файлов пользователя {user_key}: {e}")
+        finally:
+            # Следующая отправка начнет новую серию с новым сообщением
+            self._queues.pop(user_key, None)
+            self._progress.pop(user_key, None)
+
+        text = f"✅ Прикреплено файлов: {progress.saved}"
+        if progress.duplicates:
+            text += f"\n♻️ Похожие фото уже есть в задаче: {progress.duplicates}"
+        if progress.failed:
+            text += f"\n❌ Не удалось загрузить: {progress.failed}"
+        await progress.show(text)
+
+    async def _upload(self, bot: Bot, task_id: str, user_id: str,
+                      files: List[Dict[str, Any]]) -> Tuple[int, int, int]:
+        """Загрузка файлов одного сообщения; (сохранено, ошибок, похожих)"""
+        results = await asyncio.gather(
+            *(receive_file(bot, file) for file in files), return_exceptions=True
+        )
+        stored = []
+        for file, result in zip(files, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Ошибка загрузки файла {file['telegram_file_id']}: {result}")
+            else:
+                stored.append(result)
+
+        # Снимки, почти совпадающие с уже приложенными к задаче, не добавляются
+        if any(file.get('phash') is not None for file in stored):
+            stored, duplicates = drop_near_duplicates(stored, await FileManager.get_task_phashes(task_id))
+        else:
+            duplicates = []
+
+        saved = await FileManager.save_files_info(task_id, user_id, stored)
+        logger.info(f"К задаче {task_id} прикреплено файлов: {saved} из {len(files)}, "
+                    f"похожих: {len(duplicates)}")
+        return saved, len(files) - saved - len(duplicates), len(duplicates)
+
+# Глобальный экземпляр
+upload_pipeline = UploadPipeline()
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from config import (
+    IMAGE_PIPELINE, IMAGE_WORKERS, IMAGE_FORMAT, IMAGE_MAX_SIDE, IMAGE_MAX_BYTES,
+    IMAGE_PHASH_DISTANCE
+)
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMATS = {
+    'JPEG': ('image/jpeg', '.jpg'),
+    'WEBP': ('image/webp', '.webp')
+}
+
+# Что нормализуется (GIF не трогаем - анимация потеряется)
+NORMALIZE_CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/bmp')
+
+# Ступени качества при подгонке под бюджет размера
+QUALITY_STEPS = (85, 75, 65, 55, 45)
+# Во сколько раз уменьшается сторона, если бюджет не достигнут на худшем качестве
+DOWNSCALE_STEP = 0.75
+DOWNSCALE_ATTEMPTS = 3
+
+def dhash(image, size: int = 8) -> int:
+    """Перцептивный хэш (difference hash): 64 бита, знаковое число для BIGINT"""
+    from PIL import Image
+
+    gray = image.convert('L').resize((size + 1, size), Image.Resampling.LANCZOS)
+    pixels = list(gray.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def encode_image(image, image_format: str, max_bytes: int) -> bytes:
+    """Кодирование с понижением качества, а затем размера, до бюджета max_bytes"""
+    from PIL import Image
+
+    for attempt in range(DOWNSCALE_ATTEMPTS + 1):
+        for quality in QUALITY_STEPS:
+            buffer = io.BytesIO()
+            if image_format == 'WEBP':
+                image.save(buffer, format='WEBP', quality=quality, method=4)
+            else:
+                image.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue()
+        if attempt < DOWNSCALE_ATTEMPTS:
+            width, height = image.size
+            image = image.resize((max(1, int(width * DOWNSCALE_STEP)), max(1, int(height * DOWNSCALE_STEP))),
+                                 Image.Resampling.LANCZOS)
+    # Бюджет недостижим - оставляем самый компактный вариант
+    return buffer.getvalue()
+
+def normalize_image(source_path: str, output_path: str, image_format: str,
+                    max_side: int, max_bytes: int) -> Dict[str, Any]:
+    """Нормализация фото (выполняется в процессе пула).
+
+    Поворот по EXIF, удаление метаданных (EXIF, GPS, ICC не переносятся),
+    уменьшение до max_side и перекодирование в image_format в пределах
+    max_bytes. Результат пишется в output_path.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            if image_format == 'JPEG':
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        phash = dhash(image)
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+        data = encode_image(image, image_format, max_bytes)
+
+    with open(output_path, 'wb') as f:
+        f.write(data)
+
+    content_type, extension = IMAGE_FORMATS[image_format]
+    return {
+        'size': len(data),
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'phash': phash,
+        'content_type': content_type,
+        'extension': extension
+    }
+
+def image_phash(source_path: str) -> int:
+    """Перцептивный хэш изображения без его изменения (выполняется в процессе пула)"""
+    from PIL import Image, ImageOps
+
+    with Image.open(source_path) as original:
+        return dhash(ImageOps.exif_transpose(original))
+
+def phash_distance(first: int, second: int) -> int:
+    """Число различающихся бит двух перцептивных хэшей"""
+    return ((first ^ second) & ((1 << 64) - 1)).bit_count()
+
+def drop_near_duplicates(files: List[Dict[str, Any]], known: List[int],
+                         max_distance: int = IMAGE_PHASH_DISTANCE) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """(новые, похожие): файл похож, если его phash близок к уже известному
+    или к phash более раннего файла той же пачки"""
+    if max_distance <= 0:
+        return files, []
+
+    known = list(known)
+    kept, duplicates = [], []
+    for file in files:
+        phash = file.get('phash')
+        if phash is not None and any(phash_distance(phash, other) <= max_distance for other in known):
+            duplicates.append(file)
+            continue
+        if phash is not None:
+            known.append(phash)
+        kept.append(file)
+    return kept, duplicates
+
+class ImageService:
+    """Нормализация фото в пуле процессов.
+
+    Включается IMAGE_PIPELINE: фото после загрузки поворачиваются по EXIF,
+    теряют метаданные и перекодируются в IMAGE_FORMAT в пределах
+    IMAGE_MAX_BYTES, а их перцептивный хэш сохраняется в task_files.phash
+    для поиска почти одинаковых снимков. Изображения, отправленные файлом,
+    не перекодируются (пользователь хочет сохранить оригинал): для них
+    считается только перцептивный хэш. Ошибка обработки не мешает
+    загрузке: сохраняется оригинал.
+    """
+
+    def __init__(self, enabled: bool = IMAGE_PIPELINE, workers: int = IMAGE_WORKERS):
+        self.enabled = enabled and IMAGE_FORMAT in IMAGE_FORMATS
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        """Создание пула (до запуска фоновых потоков)"""
+        if self.enabled and self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            logger.info(f"Пул обработки изображений запущен ({self.workers} проц.)")
+
+    def close(self) -> None:
+        """Остановка пула"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def normalize(self, path: str, file_name: str, content_type: str) -> Optional[Dict[str, Any]]:
+        """Нормализация файла на месте; новые имя, тип, размер и phash или None"""
+        if not self.enabled or content_type not in NORMALIZE_CONTENT_TYPES:
+            return None
+
+        self.start()
+        output_path = f"{path}.norm"
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._pool, normalize_image, path, output_path,
+                IMAGE_FORMAT, IMAGE_MAX_SIDE, IMAGE_MAX_BYTES
+            )
+            os.replace(output_path, path)
+        except Exception as e:
+            logger.error(f"Ошибка нормализации изображения {file_name}: {e}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            return None
+
+        result['file_name'] = f"{os.path.splitext(file_name)[0]}{result['extension']}"
+        return result
+
+    async def phash(self, path: str, file_name: str, content_type: str) -> Optional[int]:
+        """Перцептивный хэш файла без перекодирования или None"""
+        if not self.enabled or content_type not in NORMALIZE_CONTENT_TYPES:
+            return None
+
+        self.start()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, image_phash, path)
+        except Exception as e:
+            logger.error(f"Ошибка расчета хэша изображения {file_name}: {e}")
+            return None
+
+# Глобальный экземпляр
+image_service = ImageService()
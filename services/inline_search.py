@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from config import INLINE_CACHE_TTL, INLINE_CACHE_SIZE
+from database.models import UserManager, TaskManager
+from database.task_filters import TaskFilter
+from utils.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+INLINE_PAGE_SIZE = 20
+# Слов в запросе (остальные отбрасываются)
+INLINE_MAX_WORDS = 8
+
+def normalize_query(text: str) -> str:
+    """Нормализованный запрос: слова в нижнем регистре через пробел"""
+    return " ".join(re.findall(r"\w+", text.lower())[:INLINE_MAX_WORDS])
+
+def prefix_tsquery(normalized: str) -> str:
+    """Выражение to_tsquery: все слова обязательны, последнее - по началу слова"""
+    words = normalized.split()
+    return " & ".join(words[:-1] + [f"{words[-1]}:*"])
+
+def encode_offset(task: Dict[str, Any]) -> str:
+    """Ключ следующей страницы для next_offset"""
+    return f"{task['rank']!r}|{task['task_id']}"
+
+def decode_offset(offset: str) -> Optional[Tuple[float, str]]:
+    """Ключ страницы из offset; None для первой или некорректной"""
+    rank, sep, task_id = offset.partition('|')
+    if not sep:
+        return None
+    try:
+        return float(rank), task_id
+    except ValueError:
+        return None
+
+class InlineSearch:
+    """Поиск задач для inline-режима.
+
+    Результаты кэшируются по (пользователь, нормализованный запрос, offset)
+    на короткий срок, так что повторные нажатия клавиш не доходят до базы
+    (в ключе - telegram_id, поэтому кэш проверяется до загрузки пользователя).
+    Новый запрос пользователя отменяет его предыдущий незавершенный запрос.
+    """
+
+    def __init__(self, cache_size: int = INLINE_CACHE_SIZE, ttl: float = INLINE_CACHE_TTL):
+        self.cache = LRUCache(cache_size, ttl=ttl)
+        self._inflight: Dict[int, asyncio.Task] = {}
+
+    async def search(self, telegram_id: int, text: str,
+                     offset: str = "") -> Optional[Tuple[List[Dict[str, Any]], str]]:
+        """(задачи, next_offset) или None, если запрос вытеснен более новым"""
+        normalized = normalize_query(text)
+        if not normalized:
+            return [], ""
+
+        key = (telegram_id, normalized, offset)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        previous = self._inflight.get(telegram_id)
+        if previous is not None and not previous.done():
+            previous.cancel()
+
+        task = asyncio.get_running_loop().create_task(self._load(telegram_id, normalized, offset))
+        self._inflight[telegram_id] = task
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                return None
+            raise
+        finally:
+            if self._inflight.get(telegram_id) is task:
+                del self._inflight[telegram_id]
+
+        self.cache.set(key, result)
+        return result
+
+    async def _load(self, telegram_id: int, normalized: str,
+                    offset: str) -> Tuple[List[Dict[str, Any]], str]:
+        user = await UserManager.get_user_by_telegram_id(telegram_id)
+        if not user:
+            return [], ""
+
+        task_filter = TaskFilter(viewer_id=user['user_id'], viewer_role=user['role'])
+        tasks = await TaskManager.search_tasks(
+            prefix_tsquery(normalized), task_filter, decode_offset(offset),
+            INLINE_PAGE_SIZE + 1, prefix=True
+        )
+
+        if len(tasks) > INLINE_PAGE_SIZE:
+            tasks = tasks[:INLINE_PAGE_SIZE]
+            return tasks, encode_offset(tasks[-1])
+        return tasks, ""
+
+# Глобальный экземпляр
+inline_search = InlineSearch()
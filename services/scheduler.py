@@ -3,8 +3,14 @@ import logging
 from datetime import datetime, timedelta
 from aiogram import Bot
 from database.connection import db_connection
-from database.models import get_current_time
-from config import BOT_TOKEN, TIMEZONE_OFFSET
+from database.models import TaskManager, get_current_time
+from database.fsm_storage import PostgresStorage
+from services.storage_gc import storage_collector
+from config import (
+    BOT_TOKEN, TIMEZONE_OFFSET, SCHEDULER_METRICS_HOST, SCHEDULER_METRICS_PORT, STORAGE_GC_INTERVAL
+)
+from utils.metrics import setup_bot_metrics, start_metrics_server
+from utils.loop_watchdog import loop_watchdog
 from typing import List, Dict, Any
 
 # Настройка логирования
@@ -23,6 +29,11 @@ class TaskScheduler:
     def __init__(self):
         self.bot = Bot(token=BOT_TOKEN)
         self.check_interval = 30 * 60  # 30 минут
+        self.storage_gc_interval = STORAGE_GC_INTERVAL * 3600
+        self.storage_gc_at = None
+        self.metrics_runner = None
+        
+        setup_bot_metrics(self.bot)
         
     async def start(self):
         """Запуск планировщика"""
@@ -33,11 +44,20 @@ class TaskScheduler:
             logger.error("Не удалось подключиться к базе данных")
             return
         
+        # Метрики и проверка здоровья
+        try:
+            self.metrics_runner = await start_metrics_server(SCHEDULER_METRICS_HOST, SCHEDULER_METRICS_PORT)
+        except Exception as e:
+            logger.error(f"Ошибка запуска сервера метрик: {e}")
+        loop_watchdog.start()
+        
         # Основной цикл
         while True:
             try:
                 await self.check_deadlines()
                 await self.check_overdue_tasks()
+                await self.purge_fsm_states()
+                await self.collect_storage_garbage()
                 await asyncio.sleep(self.check_interval)
                 
             except Exception as e:
@@ -80,15 +100,7 @@ class TaskScheduler:
             now = get_current_time()
             
             # Находим задачи которые просрочены но еще не помечены как просроченные
-            query = """
-            UPDATE tasks 
-            SET status = 'overdue', updated_at = NOW()
-            WHERE deadline < $1 
-            AND status IN ('new', 'in_progress')
-            RETURNING task_id, title, assignee_id
-            """
-            
-            overdue_tasks = await db_connection.execute_query(query, now)
+            overdue_tasks = await TaskManager.mark_overdue_tasks(now)
             
             # Уведомляем исполнителей о просроченных задачах
             for task in overdue_tasks:
@@ -100,6 +112,23 @@ class TaskScheduler:
         except Exception as e:
             logger.error(f"Ошибка обновления просроченных задач: {e}")
     
+    async def purge_fsm_states(self):
+        """Удаление просроченных FSM-состояний"""
+        purged = await PostgresStorage.purge_expired()
+        if purged:
+            logger.info(f"Удалено {purged} просроченных FSM-состояний")
+    
+    async def collect_storage_garbage(self):
+        """Сборка мусора в хранилище файлов (не чаще раза в STORAGE_GC_INTERVAL)"""
+        now = asyncio.get_running_loop().time()
+        if self.storage_gc_at is not None and now - self.storage_gc_at < self.storage_gc_interval:
+            return
+        self.storage_gc_at = now
+        try:
+            await storage_collector.run()
+        except Exception as e:
+            logger.error(f"Ошибка сборки мусора хранилища: {e}")
+    
     async def send_deadline_notification(self, task: Dict[str, Any]):
         """Отправка уведомления о приближающемся дедлайне"""
         try:
@@ -212,6 +241,9 @@ class TaskScheduler:
     async def stop(self):
         """Остановка планировщика"""
         logger.info("Остановка планировщика...")
+        loop_watchdog.stop()
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
         await self.bot.session.close()
         await db_connection.close()
 
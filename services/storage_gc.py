@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from config import STORAGE_GC_GRACE, STORAGE_GC_BATCH, STORAGE_QUARANTINE_DAYS
+from database.models import StorageManager
+from utils.file_storage import file_storage, BLOBS_DIR, INCOMING_DIR
+
+logger = logging.getLogger(__name__)
+
+# Файлы задач до хранилища блобов: tasks/<task_id>/...
+TASKS_DIR = "tasks"
+# Временные файлы до хранилища блобов
+LEGACY_TEMP_DIR = "temp"
+# Отложенные к удалению файлы: quarantine/<ГГГГММДД>/<исходный путь>
+QUARANTINE_DIR = "quarantine"
+
+# Имя файла в блобах: <hash>, <hash>_thumb..., <hash>.<...>.tmp
+BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})")
+
+# (полный путь, путь относительно UPLOAD_PATH, размер)
+Orphan = Tuple[str, str, int]
+# (сирота, путь в карантине)
+Moved = Tuple[Orphan, str]
+
+def scan_files(path: str) -> List[Tuple[str, int, float]]:
+    """Файлы каталога: (имя, размер, mtime)"""
+    try:
+        with os.scandir(path) as entries:
+            return [
+                (entry.name, stat.st_size, stat.st_mtime)
+                for entry in entries if entry.is_file(follow_symlinks=False)
+                for stat in (entry.stat(follow_symlinks=False),)
+            ]
+    except FileNotFoundError:
+        return []
+
+def scan_dirs(path: str) -> List[Tuple[str, float]]:
+    """Подкаталоги: (имя, mtime)"""
+    try:
+        with os.scandir(path) as entries:
+            return [
+                (entry.name, entry.stat(follow_symlinks=False).st_mtime)
+                for entry in entries if entry.is_dir(follow_symlinks=False)
+            ]
+    except FileNotFoundError:
+        return []
+
+def tree_size(path: str) -> int:
+    """Объем файлов каталога со всеми подкаталогами"""
+    total = 0
+    for directory, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.lstat(os.path.join(directory, name)).st_size
+            except OSError:
+                pass
+    return total
+
+class StorageCollector:
+    """Сборщик мусора в хранилище файлов (запускается планировщиком).
+
+    Обходит UPLOAD_PATH через os.scandir по одному каталогу за раз и
+    сверяет найденное с базой пачками по STORAGE_GC_BATCH ключей:
+    блобы - с task_files.blob_hash, каталоги tasks/<task_id> - с tasks.
+    Брошенные загрузки (incoming/, temp/, недописанные *.tmp) сиротами
+    считаются по возрасту. Файлы моложе grace не трогаются: ссылка на
+    только что записанный блоб может быть еще не сохранена. Перед
+    переносом время изменения проверяется заново, а блобы, на которые
+    после переноса появилась ссылка, возвращаются на место. Сироты
+    переносятся в quarantine/ и удаляются через STORAGE_QUARANTINE_DAYS
+    (0 - удаляются сразу). Каталог превью (derivatives/) ведет
+    thumbnail_cache и здесь не обходится.
+    """
+
+    def __init__(self, grace_hours: float = STORAGE_GC_GRACE, batch_size: int = STORAGE_GC_BATCH,
+                 quarantine_days: int = STORAGE_QUARANTINE_DAYS):
+        self.grace = grace_hours * 3600
+        self.batch_size = batch_size
+        self.quarantine_days = quarantine_days
+        self.root = file_storage.upload_path
+
+    async def run(self) -> Dict[str, int]:
+        """Один проход; статистика: orphans - сирот, bytes - их объем"""
+        stats = {'orphans': 0, 'bytes': 0, 'forgotten': 0}
+        cutoff = time.time() - self.grace
+
+        await self._collect_blobs(cutoff, stats)
+        await self._collect_task_dirs(cutoff, stats)
+        for directory in (INCOMING_DIR, LEGACY_TEMP_DIR):
+            await self._collect_stale(directory, cutoff, stats)
+        await self._purge_quarantine()
+        await StorageManager.reconcile_usage()
+
+        usage = await StorageManager.get_usage()
+        logger.info(
+            f"Сборка мусора хранилища: сирот {stats['orphans']} ({stats['bytes']} байт), "
+            f"записей блобов удалено {stats['forgotten']}; "
+            f"файлов задач {usage['files'] if usage else '?'} ({usage['bytes'] if usage else '?'} байт)"
+        )
+        return stats
+
+    async def _collect_blobs(self, cutoff: float, stats: Dict[str, int]) -> None:
+        """blobs/ab/cd/*: старые файлы блобов без ссылок из task_files"""
+        pending: Dict[str, List[Orphan]] = {}
+        blobs_root = os.path.join(self.root, BLOBS_DIR)
+
+        for first, _ in await asyncio.to_thread(scan_dirs, blobs_root):
+            for second, _ in await asyncio.to_thread(scan_dirs, os.path.join(blobs_root, first)):
+                relative_dir = f"{BLOBS_DIR}/{first}/{second}"
+                leaf = os.path.join(self.root, relative_dir)
+                stale = []
+                for name, size, mtime in await asyncio.to_thread(scan_files, leaf):
+                    if mtime >= cutoff:
+                        continue
+                    orphan = (os.path.join(leaf, name), f"{relative_dir}/{name}", size)
+                    match = BLOB_NAME_RE.match(name)
+                    if name.endswith('.tmp') or not match:
+                        # Недописанный блоб
+                        stale.append(orphan)
+                    else:
+                        pending.setdefault(match.group(1), []).append(orphan)
+                await self._dispose(stale, cutoff, stats)
+
+                if len(pending) >= self.batch_size:
+                    await self._flush_blobs(pending, cutoff, stats)
+                    pending = {}
+
+        if pending:
+            await self._flush_blobs(pending, cutoff, stats)
+
+    async def _flush_blobs(self, pending: Dict[str, List[Orphan]], cutoff: float,
+                           stats: Dict[str, int]) -> None:
+        unreferenced = await StorageManager.unreferenced_blobs(list(pending))
+        if not unreferenced:
+            # None - база недоступна: ничего не удаляем
+            return
+        owners = {orphan[1]: blob_hash for blob_hash in unreferenced for orphan in pending[blob_hash]}
+        moved = await asyncio.to_thread(self._quarantine, [
+            orphan for blob_hash in unreferenced for orphan in pending[blob_hash]
+        ], cutoff)
+        if not moved:
+            return
+
+        # Ссылка могла появиться между проверкой и переносом: такие блобы возвращаются
+        confirmed = await StorageManager.unreferenced_blobs(
+            sorted({owners[orphan[1]] for orphan, _ in moved})
+        )
+        confirmed = set(confirmed or ())
+        restored = [(orphan, target) for orphan, target in moved if owners[orphan[1]] not in confirmed]
+        if restored:
+            await asyncio.to_thread(self._restore, restored)
+            logger.info(f"Возвращено блобов с новыми ссылками: {len(restored)}")
+
+        await self._finish([(orphan, target) for orphan, target in moved
+                            if owners[orphan[1]] in confirmed], stats)
+        if confirmed:
+            stats['forgotten'] += await StorageManager.forget_blobs(sorted(confirmed))
+
+    async def _collect_task_dirs(self, cutoff: float, stats: Dict[str, int]) -> None:
+        """tasks/<task_id>: каталоги удаленных задач"""
+        tasks_root = os.path.join(self.root, TASKS_DIR)
+        candidates = []
+        for name, mtime in await asyncio.to_thread(scan_dirs, tasks_root):
+            try:
+                uuid.UUID(name)
+            except ValueError:
+                continue
+            if mtime < cutoff:
+                candidates.append(name)
+
+        for start in range(0, len(candidates), self.batch_size):
+            missing = await StorageManager.missing_tasks(candidates[start:start + self.batch_size])
+            if not missing:
+                continue
+            orphans = []
+            for task_id in missing:
+                path = os.path.join(tasks_root, task_id)
+                orphans.append((path, f"{TASKS_DIR}/{task_id}", await asyncio.to_thread(tree_size, path)))
+            await self._dispose(orphans, cutoff, stats)
+
+    async def _collect_stale(self, directory: str, cutoff: float, stats: Dict[str, int]) -> None:
+        """Файлы брошенных загрузок старше grace"""
+        path = os.path.join(self.root, directory)
+        orphans = [
+            (os.path.join(path, name), f"{directory}/{name}", size)
+            for name, size, mtime in await asyncio.to_thread(scan_files, path)
+            if mtime < cutoff
+        ]
+        await self._dispose(orphans, cutoff, stats)
+
+    async def _dispose(self, orphans: List[Orphan], cutoff: float, stats: Dict[str, int]) -> None:
+        if not orphans:
+            return
+        await self._finish(await asyncio.to_thread(self._quarantine, orphans, cutoff), stats)
+
+    async def _finish(self, moved: List[Moved], stats: Dict[str, int]) -> None:
+        """Учет перенесенных сирот; без карантина они сразу удаляются"""
+        if not moved:
+            return
+        if self.quarantine_days <= 0:
+            await asyncio.to_thread(self._remove, [target for _, target in moved])
+        stats['orphans'] += len(moved)
+        stats['bytes'] += sum(orphan[2] for orphan, _ in moved)
+
+    def _quarantine(self, orphans: List[Orphan], cutoff: float) -> List[Moved]:
+        """Перенос в quarantine/<ГГГГММДД>/; [(сирота, путь в карантине)].
+
+        Время изменения проверяется заново: между обходом и переносом
+        файл мог быть использован (store_file обновляет время блоба).
+        """
+        quarantine = os.path.join(self.root, QUARANTINE_DIR, datetime.now().strftime('%Y%m%d'))
+        moved = []
+        for orphan in orphans:
+            path, relative_path, _ = orphan
+            try:
+                if os.lstat(path).st_mtime >= cutoff:
+                    continue
+                target = os.path.join(quarantine, relative_path)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(path, target)
+                moved.append((orphan, target))
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.warning(f"Не удалось убрать {relative_path}: {e}")
+        return moved
+
+    @staticmethod
+    def _restore(moved: List[Moved]) -> None:
+        for (path, relative_path, _), target in moved:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(target, path)
+            except OSError as e:
+                logger.error(f"Не удалось вернуть {relative_path} из карантина: {e}")
+
+    @staticmethod
+    def _remove(paths: List[str]) -> None:
+        for path in paths:
+            try:
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+            except OSError as e:
+                logger.warning(f"Не удалось удалить {path}: {e}")
+
+    async def _purge_quarantine(self) -> None:
+        """Удаление карантина старше STORAGE_QUARANTINE_DAYS"""
+        root = os.path.join(self.root, QUARANTINE_DIR)
+        threshold = (datetime.now() - timedelta(days=self.quarantine_days)).strftime('%Y%m%d')
+        for name, _ in await asyncio.to_thread(scan_dirs, root):
+            if name.isdigit() and name < threshold:
+                await asyncio.to_thread(shutil.rmtree, os.path.join(root, name), True)
+                logger.info(f"Карантин хранилища {name} удален")
+
+# Глобальный экземпляр
+storage_collector = StorageCollector()
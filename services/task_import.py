@@ -0,0 +1,166 @@
+import asyncio
+import io
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+import pandas as pd
+from config import IMPORT_MAX_ROWS
+from database.models import ImportManager, TIMEZONE, get_current_time
+from database.directory import company_directory, assignee_directory
+
+logger = logging.getLogger(__name__)
+
+IMPORT_EXTENSIONS = ('.csv', '.xlsx')
+
+# Колонки файла импорта (те же заголовки, что и в выгрузке) -> поле задачи
+IMPORT_COLUMNS = {
+    'Задача': 'title',
+    'Описание': 'description',
+    'Компания': 'company',
+    'Исполнитель': 'assignee',
+    'Инициатор': 'initiator_name',
+    'Телефон': 'initiator_phone',
+    'Срочная': 'is_urgent',
+    'Дедлайн': 'deadline'
+}
+REQUIRED_COLUMNS = ['Задача', 'Компания', 'Исполнитель', 'Инициатор', 'Телефон', 'Дедлайн']
+
+# Значения колонки 'Срочная', означающие "да"
+URGENT_VALUES = {'да', 'yes', 'true', '1', '+', 'срочно', 'срочная'}
+
+class ImportFileError(ValueError):
+    """Файл импорта нельзя обработать целиком (формат, колонки, размер)"""
+
+def read_table(content: bytes, file_name: str) -> pd.DataFrame:
+    """Чтение CSV/XLSX в DataFrame строк (все значения - строки или даты)"""
+    extension = os.path.splitext(file_name)[1].lower()
+    try:
+        if extension == '.xlsx':
+            df = pd.read_excel(io.BytesIO(content), dtype=object, engine='openpyxl')
+        elif extension == '.csv':
+            df = pd.read_csv(io.BytesIO(content), dtype=str, sep=None, engine='python',
+                             encoding='utf-8-sig', keep_default_na=False)
+        else:
+            raise ImportFileError("Поддерживаются только файлы CSV и XLSX.")
+    except ImportFileError:
+        raise
+    except Exception as e:
+        raise ImportFileError(f"Не удалось прочитать файл: {e}")
+
+    df.columns = [str(column).strip() for column in df.columns]
+    missing = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing:
+        raise ImportFileError(f"Нет обязательных колонок: {', '.join(missing)}")
+    if len(df) > IMPORT_MAX_ROWS:
+        raise ImportFileError(f"Слишком много строк: {len(df)} (максимум {IMPORT_MAX_ROWS}).")
+    return df
+
+def build_lookups(companies: List[Dict[str, Any]],
+                  assignees: List[Dict[str, Any]]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Словари поиска: название компании и имя/username исполнителя -> id"""
+    company_ids = {company['name'].strip().lower(): company['company_id'] for company in companies}
+
+    assignee_ids = {}
+    for user in assignees:
+        full_name = f"{user['first_name'] or ''} {user['last_name'] or ''}".strip().lower()
+        if full_name:
+            assignee_ids.setdefault(full_name, user['user_id'])
+        if user['username']:
+            assignee_ids[user['username'].lower()] = user['user_id']
+            assignee_ids['@' + user['username'].lower()] = user['user_id']
+    return company_ids, assignee_ids
+
+def parse_deadlines(values: pd.Series) -> pd.Series:
+    """Дедлайны в часовом поясе бота; дата без времени - конец дня"""
+    deadlines = pd.to_datetime(values, dayfirst=True, errors='coerce', format='mixed')
+    date_only = deadlines.notna() & (deadlines == deadlines.dt.normalize())
+    deadlines = deadlines.where(~date_only, deadlines + pd.Timedelta(hours=23, minutes=59, seconds=59))
+    if deadlines.dt.tz is None:
+        return deadlines.dt.tz_localize(TIMEZONE)
+    return deadlines.dt.tz_convert(TIMEZONE)
+
+def validate_rows(df: pd.DataFrame, company_ids: Dict[str, str],
+                  assignee_ids: Dict[str, str]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Векторная проверка строк.
+
+    Возвращает (valid, invalid): valid - поля задачи в порядке файла,
+    invalid - исходные строки с номером строки файла и текстом ошибок.
+    """
+    data = pd.DataFrame(index=df.index)
+    for column, field in IMPORT_COLUMNS.items():
+        values = df[column] if column in df.columns else pd.Series('', index=df.index)
+        data[field] = values.where(values.notna(), '').astype(str).str.strip()
+
+    data['company_id'] = data['company'].str.lower().map(company_ids)
+    data['assignee_id'] = data['assignee'].str.lower().map(assignee_ids)
+    data['is_urgent'] = data['is_urgent'].str.lower().isin(URGENT_VALUES)
+    raw_deadlines = df['Дедлайн'].where(df['Дедлайн'].notna() & (df['Дедлайн'] != ''))
+    data['deadline'] = parse_deadlines(raw_deadlines)
+    data['description'] = data['description'].where(data['description'] != '')
+
+    checks = [
+        (data['title'].str.len() < 3, "название короче 3 символов"),
+        (data['title'].str.len() > 500, "название длиннее 500 символов"),
+        (data['company_id'].isna(), "компания не найдена"),
+        (data['assignee_id'].isna(), "исполнитель не найден"),
+        (data['initiator_name'] == '', "не указан инициатор"),
+        (data['initiator_name'].str.len() > 255, "имя инициатора длиннее 255 символов"),
+        (data['initiator_phone'] == '', "не указан телефон"),
+        (data['initiator_phone'].str.len() > 50, "телефон длиннее 50 символов"),
+        (data['deadline'].isna(), "неверный дедлайн (ДД.ММ.ГГГГ или ДД.ММ.ГГГГ ЧЧ:ММ)"),
+        (data['deadline'] < pd.Timestamp(get_current_time()), "дедлайн в прошлом")
+    ]
+
+    errors = pd.Series('', index=df.index)
+    for mask, text in checks:
+        errors = errors.mask(mask, errors + '; ' + text)
+    errors = errors.str.lstrip('; ')
+    failed = errors != ''
+
+    invalid = df.loc[failed].copy()
+    # Номер строки в файле: заголовок - первая строка
+    invalid.insert(0, 'Строка', invalid.index + 2)
+    invalid['Ошибка'] = errors[failed]
+    return data.loc[~failed], invalid
+
+def to_records(valid: pd.DataFrame) -> List[tuple]:
+    """Записи для COPY в порядке колонок ImportManager.STAGING_COLUMNS"""
+    frame = pd.DataFrame({
+        'row_number': valid.index + 2,
+        'title': valid['title'],
+        'description': valid['description'].astype(object).where(valid['description'].notna(), None),
+        'company_id': valid['company_id'],
+        'initiator_name': valid['initiator_name'],
+        'initiator_phone': valid['initiator_phone'],
+        'assignee_id': valid['assignee_id'],
+        'is_urgent': valid['is_urgent'].astype(bool),
+        'deadline': valid['deadline'].astype(object)
+    })
+    return list(frame.itertuples(index=False, name=None))
+
+def error_report(invalid: pd.DataFrame) -> bytes:
+    """CSV с ошибочными строками (UTF-8 с BOM для Excel)"""
+    return invalid.to_csv(index=False).encode('utf-8-sig')
+
+def prepare_import(content: bytes, file_name: str, company_ids: Dict[str, str],
+                   assignee_ids: Dict[str, str]) -> Tuple[List[tuple], pd.DataFrame]:
+    """Разбор и проверка файла (выполняется в потоке)"""
+    df = read_table(content, file_name)
+    valid, invalid = validate_rows(df, company_ids, assignee_ids)
+    return to_records(valid), invalid
+
+async def import_tasks(content: bytes, file_name: str, created_by: str) -> Tuple[int, pd.DataFrame]:
+    """Импорт задач из файла: (количество созданных задач, ошибочные строки).
+
+    Справочники загружаются один раз, разбор идет вне цикла событий,
+    загрузка - одной транзакцией через COPY во временную таблицу.
+    """
+    company_ids, assignee_ids = build_lookups(
+        await company_directory.all(), await assignee_directory.all()
+    )
+    records, invalid = await asyncio.to_thread(
+        prepare_import, content, file_name, company_ids, assignee_ids
+    )
+    imported = await ImportManager.import_tasks(records, created_by) if records else 0
+    logger.info(f"Импорт {file_name}: создано {imported}, ошибок {len(invalid)}")
+    return imported, invalid
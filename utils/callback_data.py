@@ -0,0 +1,60 @@
+from aiogram.filters.callback_data import CallbackData
+
+# Короткие префиксы экономят место в 64 байтах callback_data
+
+class TaskCallback(CallbackData, prefix="to"):
+    """Открыть карточку задачи"""
+    task_id: str
+
+class StatusMenuCallback(CallbackData, prefix="tm"):
+    """Меню изменения статуса задачи"""
+    task_id: str
+
+class SetStatusCallback(CallbackData, prefix="ts"):
+    """Установить новый статус задачи"""
+    task_id: str
+    status: str
+
+class CommentsCallback(CallbackData, prefix="tk"):
+    """Комментарии к задаче"""
+    task_id: str
+
+class FilesCallback(CallbackData, prefix="tf"):
+    """Файлы задачи"""
+    task_id: str
+
+class AttachFilesCallback(CallbackData, prefix="ta"):
+    """Прикрепить файлы к задаче"""
+    task_id: str
+
+class TaskListCallback(CallbackData, prefix="tl"):
+    """Список задач (возврат или обновление) с состоянием фильтров.
+
+    status и due - однобуквенные коды (LIST_STATUS_CODES и окна дедлайна
+    DEADLINE_WINDOWS), пустая строка - без фильтра.
+    """
+    refresh: bool = False
+    page: int = 0
+    company_id: str = ""
+    status: str = ""
+    urgent: bool = False
+    due: str = ""
+
+class CompanyFilterCallback(CallbackData, prefix="cf"):
+    """Меню фильтра по компаниям"""
+
+class CompanyTasksCallback(CallbackData, prefix="tc"):
+    """Задачи выбранной компании"""
+    company_id: str
+
+class SearchPageCallback(CallbackData, prefix="sp"):
+    """Страница результатов поиска (курсоры страниц хранятся в FSM)"""
+    page: int
+
+class CompanyPickCallback(CallbackData, prefix="cp"):
+    """Выбор компании при создании задачи"""
+    company_id: str
+
+class CompanyPageCallback(CallbackData, prefix="cg"):
+    """Страница списка компаний при создании задачи"""
+    page: int
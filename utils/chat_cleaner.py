@@ -1,62 +1,134 @@
 import asyncio
 import logging
-from typing import Dict, List, Optional
+import time
+from typing import Any, Dict, List, Optional, Set
+from aiogram import Bot
 from aiogram.types import Message
+from config import CHAT_CLEANER_MAX_CHATS, CHAT_CLEANER_MAX_MESSAGES, CHAT_CLEANER_PERSIST
+from database.models import ChatHistoryManager
+from .cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# Telegram позволяет удалять сообщения не старше 48 часов (берем с запасом)
+DELETE_WINDOW = 48 * 60 * 60 - 5 * 60
+# Максимум сообщений в одном вызове deleteMessages
+DELETE_CHUNK_SIZE = 100
+
 class ChatCleaner:
-    def __init__(self):
-        # Храним ID всех сообщений бота для каждого пользователя
-        self.bot_messages: Dict[int, List[int]] = {}
-        # Запоминаем ID сообщения с основной клавиатурой
-        self.keyboard_messages: Dict[int, int] = {}
-        
+    def __init__(self, max_chats: int = CHAT_CLEANER_MAX_CHATS,
+                 max_messages: int = CHAT_CLEANER_MAX_MESSAGES,
+                 persist: bool = CHAT_CLEANER_PERSIST):
+        # История по чатам: {'messages': [[message_id, sent_at], ...], 'keyboard': message_id}
+        self.history = LRUCache(max_chats)
+        self.max_messages = max_messages
+        self.persist = persist
+        self._dirty: Set[int] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+
     async def clear_and_send(self, message: Message, text: str, **kwargs) -> Message:
-        """Очищает чат и отправляет новое сообщение"""
-        user_id = message.from_user.id
-        
-        # Удаляем сообщение пользователя
-        try:
-            await message.delete()
-        except:
-            pass
-        
-        # Удаляем все предыдущие сообщения бота (КРОМЕ сообщения с основной клавиатурой)
-        if user_id in self.bot_messages:
-            keyboard_msg_id = self.keyboard_messages.get(user_id)
-            
-            for msg_id in self.bot_messages[user_id]:
-                # НЕ удаляем сообщение с основной клавиатурой
-                if msg_id != keyboard_msg_id:
-                    try:
-                        await message.bot.delete_message(user_id, msg_id)
-                    except:
-                        pass
-            
-            # Очищаем список (оставляем только сообщение с клавиатурой)
-            if keyboard_msg_id:
-                self.bot_messages[user_id] = [keyboard_msg_id]
-            else:
-                self.bot_messages[user_id] = []
-        
-        # Отправляем новое сообщение
+        """Отправляет новое сообщение и в фоне очищает чат от предыдущих"""
+        chat_id = message.chat.id
+        history = await self._get_history(chat_id)
+        keyboard_msg_id = history['keyboard']
+
+        # Сообщение пользователя и все предыдущие сообщения бота
+        # (КРОМЕ сообщения с основной клавиатурой), которые еще можно удалить
+        now = time.time()
+        to_delete = [message.message_id] + [
+            msg_id for msg_id, sent_at in history['messages']
+            if msg_id != keyboard_msg_id and now - sent_at < DELETE_WINDOW
+        ]
+
+        # Сначала отвечаем пользователю, удаление не задерживает ответ
         bot_message = await message.answer(text, **kwargs)
-        
-        # Сохраняем ID нового сообщения
-        if user_id not in self.bot_messages:
-            self.bot_messages[user_id] = []
-        self.bot_messages[user_id].append(bot_message.message_id)
-        
+
+        # В истории остается только сообщение с клавиатурой и новое сообщение
+        messages = [item for item in history['messages'] if item[0] == keyboard_msg_id]
+        messages.append([bot_message.message_id, now])
+        history['messages'] = messages[-self.max_messages:]
+
         # Если это сообщение с ReplyKeyboardMarkup, запоминаем его как основное
         if 'reply_markup' in kwargs and hasattr(kwargs['reply_markup'], 'keyboard'):
-            self.keyboard_messages[user_id] = bot_message.message_id
-        
+            history['keyboard'] = bot_message.message_id
+        self._mark_dirty(chat_id)
+
+        self._spawn(self.delete_messages(message.bot, chat_id, to_delete))
+
         return bot_message
-    
+
+    async def track(self, message: Message) -> None:
+        """Добавление отправленного ботом сообщения в историю чата
+        (например, фото после clear_and_send), чтобы оно тоже было очищено"""
+        chat_id = message.chat.id
+        history = await self._get_history(chat_id)
+        history['messages'].append([message.message_id, time.time()])
+        history['messages'] = history['messages'][-self.max_messages:]
+        self._mark_dirty(chat_id)
+
+    async def delete_messages(self, bot: Bot, chat_id: int, message_ids: List[int]) -> None:
+        """Пакетное удаление сообщений через deleteMessages"""
+        for i in range(0, len(message_ids), DELETE_CHUNK_SIZE):
+            chunk = message_ids[i:i + DELETE_CHUNK_SIZE]
+            try:
+                await bot.delete_messages(chat_id, chunk)
+            except Exception as e:
+                logger.debug(f"Не удалось удалить сообщения {chunk} в чате {chat_id}: {e}")
+
     async def edit_last_message(self, callback_query, text: str, **kwargs) -> None:
         """Редактирует последнее сообщение (для callback-ов)"""
         await callback_query.message.edit_text(text, **kwargs)
 
+    async def close(self) -> None:
+        """Завершение фоновых задач и сохранение истории"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self._dirty:
+            await self._flush()
+
+    async def _get_history(self, chat_id: int) -> Dict[str, Any]:
+        """История чата из кэша или из базы"""
+        history = self.history.get(chat_id)
+        if history is None:
+            if self.persist:
+                history = await ChatHistoryManager.get_history(chat_id)
+            if history is None:
+                history = {'messages': [], 'keyboard': None}
+            self.history.set(chat_id, history)
+        return history
+
+    def _mark_dirty(self, chat_id: int) -> None:
+        """Планирование сохранения истории чата"""
+        if not self.persist:
+            return
+        self._dirty.add(chat_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self._spawn(self._flush())
+
+    async def _flush(self) -> None:
+        """Сохранение измененных историй одной командой.
+
+        Чаты, измененные во время сохранения, сохраняются следующей командой
+        той же задачи; при ошибке сохранение повторяется через секунду.
+        """
+        while self._dirty:
+            chat_ids, self._dirty = self._dirty, set()
+            histories = {chat_id: self.history.get(chat_id) for chat_id in chat_ids}
+            histories = {chat_id: h for chat_id, h in histories.items() if h is not None}
+            if histories and not await ChatHistoryManager.save_histories(histories):
+                self._dirty.update(histories)
+                await asyncio.sleep(1)
+                if self._dirty:
+                    self._flush_task = self._spawn(self._flush())
+                return
+
+    def _spawn(self, coro) -> asyncio.Task:
+        """Запуск фоновой задачи с удержанием ссылки на нее"""
+        task = asyncio.get_running_loop().create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
 # Глобальный экземпляр
-chat_cleaner = ChatCleaner()
\ No newline at end of file
+chat_cleaner = ChatCleaner()
@@ -1,17 +1,33 @@
+import asyncio
+import hashlib
 import os
 import uuid
 import aiofiles
 import aiofiles.os
 from datetime import datetime
-from PIL import Image
-import io
 from typing import Optional, Dict, Any
 import logging
 from config import UPLOAD_PATH, MAX_FILE_SIZE
 
 logger = logging.getLogger(__name__)
 
+# Каталог хранилища блобов внутри UPLOAD_PATH
+BLOBS_DIR = "blobs"
+# Каталог файлов, которые еще загружаются (тот же диск, что и блобы)
+INCOMING_DIR = "incoming"
+# Размер блока при чтении файла для хэша
+HASH_CHUNK_SIZE = 1024 * 1024
+
 class FileStorage:
+    """Файлы задач в контентно-адресуемом хранилище.
+
+    Содержимое хранится один раз под своим SHA-256 в каталоге
+    blobs/ab/cd/<hash>; строки task_files ссылаются на блоб по blob_hash,
+    file_blobs описывает сам блоб. Повторная загрузка того же файла
+    не пишет его на диск.
+    Превью при сохранении не строятся: их по запросу создает thumbnail_cache.
+    """
+
     def __init__(self):
         self.upload_path = UPLOAD_PATH
         self.max_file_size = MAX_FILE_SIZE
@@ -19,85 +35,114 @@ class FileStorage:
         # Создаем необходимые папки
         os.makedirs(self.upload_path, exist_ok=True)
         os.makedirs(f"{self.upload_path}/tasks", exist_ok=True)
+        os.makedirs(f"{self.upload_path}/{BLOBS_DIR}", exist_ok=True)
+        os.makedirs(f"{self.upload_path}/{INCOMING_DIR}", exist_ok=True)
+    
+    @staticmethod
+    def blob_path(blob_hash: str) -> str:
+        """Относительный путь блоба: blobs/ab/cd/<hash>"""
+        return f"{BLOBS_DIR}/{blob_hash[:2]}/{blob_hash[2:4]}/{blob_hash}"
+    
+    def incoming_path(self) -> str:
+        """Полный путь для файла, который будет загружен потоком на диск"""
+        return self.get_file_path(f"{INCOMING_DIR}/{uuid.uuid4().hex}.part")
+    
+    @staticmethod
+    def hash_file(path: str) -> str:
+        """SHA-256 файла с диска блоками по HASH_CHUNK_SIZE"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
     
-    async def save_file(self, file_data: bytes, file_name: str, 
-                       content_type: str, task_id: str = None) -> Optional[Dict[str, Any]]:
-        """Сохранение файла на диск"""
+    async def store_file(self, source_path: str, file_name: str, content_type: str,
+                         blob_hash: str = None) -> Optional[Dict[str, Any]]:
+        """Перенос загруженного на диск файла в хранилище блобов.
+        
+        Содержимое не читается в память: хэш считается блоками в потоке,
+        файл переименовывается в блоб (или удаляется, если такой блоб уже
+        есть). blob_hash - уже посчитанный SHA-256 (после нормализации изображения).
+        """
         try:
-            # Проверяем размер файла
-            if not self.validate_file_size(len(file_data)):
+            size = await aiofiles.os.path.getsize(source_path)
+            if not self.validate_file_size(size):
                 logger.error(f"Файл {file_name} превышает максимальный размер")
                 return None
             
-            # Генерируем уникальное имя файла
-            file_id = str(uuid.uuid4())
-            file_extension = os.path.splitext(file_name)[1].lower()
+            blob_hash = blob_hash or await asyncio.to_thread(self.hash_file, source_path)
+            relative_path = self.blob_path(blob_hash)
+            file_path = self.get_file_path(relative_path)
             
-            # Создаем путь к файлу
-            if task_id:
-                task_dir = f"{self.upload_path}/tasks/{task_id}"
-                await aiofiles.os.makedirs(task_dir, exist_ok=True)
-                file_path = f"{task_dir}/{file_id}{file_extension}"
-                relative_path = f"tasks/{task_id}/{file_id}{file_extension}"
+            if await aiofiles.os.path.exists(file_path):
+                logger.info(f"Файл {file_name} уже в хранилище: {blob_hash}")
+                # Свежее время изменения: сборщик мусора не тронет блоб до записи ссылки
+                await asyncio.to_thread(os.utime, file_path)
             else:
-                temp_dir = f"{self.upload_path}/temp"
-                await aiofiles.os.makedirs(temp_dir, exist_ok=True)
-                file_path = f"{temp_dir}/{file_id}{file_extension}"
-                relative_path = f"temp/{file_id}{file_extension}"
-            
-            # Сохраняем файл
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(file_data)
-            
-            # Создаем превью для изображений
-            thumbnail_path = None
-            if self.is_image(content_type):
-                thumbnail_path = await self.create_thumbnail(file_data, file_path)
+                await aiofiles.os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                await aiofiles.os.replace(source_path, file_path)
             
             return {
-                'file_id': file_id,
+                'file_id': blob_hash,
+                'blob_hash': blob_hash,
                 'file_path': relative_path,
-                'thumbnail_path': thumbnail_path,
+                # Превью строятся по запросу (utils/thumbnails.py)
+                'thumbnail_path': None,
                 'original_name': file_name,
                 'content_type': content_type,
-                'size': len(file_data),
+                'size': size,
                 'full_path': file_path
             }
             
         except Exception as e:
             logger.error(f"Ошибка сохранения файла {file_name}: {e}")
             return None
+        finally:
+            if await aiofiles.os.path.exists(source_path):
+                await aiofiles.os.remove(source_path)
     
-    async def create_thumbnail(self, file_data: bytes, original_path: str) -> Optional[str]:
-        """Создание превью для изображения"""
+    async def move_to_task(self, file_info: Dict[str, Any], task_id: str) -> Optional[Dict[str, Any]]:
+        """Перенос файла (и превью) из temp/ в папку задачи.
+        
+        Нужен только для файлов, загруженных до хранилища блобов
+        (метаданные в сохраненном состоянии FSM); блобы не переносятся,
+        а только проверяются: None, если блоба уже нет на диске.
+        """
+        if file_info.get('blob_hash'):
+            try:
+                # Свежее время изменения: сборщик мусора не тронет блоб до записи ссылки
+                await asyncio.to_thread(os.utime, self.get_file_path(file_info['file_path']))
+            except FileNotFoundError:
+                logger.error(f"Блоб {file_info['blob_hash']} не найден: {file_info['original_name']}")
+                return None
+            return file_info
+        
         try:
-            # Открываем изображение
-            image = Image.open(io.BytesIO(file_data))
-            
-            # Создаем превью (максимум 300x300)
-            image.thumbnail((300, 300), Image.Resampling.LANCZOS)
-            
-            # Генерируем путь для превью
-            path_parts = original_path.rsplit('.', 1)
-            if len(path_parts) == 2:
-                thumbnail_path = f"{path_parts[0]}_thumb.{path_parts[1]}"
-            else:
-                thumbnail_path = f"{original_path}_thumb.jpg"
+            task_dir = f"{self.upload_path}/tasks/{task_id}"
+            await aiofiles.os.makedirs(task_dir, exist_ok=True)
             
-            # Сохраняем превью
-            if image.format in ['JPEG', 'PNG', 'GIF', 'WEBP']:
-                save_format = image.format
-            else:
-                save_format = 'JPEG'
+            file_name = os.path.basename(file_info['file_path'])
+            file_path = f"{task_dir}/{file_name}"
+            await aiofiles.os.rename(self.get_file_path(file_info['file_path']), file_path)
             
-            image.save(thumbnail_path, format=save_format, quality=85)
+            thumbnail_path = None
+            if file_info.get('thumbnail_path'):
+                thumbnail_name = os.path.basename(file_info['thumbnail_path'])
+                await aiofiles.os.rename(
+                    self.get_file_path(file_info['thumbnail_path']),
+                    f"{task_dir}/{thumbnail_name}"
+                )
+                thumbnail_path = f"tasks/{task_id}/{thumbnail_name}"
             
-            # Возвращаем относительный путь
-            relative_thumbnail = thumbnail_path.replace(f"{self.upload_path}/", "")
-            return relative_thumbnail
+            return {
+                **file_info,
+                'file_path': f"tasks/{task_id}/{file_name}",
+                'thumbnail_path': thumbnail_path,
+                'full_path': file_path
+            }
             
         except Exception as e:
-            logger.error(f"Ошибка создания превью: {e}")
+            logger.error(f"Ошибка переноса файла {file_info.get('file_path')}: {e}")
             return None
     
     def get_file_path(self, relative_path: str) -> str:
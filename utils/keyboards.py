@@ -1,194 +1,153 @@
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from typing import Dict, List, Tuple
+from pydantic import ConfigDict
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup
 
-def get_main_keyboard(role: str):
-    """Главная клавиатура в зависимости от роли пользователя"""
-    
-    if role == 'director':
-        buttons = [
-            [KeyboardButton(text="📋 Создать задачу"), KeyboardButton(text="🏢 Управление компаниями")],
-            [KeyboardButton(text="👥 Управление сотрудниками"), KeyboardButton(text="📊 Аналитика")],
-            [KeyboardButton(text="📝 Мои задачи"), KeyboardButton(text="💬 Комментарии")]
-        ]
+class FrozenReplyKeyboardMarkup(ReplyKeyboardMarkup):
+    """Клавиатура-константа: создается один раз при импорте и
+    переиспользуется во всех ответах, поэтому изменять ее запрещено"""
+    model_config = ConfigDict(frozen=True)
+
+class FrozenInlineKeyboardMarkup(InlineKeyboardMarkup):
+    """Неизменяемая inline-клавиатура для кэшей готовых клавиатур"""
+    model_config = ConfigDict(frozen=True)
+
+def build_keyboard(rows: List[List[str]], one_time_keyboard: bool = False) -> FrozenReplyKeyboardMarkup:
+    """Неизменяемая клавиатура из строк с подписями кнопок"""
+    return FrozenReplyKeyboardMarkup(
+        keyboard=[[KeyboardButton(text=text) for text in row] for row in rows],
+        resize_keyboard=True,
+        one_time_keyboard=one_time_keyboard
+    )
+
+# Главные клавиатуры по ролям
+MAIN_KEYBOARDS: Dict[str, FrozenReplyKeyboardMarkup] = {
+    'director': build_keyboard([
+        ["📋 Создать задачу", "🏢 Управление компаниями"],
+        ["👥 Управление сотрудниками", "📊 Аналитика"],
+        ["📝 Мои задачи", "💬 Комментарии"]
+    ]),
+    'manager': build_keyboard([
+        ["📋 Создать задачу", "🏢 Управление компаниями"],
+        ["📝 Мои задачи", "💬 Комментарии"]
+    ]),
+    'main_admin': build_keyboard([
+        ["📝 Мои задачи", "💬 Комментарии"],
+        ["⚙️ Админ панель"]
+    ]),
+    'admin': build_keyboard([
+        ["📝 Мои задачи", "💬 Комментарии"]
+    ])
+}
+
+COMPANY_MANAGEMENT_KEYBOARD = build_keyboard([
+    ["➕ Добавить компанию", "📋 Список компаний"],
+    ["🔙 Назад"]
+])
+
+STAFF_MANAGEMENT_KEYBOARD = build_keyboard([
+    ["👤 Изменить роль сотрудника", "📋 Список сотрудников"],
+    ["🔙 Назад"]
+])
+
+TASK_URGENT_KEYBOARD = build_keyboard([
+    ["🔥 Срочная", "📝 Обычная"],
+    ["🔙 Назад"]
+], one_time_keyboard=True)
+
+TASK_DEADLINE_KEYBOARD = build_keyboard([
+    ["📅 Сегодня", "📅 Завтра"],
+    ["📅 Через 3 дня", "📅 Выбрать дату"],
+    ["🔙 Назад"]
+], one_time_keyboard=True)
+
+ANALYTICS_KEYBOARD = build_keyboard([
+    ["📊 За день", "📊 За неделю"],
+    ["📊 За месяц", "📈 Графики"],
+    ["⏱️ Время выполнения", "👥 По исполнителям"],
+    ["🏢 По компаниям", "🔙 Назад"]
+])
+
+ROLE_SELECTION_KEYBOARD = build_keyboard([
+    ["👔 Менеджер", "⚙️ Главный админ"],
+    ["🔧 Системный админ", "🔙 Назад"]
+])
+
+BACK_KEYBOARD = build_keyboard([
+    ["🔙 Назад"]
+])
+
+SKIP_KEYBOARD = build_keyboard([
+    ["⏭️ Пропустить"],
+    ["🔙 Назад"]
+])
+
+def build_task_status_keyboard(current_status: str, can_manage: bool) -> FrozenReplyKeyboardMarkup:
+    """Клавиатура статусов; can_manage - директор или менеджер"""
+    rows = []
     
-    elif role == 'manager':
-        buttons = [
-            [KeyboardButton(text="📋 Создать задачу"), KeyboardButton(text="🏢 Управление компаниями")],
-            [KeyboardButton(text="📝 Мои задачи"), KeyboardButton(text="💬 Комментарии")]
-        ]
+    # Исполнитель может менять статус
+    if current_status == 'new':
+        rows.append(["⏳ Взять в работу"])
+    elif current_status == 'in_progress':
+        rows.append(["✅ Завершить"])
+        rows.append(["🆕 Вернуть в новые"])
     
-    elif role == 'main_admin':
-        buttons = [
-            [KeyboardButton(text="📝 Мои задачи"), KeyboardButton(text="💬 Комментарии")],
-            [KeyboardButton(text="⚙️ Админ панель")]
-        ]
+    # Директор и менеджер могут менять с "Выполнено" обратно в работу
+    if can_manage and current_status == 'completed':
+        rows.append(["⏳ Вернуть в работу"])
     
-    else:  # admin
-        buttons = [
-            [KeyboardButton(text="📝 Мои задачи"), KeyboardButton(text="💬 Комментарии")]
-        ]
+    # Директор и менеджер могут отменять задачи
+    if can_manage and current_status != 'cancelled':
+        rows.append(["❌ Отменить задачу"])
     
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
-    )
+    rows.append(["🔙 Назад"])
+    return build_keyboard(rows)
+
+# Клавиатуры статусов: (статус, директор/менеджер) -> клавиатура
+TASK_STATUS_KEYBOARDS: Dict[Tuple[str, bool], FrozenReplyKeyboardMarkup] = {
+    (status, can_manage): build_task_status_keyboard(status, can_manage)
+    for status in ('new', 'in_progress', 'completed', 'overdue', 'cancelled')
+    for can_manage in (False, True)
+}
+
+def get_main_keyboard(role: str):
+    """Главная клавиатура в зависимости от роли пользователя"""
+    return MAIN_KEYBOARDS.get(role, MAIN_KEYBOARDS['admin'])
 
 def get_company_management_keyboard():
     """Клавиатура для управления компаниями"""
-    buttons = [
-        [KeyboardButton(text="➕ Добавить компанию"), KeyboardButton(text="📋 Список компаний")],
-        [KeyboardButton(text="🔙 Назад")]
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
-    )
+    return COMPANY_MANAGEMENT_KEYBOARD
 
 def get_staff_management_keyboard():
     """Клавиатура для управления сотрудниками (только для директора)"""
-    buttons = [
-        [KeyboardButton(text="👤 Изменить роль сотрудника"), KeyboardButton(text="📋 Список сотрудников")],
-        [KeyboardButton(text="🔙 Назад")]
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
-    )
+    return STAFF_MANAGEMENT_KEYBOARD
 
 def get_task_urgent_keyboard():
     """Клавиатура для выбора срочности задачи"""
-    buttons = [
-        [KeyboardButton(text="🔥 Срочная"), KeyboardButton(text="📝 Обычная")],
-        [KeyboardButton(text="🔙 Назад")]
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    return TASK_URGENT_KEYBOARD
 
 def get_task_deadline_keyboard():
     """Клавиатура для выбора дедлайна задачи"""
-    buttons = [
-        [KeyboardButton(text="📅 Сегодня"), KeyboardButton(text="📅 Завтра")],
-        [KeyboardButton(text="📅 Через 3 дня"), KeyboardButton(text="📅 Выбрать дату")],
-        [KeyboardButton(text="🔙 Назад")]
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=True
-    )
+    return TASK_DEADLINE_KEYBOARD
 
 def get_task_status_keyboard(current_status: str, user_role: str):
     """Клавиатура для изменения статуса задачи"""
-    buttons = []
-    
-    # Исполнитель может менять статус
-    if current_status == 'new':
-        buttons.append([KeyboardButton(text="⏳ Взять в работу")])
-    elif current_status == 'in_progress':
-        buttons.append([KeyboardButton(text="✅ Завершить")])
-        buttons.append([KeyboardButton(text="🆕 Вернуть в новые")])
-    
-    # Директор и менеджер могут менять с "Выполнено" обратно в работу
-    if user_role in ['director', 'manager'] and current_status == 'completed':
-        buttons.append([KeyboardButton(text="⏳ Вернуть в работу")])
-    
-    # Директор и менеджер могут отменять задачи
-    if user_role in ['director', 'manager'] and current_status != 'cancelled':
-        buttons.append([KeyboardButton(text="❌ Отменить задачу")])
-    
-    buttons.append([KeyboardButton(text="🔙 Назад")])
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
-    )
+    can_manage = user_role in ['director', 'manager']
+    keyboard = TASK_STATUS_KEYBOARDS.get((current_status, can_manage))
+    return keyboard or build_task_status_keyboard(current_status, can_manage)
 
 def get_analytics_keyboard():
     """Клавиатура для аналитики (только для директора)"""
-    buttons = [
-        [KeyboardButton(text="📊 За день"), KeyboardButton(text="📊 За неделю")],
-        [KeyboardButton(text="📊 За месяц"), KeyboardButton(text="📈 Графики")],
-        [KeyboardButton(text="⏱️ Время выполнения"), KeyboardButton(text="👥 По исполнителям")],
-        [KeyboardButton(text="🏢 По компаниям"), KeyboardButton(text="🔙 Назад")]
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
-    )
+    return ANALYTICS_KEYBOARD
 
 def get_role_selection_keyboard():
     """Клавиатура для выбора роли (только для директора)"""
-    buttons = [
-        [KeyboardButton(text="👔 Менеджер"), KeyboardButton(text="⚙️ Главный админ")],
-        [KeyboardButton(text="🔧 Системный админ"), KeyboardButton(text="🔙 Назад")]
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
-    )
+    return ROLE_SELECTION_KEYBOARD
 
 def get_back_keyboard():
     """Простая клавиатура с кнопкой назад"""
-    buttons = [
-        [KeyboardButton(text="🔙 Назад")]
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
-    )
+    return BACK_KEYBOARD
 
 def get_skip_keyboard():
     """Клавиатура с кнопками 'Пропустить' и 'Назад'"""
-    buttons = [
-        [KeyboardButton(text="⏭️ Пропустить")],
-        [KeyboardButton(text="🔙 Назад")]
-    ]
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
-    )
-
-def get_task_status_keyboard(current_status: str, user_role: str):
-    """Клавиатура для изменения статуса задачи"""
-    buttons = []
-    
-    # Исполнитель может менять статус
-    if current_status == 'new':
-        buttons.append([KeyboardButton(text="⏳ Взять в работу")])
-    elif current_status == 'in_progress':
-        buttons.append([KeyboardButton(text="✅ Завершить")])
-        buttons.append([KeyboardButton(text="🆕 Вернуть в новые")])
-    
-    # Директор и менеджер могут менять с "Выполнено" обратно в работу
-    if user_role in ['director', 'manager'] and current_status == 'completed':
-        buttons.append([KeyboardButton(text="⏳ Вернуть в работу")])
-    
-    # Директор и менеджер могут отменять задачи
-    if user_role in ['director', 'manager'] and current_status != 'cancelled':
-        buttons.append([KeyboardButton(text="❌ Отменить задачу")])
-    
-    buttons.append([KeyboardButton(text="🔙 Назад")])
-    
-    return ReplyKeyboardMarkup(
-        keyboard=buttons,
-        resize_keyboard=True,
-        one_time_keyboard=False
-    )
\ No newline at end of file
+    return SKIP_KEYBOARD
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+from config import LOOP_WATCHDOG_INTERVAL, LOOP_BLOCK_THRESHOLD
+from .metrics import EVENT_LOOP_BLOCKS, observe_loop_lag
+
+logger = logging.getLogger(__name__)
+
+# Корень проекта: по нему ищем в стеке ближайший кадр нашего кода
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class LoopWatchdog:
+    """Сторож цикла событий.
+
+    Корутина-пульс раз в interval отмечается и измеряет задержку цикла.
+    Фоновый поток следит за пульсом: если цикл не отвечает дольше
+    threshold, поток снимает стек потока цикла через sys._current_frames()
+    и пишет его в лог, а место блокировки попадает в метрику.
+    """
+
+    def __init__(self, interval: float = LOOP_WATCHDOG_INTERVAL,
+                 threshold: float = LOOP_BLOCK_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Запуск пульса и потока-сэмплера (вызывать из цикла событий)"""
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._sampler = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._sampler.start()
+        logger.info(f"Сторож цикла событий запущен (порог {self.threshold * 1000:.0f} мс)")
+
+    def stop(self) -> None:
+        """Остановка сторожа"""
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            observe_loop_lag(max(0.0, loop.time() - start - self.interval))
+            self._beat = time.monotonic()
+
+    def _watch(self) -> None:
+        reported_beat = None
+        check_interval = min(self.interval, self.threshold) / 2
+
+        while not self._stop.wait(check_interval):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            if stalled < self.threshold or beat == reported_beat:
+                continue
+
+            # Один отчет на каждую остановку цикла
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            stack = traceback.extract_stack(frame)
+            location = self._blocking_location(stack)
+            EVENT_LOOP_BLOCKS.labels(location).inc()
+            logger.warning(
+                f"Цикл событий заблокирован более {stalled * 1000:.0f} мс в {location}\n"
+                + "".join(traceback.format_list(stack))
+            )
+
+    @staticmethod
+    def _blocking_location(stack: traceback.StackSummary) -> str:
+        """Ближайший к вершине стека кадр кода проекта"""
+        for entry in reversed(stack):
+            if entry.filename.startswith(PROJECT_ROOT) and os.sep + 'site-packages' + os.sep not in entry.filename:
+                return f"{os.path.relpath(entry.filename, PROJECT_ROOT)}:{entry.name}"
+        if stack:
+            entry = stack[-1]
+            return f"{os.path.basename(entry.filename)}:{entry.name}"
+        return "unknown"
+
+# Глобальный экземпляр
+loop_watchdog = LoopWatchdog()
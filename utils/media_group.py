@@ -0,0 +1,67 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.types import Message, TelegramObject
+from config import MEDIA_GROUP_DELAY
+
+logger = logging.getLogger(__name__)
+
+def accepts_album(data: Dict[str, Any]) -> bool:
+    """Обработчик события принимает параметр album.
+
+    Для маршрутов menu_router проверяется найденный маршрут (data['route']),
+    а не общий обработчик диспетчера.
+    """
+    handler = data.get('route') or data.get('handler')
+    return isinstance(handler, CallableObject) and 'album' in handler.params
+
+class MediaGroupMiddleware(BaseMiddleware):
+    """Middleware для dp.message: сборка альбомов.
+
+    Telegram присылает альбом отдельными сообщениями с общим
+    media_group_id. Если обработчик сообщения принимает album,
+    первое сообщение группы ждет, пока в течение delay не перестанут
+    приходить новые (каждое новое продлевает ожидание), и передает
+    обработчику весь альбом в data['album']; остальные сообщения группы
+    обработчик не получает. Прочие обработчики получают сообщения
+    альбома по одному, как обычно.
+    """
+
+    def __init__(self, delay: float = MEDIA_GROUP_DELAY):
+        self.delay = delay
+        self._groups: Dict[Tuple[int, str], List[Message]] = {}
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        if not isinstance(event, Message) or not event.media_group_id or not accepts_album(data):
+            return await handler(event, data)
+
+        key = (event.chat.id, event.media_group_id)
+        group = self._groups.get(key)
+        if group is not None:
+            group.append(event)
+            return None
+
+        group = self._groups[key] = [event]
+        try:
+            received = 0
+            while received != len(group):
+                received = len(group)
+                await asyncio.sleep(self.delay)
+        finally:
+            del self._groups[key]
+
+        album = sorted(group, key=lambda message: message.message_id)
+        logger.info(f"Альбом {event.media_group_id} в чате {event.chat.id}: {len(album)} сообщений")
+        data['album'] = album
+        return await handler(album[0], data)
+
+def setup_media_groups(dp) -> None:
+    """Подключение сборки альбомов.
+
+    Middleware внутренний: к его вызову обработчик уже выбран фильтрами,
+    и буферизуются только альбомы для обработчиков с параметром album.
+    """
+    dp.message.middleware(MediaGroupMiddleware())
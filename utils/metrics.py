@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+from aiohttp import web
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import TelegramObject, Update
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from database.connection import db_connection
+
+logger = logging.getLogger(__name__)
+
+HANDLER_LATENCY = Histogram(
+    'taskbot_handler_duration_seconds',
+    'Время выполнения обработчиков',
+    ['handler']
+)
+HANDLER_ERRORS = Counter(
+    'taskbot_handler_errors_total',
+    'Необработанные исключения в обработчиках',
+    ['handler']
+)
+UPDATES_TOTAL = Counter(
+    'taskbot_updates_total',
+    'Количество входящих обновлений',
+    ['event_type']
+)
+TELEGRAM_API_LATENCY = Histogram(
+    'taskbot_telegram_api_duration_seconds',
+    'Время выполнения запросов к Telegram Bot API',
+    ['method']
+)
+TELEGRAM_API_ERRORS = Counter(
+    'taskbot_telegram_api_errors_total',
+    'Ошибки запросов к Telegram Bot API',
+    ['method', 'error']
+)
+DB_POOL_SIZE = Gauge('taskbot_db_pool_size', 'Количество соединений в пуле PostgreSQL')
+DB_POOL_IN_USE = Gauge('taskbot_db_pool_in_use', 'Занятые соединения пула PostgreSQL')
+DB_POOL_WAITERS = Gauge('taskbot_db_pool_waiters', 'Ожидающие соединения из пула PostgreSQL')
+FSM_STORAGE_SIZE = Gauge('taskbot_fsm_storage_keys', 'Ключи FSM-хранилища в локальном кэше')
+EVENT_LOOP_LAG = Gauge('taskbot_event_loop_lag_seconds', 'Последняя измеренная задержка цикла событий')
+EVENT_LOOP_BLOCKS = Counter(
+    'taskbot_event_loop_blocks_total',
+    'Блокировки цикла событий дольше порога по месту в коде',
+    ['location']
+)
+EVENT_LOOP_LAG_HISTOGRAM = Histogram(
+    'taskbot_event_loop_lag_histogram_seconds',
+    'Распределение задержки цикла событий',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+
+# Последнее измерение задержки цикла событий (для /healthz)
+last_loop_lag = 0.0
+
+DB_POOL_SIZE.set_function(lambda: db_connection.pool.get_size() if db_connection.pool else 0)
+DB_POOL_IN_USE.set_function(
+    lambda: db_connection.pool.get_size() - db_connection.pool.get_idle_size() if db_connection.pool else 0
+)
+DB_POOL_WAITERS.set_function(lambda: db_connection.waiters)
+
+def handler_name(data: Dict[str, Any]) -> str:
+    """Имя конечного обработчика (с учетом таблиц маршрутов)"""
+    handler = data.get('route') or data.get('handler')
+    callback = getattr(handler, 'callback', None)
+    return getattr(callback, '__name__', 'unknown')
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer-middleware для dp.update: поток входящих обновлений"""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        if isinstance(event, Update):
+            UPDATES_TOTAL.labels(event.event_type).inc()
+        return await handler(event, data)
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: время выполнения обработчика по имени"""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        name = handler_name(data)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время и ошибки запросов к Bot API"""
+
+    async def __call__(self, make_request, bot: Bot, method):
+        name = type(method).__name__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            TELEGRAM_API_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            TELEGRAM_API_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+def setup_bot_metrics(bot: Bot) -> None:
+    """Подключение метрик запросов к Telegram API"""
+    bot.session.middleware(TelegramMetricsMiddleware())
+
+def setup_dispatcher_metrics(dp) -> None:
+    """Подключение метрик обновлений и обработчиков"""
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    dp.inline_query.middleware(HandlerMetricsMiddleware())
+
+def setup_fsm_metrics(storage) -> None:
+    """Размер FSM-хранилища"""
+    FSM_STORAGE_SIZE.set_function(lambda: storage.cache_len)
+
+def observe_loop_lag(lag: float) -> None:
+    """Запись измеренной задержки цикла событий"""
+    global last_loop_lag
+    last_loop_lag = lag
+    EVENT_LOOP_LAG.set(lag)
+    EVENT_LOOP_LAG_HISTOGRAM.observe(lag)
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """GET /metrics в формате Prometheus"""
+    return web.Response(body=generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
+async def healthz_handler(request: web.Request) -> web.Response:
+    """GET /healthz: проверка доступности базы данных"""
+    db_ok = False
+    try:
+        if db_connection.pool:
+            await asyncio.wait_for(db_connection.execute_one('SELECT 1'), timeout=2)
+            db_ok = True
+    except Exception as e:
+        logger.error(f"Ошибка проверки здоровья: {e}")
+
+    return web.json_response(
+        {
+            'status': 'ok' if db_ok else 'error',
+            'db': db_ok,
+            'event_loop_lag': round(last_loop_lag, 4)
+        },
+        status=200 if db_ok else 503
+    )
+
+def setup_metrics_routes(app: web.Application) -> None:
+    """Добавление /metrics и /healthz в веб-приложение"""
+    app.router.add_get('/metrics', metrics_handler)
+    app.router.add_get('/healthz', healthz_handler)
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Отдельный веб-сервер метрик (для процессов без webhook)"""
+    app = web.Application()
+    setup_metrics_routes(app)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+
+    logger.info(f"Сервер метрик запущен на {host}:{port}")
+    return runner
@@ -0,0 +1,36 @@
+import hashlib
+import json
+import logging
+from typing import Optional
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import InlineKeyboardMarkup, Message
+
+logger = logging.getLogger(__name__)
+
+def content_hash(text: Optional[str], reply_markup: Optional[InlineKeyboardMarkup] = None) -> str:
+    """Хэш содержимого сообщения: текст (Telegram обрезает пробелы по краям) и клавиатура"""
+    markup = reply_markup.model_dump(mode='json', exclude_none=True) if reply_markup else None
+    payload = json.dumps([(text or "").strip(), markup], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+async def edit_message(message: Message, text: str,
+                       reply_markup: Optional[InlineKeyboardMarkup] = None) -> bool:
+    """Редактирование сообщения, если содержимое изменилось.
+
+    Текущее содержимое берется из самого сообщения (оно приходит вместе
+    с callback), поэтому повторное открытие той же карточки или обновление
+    неизменного списка не делает запрос к API. Возвращает True, если
+    сообщение было изменено.
+    """
+    current = content_hash(getattr(message, 'text', None), getattr(message, 'reply_markup', None))
+    if current == content_hash(text, reply_markup):
+        return False
+
+    try:
+        await message.edit_text(text, reply_markup=reply_markup)
+        return True
+    except TelegramBadRequest as e:
+        if "message is not modified" in str(e):
+            logger.debug(f"Сообщение {message.message_id} не изменилось")
+            return False
+        raise
@@ -0,0 +1,104 @@
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple, Type, Union
+from aiogram import Dispatcher
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.state import State
+from aiogram.types import Message, CallbackQuery
+
+logger = logging.getLogger(__name__)
+
+# Разделитель полей CallbackData (значение aiogram по умолчанию)
+CALLBACK_SEPARATOR = ":"
+
+class MenuRouter:
+    """Таблица маршрутов для кнопок reply-клавиатуры и состояний FSM.
+
+    В диспетчере регистрируется один обработчик, а нужная функция
+    находится поиском в словарях по тексту кнопки и по состоянию,
+    поэтому стоимость маршрутизации не растет вместе с меню.
+    Из двух совпадений побеждает маршрут, зарегистрированный раньше,
+    как и при последовательной проверке фильтров aiogram.
+    """
+
+    def __init__(self):
+        self._text_routes: Dict[str, Tuple[int, CallableObject]] = {}
+        self._state_routes: Dict[str, Tuple[int, CallableObject]] = {}
+        self._order = 0
+
+    def text(self, text: str, handler: Callable) -> None:
+        """Маршрут для точного текста кнопки"""
+        self._text_routes.setdefault(text, self._route(handler))
+
+    def state(self, state: Union[State, str], handler: Callable) -> None:
+        """Маршрут для любого сообщения в состоянии FSM"""
+        key = state.state if isinstance(state, State) else state
+        self._state_routes.setdefault(key, self._route(handler))
+
+    def resolve(self, text: Optional[str], raw_state: Optional[str]) -> Optional[CallableObject]:
+        """Поиск обработчика: O(1) по тексту и по состоянию"""
+        text_route = self._text_routes.get(text) if text is not None else None
+        state_route = self._state_routes.get(raw_state) if raw_state is not None else None
+
+        if text_route and state_route:
+            return min(text_route, state_route, key=lambda route: route[0])[1]
+        route = text_route or state_route
+        return route[1] if route else None
+
+    def setup(self, dp: Dispatcher) -> None:
+        """Регистрация единственного обработчика сообщений в диспетчере"""
+        dp.message.register(self._dispatch, self._match)
+
+    def _route(self, handler: Callable) -> Tuple[int, CallableObject]:
+        self._order += 1
+        return self._order, CallableObject(handler)
+
+    async def _match(self, message: Message, raw_state: Optional[str] = None) -> Union[bool, Dict[str, Any]]:
+        route = self.resolve(message.text, raw_state)
+        if route is None:
+            return False
+        return {'route': route}
+
+    async def _dispatch(self, message: Message, route: CallableObject, **data: Any) -> Any:
+        return await route.call(message, **data)
+
+class CallbackRouter:
+    """Таблица маршрутов для inline-кнопок по префиксу CallbackData"""
+
+    def __init__(self):
+        self._routes: Dict[str, Tuple[Type[CallbackData], CallableObject]] = {}
+
+    def register(self, callback_data: Type[CallbackData], handler: Callable) -> None:
+        """Маршрут для всех callback-ов с префиксом класса callback_data"""
+        if callback_data.__separator__ != CALLBACK_SEPARATOR:
+            raise ValueError(f"{callback_data.__name__}: ожидается разделитель {CALLBACK_SEPARATOR!r}")
+        self._routes[callback_data.__prefix__] = (callback_data, CallableObject(handler))
+
+    def setup(self, dp: Dispatcher) -> None:
+        """Регистрация единственного обработчика callback-ов в диспетчере"""
+        dp.callback_query.register(self._dispatch, self._match)
+
+    async def _match(self, callback: CallbackQuery) -> Union[bool, Dict[str, Any]]:
+        if not callback.data:
+            return False
+
+        prefix = callback.data.split(CALLBACK_SEPARATOR, 1)[0]
+        route = self._routes.get(prefix)
+        if route is None:
+            return False
+
+        callback_data_cls, handler = route
+        try:
+            callback_data = callback_data_cls.unpack(callback.data)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Некорректные callback-данные {callback.data!r}: {e}")
+            return False
+
+        return {'callback_data': callback_data, 'route': handler}
+
+    async def _dispatch(self, callback: CallbackQuery, route: CallableObject, **data: Any) -> Any:
+        return await route.call(callback, **data)
+
+# Глобальные экземпляры
+menu_router = MenuRouter()
+callback_router = CallbackRouter()
@@ -17,6 +17,10 @@ class TaskStates(StatesGroup):
     waiting_for_deadline = State()
     waiting_for_custom_date = State()
 
+class TaskFileStates(StatesGroup):
+    """Состояния для добавления файлов к существующей задаче"""
+    waiting_for_files = State()
+
 class RoleStates(StatesGroup):
     """Состояния для изменения ролей"""
     waiting_for_user_selection = State()
@@ -25,4 +29,12 @@ class RoleStates(StatesGroup):
 class CommentStates(StatesGroup):
     """Состояния для добавления комментариев"""
     waiting_for_task_selection = State()
-    waiting_for_comment_text = State()
\ No newline at end of file
+    waiting_for_comment_text = State()
+
+class ImportStates(StatesGroup):
+    """Состояния для импорта задач из файла"""
+    waiting_for_file = State()
+
+class SearchStates(StatesGroup):
+    """Состояния для поиска задач"""
+    waiting_for_query = State()
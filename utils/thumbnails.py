@@ -0,0 +1,164 @@
+import asyncio
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from PIL import Image, ImageOps
+from config import THUMBNAIL_SIZES, THUMBNAIL_CACHE_BYTES
+from .file_storage import file_storage, BLOBS_DIR
+
+logger = logging.getLogger(__name__)
+
+# Каталог производных файлов внутри UPLOAD_PATH
+DERIVATIVES_DIR = "derivatives"
+
+def render_thumbnail(source_path: str, target_path: str, size: int) -> int:
+    """Превью size x size в JPEG (выполняется в потоке); размер файла в байтах"""
+    with Image.open(source_path) as original:
+        # Фото с телефона: поворот по EXIF
+        image = ImageOps.exif_transpose(original)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        temp_path = f"{target_path}.tmp"
+        image.save(temp_path, format='JPEG', quality=85, optimize=True)
+        os.replace(temp_path, target_path)
+    return os.path.getsize(target_path)
+
+class ThumbnailCache:
+    """Превью изображений, построенные при первом запросе.
+
+    Превью размеров THUMBNAIL_SIZES хранятся в derivatives/ab/<ключ>_<size>.jpg;
+    ключ - хэш блоба (одинаковое содержимое - одно превью) или хэш пути
+    для файлов до хранилища блобов. Общий размер каталога ограничен
+    max_bytes: при превышении удаляются давно не запрашиваемые превью.
+    Превью, взятые через pinned(), не удаляются до выхода из блока
+    (файл еще может читаться при отправке), поэтому кэш может ненадолго
+    превысить max_bytes. Порядок после перезапуска восстанавливается по
+    времени изменения. Одновременные запросы одного превью строят его один раз.
+    """
+
+    def __init__(self, max_bytes: int = THUMBNAIL_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.root = file_storage.get_file_path(DERIVATIVES_DIR)
+        self._entries: Optional[OrderedDict] = None
+        self._total = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._pins: Dict[str, int] = {}
+
+    def target_path(self, relative_path: str, size: int) -> str:
+        """Полный путь превью файла relative_path"""
+        if relative_path.startswith(f"{BLOBS_DIR}/"):
+            key = os.path.basename(relative_path)
+        else:
+            key = hashlib.sha256(relative_path.encode()).hexdigest()
+        return os.path.join(self.root, key[:2], f"{key}_{size}.jpg")
+
+    async def get(self, relative_path: str, size: int = THUMBNAIL_SIZES[0]) -> Optional[str]:
+        """Полный путь превью (строится при первом запросе) или None"""
+        if size not in THUMBNAIL_SIZES:
+            raise ValueError(f"Размер превью {size} не входит в THUMBNAIL_SIZES")
+
+        if self._entries is None:
+            await self._load()
+
+        target = self.target_path(relative_path, size)
+        if target in self._entries:
+            self._entries.move_to_end(target)
+            return target
+
+        pending = self._pending.get(target)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.ensure_future(self._build(relative_path, target, size))
+        self._pending[target] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._pending.pop(target, None)
+
+    @asynccontextmanager
+    async def pinned(self, relative_path: str, size: int = THUMBNAIL_SIZES[0]) -> AsyncIterator[Optional[str]]:
+        """Превью (как get), которое не вытесняется из кэша до выхода из блока"""
+        target = self.target_path(relative_path, size)
+        self._pins[target] = self._pins.get(target, 0) + 1
+        try:
+            yield await self.get(relative_path, size)
+        finally:
+            if self._pins[target] > 1:
+                self._pins[target] -= 1
+            else:
+                del self._pins[target]
+
+    async def _build(self, relative_path: str, target: str, size: int) -> Optional[str]:
+        source = file_storage.get_file_path(relative_path)
+        try:
+            file_size = await asyncio.to_thread(render_thumbnail, source, target, size)
+        except Exception as e:
+            logger.error(f"Ошибка создания превью {relative_path} ({size}): {e}")
+            return None
+
+        self._entries[target] = file_size
+        self._total += file_size
+        await self._evict()
+        return target
+
+    async def _evict(self) -> None:
+        """Удаление давно не запрашиваемых превью сверх max_bytes.
+
+        Последнее запрошенное и закрепленные (pinned) превью не удаляются.
+        """
+        evicted = []
+        for path in list(self._entries)[:-1]:
+            if self._total <= self.max_bytes:
+                break
+            if path in self._pins:
+                continue
+            self._total -= self._entries.pop(path)
+            evicted.append(path)
+        if evicted:
+            await asyncio.to_thread(self._remove, evicted)
+            logger.info(f"Удалено превью из кэша: {len(evicted)}")
+
+    @staticmethod
+    def _remove(paths) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def _load(self) -> None:
+        entries = await asyncio.to_thread(self._scan)
+        if self._entries is None:
+            self._entries = OrderedDict((path, size) for path, size, _ in entries)
+            self._total = sum(size for _, size, _ in entries)
+            logger.info(f"Кэш превью: {len(entries)} файлов, {self._total} байт")
+
+    def _scan(self):
+        """Превью на диске: (путь, размер, mtime), старые первыми"""
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and entry.name.endswith('.jpg'):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda item: item[2])
+        return entries
+
+# Глобальный экземпляр
+thumbnail_cache = ThumbnailCache()